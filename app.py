@@ -1,23 +1,99 @@
 import os
+import io
+import hashlib
 import uuid
 import shutil
 import json
 import mimetypes
 import datetime
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory
+import threading
+import multiprocessing
+from collections import Counter, defaultdict
+from werkzeug.security import safe_join
+from flask import Flask, Request, Response, render_template, request, redirect, url_for, jsonify, send_from_directory, stream_with_context, current_app
 from tqdm import tqdm
 import static_ffmpeg  # Ensure ffmpeg is available
 
 # Importa i moduli custom
 from utils.file_detection import FileTypeDetector
 from converters.converter_factory import ConverterFactory
+from converters.capabilities import capabilities
+from converters.media_probe import media_probe
+from converters.trimmer import TRIM_MODES
+from converters.streaming import STREAMING_FORMATS
+from converters.frame_extractor import FRAMES_FORMAT, FRAMES_INDEX
+from converters.tiled_image import TILES_FORMAT, TILES_INDEX
+from converters.image_variants import VARIANTS_FORMAT, VARIANTS_INDEX
+from utils.job_queue import JobQueue
+from utils.process_pool import ConversionProcessPool
+from utils.cpu_budget import CpuBudget
+from utils.result_cache import ResultCache
+from utils.zip_stream import stream_zip
+from utils.chunked_upload import ChunkedUploadManager, UploadError, UploadNotFound
+from utils.janitor import Janitor
+from utils.file_probe import ProbeSink, ProbeCache, pdf_summary
+
+# Target il cui risultato è una cartella, con il file principale di ciascuno
+FOLDER_FORMATS = dict(STREAMING_FORMATS, **{FRAMES_FORMAT: FRAMES_INDEX, TILES_FORMAT: TILES_INDEX,
+                                             VARIANTS_FORMAT: VARIANTS_INDEX})
+
+class ConverterRequest(Request):
+    """Request che per /api/file-info non salva il file caricato"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        # werkzeug scriverebbe l'intero upload in un file temporaneo: per
+        # leggere i metadati bastano inizio, fine e pochi altri byte
+        if self.endpoint == 'get_file_info':
+            return ProbeSink(filename,
+                             head_size=current_app.config['PROBE_HEAD_BYTES'],
+                             tail_size=current_app.config['PROBE_TAIL_BYTES'])
+        return super()._get_file_stream(total_content_length, content_type,
+                                        filename, content_length)
+    
+    @property
+    def max_content_length(self):
+        # Il ProbeSink conserva solo pochi MB: il limite degli upload non vale per i metadati
+        if self.endpoint == 'get_file_info':
+            return current_app.config['PROBE_MAX_CONTENT_LENGTH']
+        return super().max_content_length
 
 app = Flask(__name__)
+app.request_class = ConverterRequest
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['CONVERTED_FOLDER'] = 'converted'
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload (per richiesta)
+# Upload a blocchi: ogni richiesta porta un blocco, il file può superare MAX_CONTENT_LENGTH
+app.config['CHUNKED_UPLOAD_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], '_chunked')
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['MAX_CHUNKED_UPLOAD_SIZE'] = int(os.environ.get('MAX_CHUNKED_UPLOAD_SIZE', 20 * 1024 * 1024 * 1024))
+# Worker per categoria: le codifiche video non rubano posto alle immagini
+app.config['CONVERSION_WORKERS'] = {
+    'image': int(os.environ.get('IMAGE_WORKERS', 4)),
+    'audio': int(os.environ.get('AUDIO_WORKERS', 2)),
+    'video': int(os.environ.get('VIDEO_WORKERS', 2)),
+    'document': int(os.environ.get('DOCUMENT_WORKERS', 2)),
+}
+# Processi per le conversioni in Python puro (immagini, documenti); 0 = disattivato
+app.config['PROCESS_POOL_WORKERS'] = int(os.environ.get('PROCESS_POOL_WORKERS', 0))
+# Core divisi tra le conversioni in corso (0 = tutti quelli della macchina)
+app.config['CPU_BUDGET_CORES'] = int(os.environ.get('CPU_BUDGET_CORES', 0))
+# Pulizia automatica di uploads/ e converted/
+app.config['SESSION_MAX_AGE'] = int(os.environ.get('SESSION_MAX_AGE', 24 * 60 * 60))
+app.config['STORAGE_MAX_BYTES'] = int(os.environ.get('STORAGE_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+# Un upload a blocchi senza nuovi blocchi da più di così può essere rimosso dalla pulizia
+app.config['CHUNKED_UPLOAD_GRACE'] = int(os.environ.get('CHUNKED_UPLOAD_GRACE', 60 * 60))
+app.config['JANITOR_INTERVAL'] = int(os.environ.get('JANITOR_INTERVAL', 10 * 60))
+# Cache dei risultati delle conversioni; 0 = disattivata
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+# Byte conservati da /api/file-info per leggere i metadati senza salvare il file
+app.config['PROBE_HEAD_BYTES'] = 1024 * 1024
+app.config['PROBE_TAIL_BYTES'] = 1024 * 1024
+app.config['PROBE_CACHE_ENTRIES'] = int(os.environ.get('PROBE_CACHE_ENTRIES', 1024))
+# Dimensione massima di un file inviato a /api/file-info (al posto di MAX_CONTENT_LENGTH)
+app.config['PROBE_MAX_CONTENT_LENGTH'] = int(os.environ.get('PROBE_MAX_CONTENT_LENGTH',
+                                                            64 * 1024 * 1024 * 1024))
 
 # Assicurati che le directories esistano
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -26,8 +102,12 @@ os.makedirs(app.config['CONVERTED_FOLDER'], exist_ok=True)
 # Inizializza mimetypes
 mimetypes.init()
 
-def process_file(file_data):
-    input_path, output_path, filename, target_format, options = file_data
+def process_file(task, progress_callback=None):
+    input_path = task['input_path']
+    output_path = task['output_path']
+    filename = task['filename']
+    target_format = task['target_format']
+    options = task['options']
     
     # Rileva il tipo MIME
     mime_type = FileTypeDetector.get_mime_type(input_path)
@@ -40,49 +120,192 @@ def process_file(file_data):
     converter = ConverterFactory.get_converter(mime_type, source_format, target_format)
     
     success = False
+    cached = False
     if converter:
-        # Esegui la conversione con le opzioni specificate
-        success = converter.convert(input_path, output_path, **options)
+        # Riusa il risultato se lo stesso file è già stato convertito con le stesse opzioni
+        cache_key = None
+        # Rendition di streaming e fotogrammi sono una cartella, la cache tiene solo file singoli
+        if result_cache and target_format not in FOLDER_FORMATS:
+            content_hash = task.get('content_hash') or ResultCache.hash_file(input_path)
+            cache_key = ResultCache.make_key(content_hash, target_format, options)
+            cached = result_cache.lookup(cache_key, output_path)
+        
+        if cached:
+            success = True
+        else:
+            # Esegui la conversione con le opzioni specificate, dentro la
+            # quota di CPU che limita i thread dei processi ffmpeg. Nel process
+            # pool il processo figlio usa un solo core: lo riserva come i job a thread singolo
+            use_pool = process_pool and converter.is_cpu_bound(source_format, target_format, input_path)
+            shared = not use_pool and converter.uses_thread_budget(target_format, input_path)
+            with cpu_budget.lease(shared=shared) as cpu_lease:
+                if use_pool:
+                    # Il figlio non può chiamare progress_callback: inizio e fine si riportano da qui
+                    if progress_callback:
+                        progress_callback(0.0)
+                    success = process_pool.convert(mime_type, source_format, target_format,
+                                                   input_path, output_path, options)
+                    if progress_callback:
+                        progress_callback(100.0)
+                else:
+                    success = converter.convert(input_path, output_path,
+                                                progress_callback=progress_callback,
+                                                cpu_lease=cpu_lease, **options)
+            
+            if success and cache_key and os.path.isfile(output_path):
+                result_cache.store(cache_key, output_path)
     
     return {
         "filename": filename,
         "success": success,
+        "cached": cached,
         "mime_type": mime_type,
         "category": category
     }
 
+def admit_file(task):
+    """Determina la categoria di un file e ne stima il costo di conversione"""
+    mime_type = FileTypeDetector.get_mime_type(task['input_path'])
+    category = FileTypeDetector.get_category(mime_type)
+    
+    converter = ConverterFactory.get_converter(mime_type)
+    if converter:
+        # Se il file è già passato da /api/file-info i metadati sono in cache:
+        # valgono anche per la pianificazione della conversione
+        media_probe.remember(task['input_path'], task.get('content_hash'))
+        cost = converter.estimate_cost(task['input_path'], probe_cache.get(task.get('content_hash')))
+    else:
+        cost = 0.0
+    
+    return category, cost
+
+def finalize_job(job):
+    """Pulisce i file caricati e salva i metadati al termine di un job"""
+    upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], job.session_id)
+    shutil.rmtree(upload_folder, ignore_errors=True)
+    
+    save_session_metadata(job.session_id, job.results)
+
+# Budget dei core condiviso da tutte le conversioni
+cpu_budget = CpuBudget(app.config['CPU_BUDGET_CORES'] or None)
+
+# Pool di processi opzionale per i convertitori che trattengono il GIL
+process_pool = None
+if app.config['PROCESS_POOL_WORKERS'] > 0:
+    process_pool = ConversionProcessPool(app.config['PROCESS_POOL_WORKERS'])
+
+# Upload a blocchi riprendibili
+# Un file più grande della quota disco verrebbe comunque eliminato dalla pulizia
+chunked_uploads = ChunkedUploadManager(app.config['CHUNKED_UPLOAD_FOLDER'],
+                                       min(app.config['MAX_CHUNKED_UPLOAD_SIZE'],
+                                           app.config['STORAGE_MAX_BYTES']))
+
+# Cache dei risultati indirizzata per contenuto
+result_cache = None
+if app.config['CACHE_MAX_BYTES'] > 0:
+    result_cache = ResultCache(app.config['CACHE_FOLDER'], app.config['CACHE_MAX_BYTES'])
+
+# Strumenti esterni ed encoder verificati una sola volta all'avvio
+# (i processi figli li verificano al primo utilizzo)
+if multiprocessing.parent_process() is None:
+    capabilities.refresh()
+
+# Metadati letti da /api/file-info, riusati al momento dell'upload
+probe_cache = ProbeCache(app.config['PROBE_CACHE_ENTRIES'])
+
+# Coda dei job di conversione eseguiti in background
+job_queue = JobQueue(process_file, admit_file, app.config['CONVERSION_WORKERS'])
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Risposta di /api/formats, ricalcolata solo quando cambiano le capacità
+_formats_response = {'version': None, 'body': None, 'etag': None}
+_formats_lock = threading.Lock()
+
+def formats_payload():
+    """Corpo JSON ed ETag dei formati supportati, calcolati una volta per versione del registro"""
+    version = capabilities.snapshot()['version']
+    with _formats_lock:
+        if _formats_response['version'] != version:
+            formats = {}
+            for category, mime_type in [("image", "image/jpeg"), ("audio", "audio/mpeg"),
+                                        ("video", "video/mp4"), ("document", "application/pdf")]:
+                converter = ConverterFactory.get_converter(mime_type)
+                formats[category] = {
+                    "input": converter.get_supported_input_formats() if converter else [],
+                    "output": converter.get_supported_output_formats() if converter else []
+                }
+            
+            body = json.dumps(formats)
+            _formats_response.update({
+                'version': version,
+                'body': body,
+                'etag': hashlib.sha256(body.encode()).hexdigest()[:32],
+            })
+        return _formats_response['body'], _formats_response['etag']
+
 @app.route('/api/formats', methods=['GET'])
 def get_formats():
     """Endpoint per ottenere tutti i formati supportati"""
-    image_converter = ConverterFactory.get_converter("image/jpeg")
-    audio_converter = ConverterFactory.get_converter("audio/mpeg")
-    video_converter = ConverterFactory.get_converter("video/mp4")
-    document_converter = ConverterFactory.get_converter("application/pdf")  # Add document converter
-    
-    formats = {
-        "image": {
-            "input": image_converter.get_supported_input_formats() if image_converter else [],
-            "output": image_converter.get_supported_output_formats() if image_converter else []
-        },
-        "audio": {
-            "input": audio_converter.get_supported_input_formats() if audio_converter else [],
-            "output": audio_converter.get_supported_output_formats() if audio_converter else []
-        },
-        "video": {
-            "input": video_converter.get_supported_input_formats() if video_converter else [],
-            "output": video_converter.get_supported_output_formats() if video_converter else []
-        },
-        "document": {
-            "input": document_converter.get_supported_input_formats() if document_converter else [],
-            "output": document_converter.get_supported_output_formats() if document_converter else []
-        }
-    }
+    body, etag = formats_payload()
+    
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Il browser rivalida a ogni richiesta e riceve 304 se nulla è cambiato
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/capabilities', methods=['GET'])
+def get_capabilities():
+    """Endpoint per strumenti esterni ed encoder disponibili"""
+    return jsonify(capabilities.snapshot())
+
+@app.route('/api/capabilities/refresh', methods=['POST'])
+def refresh_capabilities():
+    """Ripete le verifiche, ad esempio dopo aver installato pandoc"""
+    return jsonify(capabilities.refresh())
+
+def probe_upload(sink, filename):
+    """
+    Legge i metadati di un file dai soli byte conservati dal ProbeSink
+    
+    Args:
+        sink: ProbeSink che ha ricevuto il file
+        filename: nome originale del file
+        
+    Returns:
+        dict: informazioni sul file, come quelle dei convertitori
+    """
+    mime_type = FileTypeDetector.get_mime_type(filename)
+    category = FileTypeDetector.get_category(mime_type)
+    info = {"mime_type": mime_type, "category": category}
     
-    return jsonify(formats)
+    converter = ConverterFactory.get_converter(mime_type)
+    if not converter:
+        return info
+    
+    if category == "image":
+        # Pillow apre le immagini in modo lazy: basta l'header
+        info.update(converter.get_image_info(io.BytesIO(sink.head)))
+        return info
+    
+    with sink.materialize(app.config['UPLOAD_FOLDER']) as probe_path:
+        if category == "audio":
+            info.update(converter.get_audio_info(probe_path, sink.content_hash))
+        elif category == "video":
+            info.update(converter.get_video_info(probe_path, sink.content_hash))
+        elif category == "document":
+            document_info = converter.get_document_info(probe_path)
+            if 'error' in document_info and not sink.complete:
+                # Oggetti del documento caduti nella parte scartata
+                document_info = {'format': document_info.get('format'), 'size': sink.size}
+                if document_info['format'] == 'pdf':
+                    document_info.update(pdf_summary(sink.head, sink.tail))
+            info.update(document_info)
+    
+    return info
 
 @app.route('/api/file-info', methods=['POST'])
 def get_file_info():
@@ -94,57 +317,22 @@ def get_file_info():
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
     
-    # Salva il file temporaneamente
-    temp_filename = f"temp_{uuid.uuid4()}"
-    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-    file.save(temp_path)
-    
-    # Rileva il tipo MIME
-    mime_type = FileTypeDetector.get_mime_type(temp_path)
-    category = FileTypeDetector.get_category(mime_type)
-    
-    # Ottieni informazioni specifiche per categoria
-    info = {"mime_type": mime_type, "category": category}
-    
-    # Ottieni il convertitore appropriato
-    converter = ConverterFactory.get_converter(mime_type)
-    
-    if category == "image" and converter:
-        image_info = converter.get_image_info(temp_path)
-        info.update(image_info)
-    elif category == "audio" and converter:
-        audio_info = converter.get_audio_info(temp_path)
-        info.update(audio_info)
-    elif category == "video" and converter:
-        video_info = converter.get_video_info(temp_path)
-        info.update(video_info)
-    elif category == "document" and converter:
-        document_info = converter.get_document_info(temp_path)
-        info.update(document_info)
-    
-    # Pulisci il file temporaneo
-    os.remove(temp_path)
+    # Il contenuto è già passato dal ProbeSink: hash e byte utili sono in memoria
+    sink = file.stream
+    info = probe_cache.get(sink.content_hash)
+    if info is None:
+        info = probe_upload(sink, os.path.basename(file.filename))
+        probe_cache.put(sink.content_hash, info)
     
     return jsonify(info)
 
-@app.route('/upload', methods=['POST'])
-def upload_files():
-    if 'files[]' not in request.files:
-        return jsonify({"error": "No files part"}), 400
-    
-    files = request.files.getlist('files[]')
-    if not files or files[0].filename == '':
-        return jsonify({"error": "No files selected"}), 400
-    
-    # Formato di destinazione
-    target_format = request.form.get('target_format', 'jpg')
-    
-    # Opzioni di conversione
+def parse_conversion_options(form):
+    """Legge le opzioni di conversione inviate dal client (JSON per categoria)"""
     options = {}
     
     # Leggi le opzioni per immagini
-    if 'image_options' in request.form:
-        image_options = json.loads(request.form.get('image_options'))
+    if 'image_options' in form:
+        image_options = json.loads(form.get('image_options'))
         
         # Qualità dell'immagine
         if 'quality' in image_options:
@@ -178,13 +366,22 @@ def upload_files():
             filter_type = image_options['filter'].get('type')
             if filter_type:
                 options['filter'] = filter_type
+        
+        # Set responsive: larghezze e formati delle varianti
+        variants = image_options.get('variants')
+        if variants and form.get('target_format') == VARIANTS_FORMAT:
+            widths = [int(w) for w in str(variants.get('widths', '')).replace(' ', '').split(',') if w.isdigit()]
+            if widths:
+                options['variant_widths'] = widths
+            if variants.get('formats'):
+                options['variant_formats'] = list(variants['formats'])
     
     # Opzioni audio
-    if 'audio_options' in request.form:
-        audio_options = json.loads(request.form.get('audio_options'))
+    if 'audio_options' in form:
+        audio_options = json.loads(form.get('audio_options'))
         
-        # Bitrate
-        if 'bitrate' in audio_options:
+        # Bitrate ("original" = nessuna modifica richiesta)
+        if 'bitrate' in audio_options and audio_options['bitrate'] != 'original':
             options['bitrate'] = audio_options['bitrate']
         
         # Sample rate
@@ -209,18 +406,23 @@ def upload_files():
             end_ms = int(audio_options['trim'].get('end', 0))
             if end_ms > start_ms:
                 options['trim'] = (start_ms, end_ms)
+                if audio_options['trim'].get('mode') in TRIM_MODES:
+                    options['trim_mode'] = audio_options['trim']['mode']
+        
+        # Ricodifica anche quando basterebbe copiare il flusso
+        if audio_options.get('force_reencode'):
+            options['force_reencode'] = True
     
     # Opzioni video
-    if 'video_options' in request.form:
-        video_options = json.loads(request.form.get('video_options'))
-        
-        # Bitrate video
-        if 'video_bitrate' in video_options:
-            options['video_bitrate'] = video_options['video_bitrate']
+    if 'video_options' in form:
+        video_options = json.loads(form.get('video_options'))
         
-        # Bitrate audio
-        if 'audio_bitrate' in video_options:
-            options['audio_bitrate'] = video_options['audio_bitrate']
+        # Bitrate video e audio: con "original" nessun bitrate viene imposto
+        # e, se non servono altre modifiche, i flussi vengono solo copiati
+        for key in ['video_bitrate', 'audio_bitrate']:
+            if key in video_options:
+                value = video_options[key]
+                options[key] = None if value == 'original' else value
         
         # Risoluzione
         if 'resolution' in video_options and video_options['resolution'].get('enabled'):
@@ -244,6 +446,11 @@ def upload_files():
             if codec_value:
                 options['codec'] = codec_value
         
+        # Rendition per HLS/DASH (altezze in pixel); per gli altri formati
+        # non servono e cambierebbero soltanto la chiave della cache
+        if video_options.get('ladder') and form.get('target_format') in STREAMING_FORMATS:
+            options['ladder'] = [int(height) for height in video_options['ladder']]
+        
         # Preset
         if 'preset' in video_options:
             options['preset'] = video_options['preset']
@@ -262,10 +469,34 @@ def upload_files():
             end_sec = float(video_options['trim'].get('end', 0))
             if end_sec > start_sec:
                 options['trim'] = (start_sec, end_sec)
+                if video_options['trim'].get('mode') in TRIM_MODES:
+                    options['trim_mode'] = video_options['trim']['mode']
+        
+        # Ricodifica anche quando basterebbe cambiare container
+        if video_options.get('force_reencode'):
+            options['force_reencode'] = True
+        
+        # Estrazione di fotogrammi (miniatura, sprite sheet, istantanee)
+        frames = video_options.get('frames')
+        if frames and form.get('target_format') in ['jpg', 'png', FRAMES_FORMAT]:
+            if frames.get('mode') in ['thumbnail', 'sprite']:
+                options['frame_mode'] = frames['mode']
+            if frames.get('time') not in (None, ''):
+                options['frame_time'] = float(frames['time'])
+            if frames.get('interval'):
+                options['frame_interval'] = float(frames['interval'])
+            if frames.get('count'):
+                options['frame_count'] = int(frames['count'])
+            if frames.get('width'):
+                options['frame_width'] = int(frames['width'])
+            if frames.get('columns'):
+                options['sprite_columns'] = int(frames['columns'])
+            if frames.get('exact'):
+                options['exact_frames'] = True
     
     # Opzioni documento
-    if 'document_options' in request.form:
-        document_options = json.loads(request.form.get('document_options'))
+    if 'document_options' in form:
+        document_options = json.loads(form.get('document_options'))
         
         # Metadati
         options['preserve_metadata'] = document_options.get('preserve_metadata', True)
@@ -294,87 +525,372 @@ def upload_files():
             options['encrypted_pdf'] = True
             options['password'] = document_options.get('password', '')
     
-    # Crea una cartella di sessione unica per questo batch
+    return options
+
+def create_session():
+    """Crea le cartelle di output e di upload per un nuovo batch"""
     session_id = str(uuid.uuid4())
     session_folder = os.path.join(app.config['CONVERTED_FOLDER'], session_id)
     os.makedirs(session_folder, exist_ok=True)
     
-    file_data = []
-    for file in files:
-        if file:
-            filename = os.path.basename(file.filename)
-            input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            name_without_ext = os.path.splitext(filename)[0]
-            output_filename = f"{name_without_ext}.{target_format}"
-            output_path = os.path.join(session_folder, output_filename)
-            
-            file.save(input_path)
-            file_data.append((input_path, output_path, output_filename, target_format, options))
+    # I file caricati vanno in una cartella per sessione per evitare collisioni tra job
+    upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    os.makedirs(upload_folder, exist_ok=True)
     
-    # Processa i file in parallelo
-    results = []
-    with ThreadPoolExecutor(max_workers=min(4, len(file_data))) as executor:
-        # Ridotto il numero di worker per le conversioni video che richiedono più risorse
-        results = list(executor.map(process_file, file_data))
+    return session_id, session_folder, upload_folder
+
+def unique_upload_path(upload_folder, filename, taken):
+    """
+    Percorso di upload per un file del batch: i file con lo stesso nome (anche
+    con estensione diversa, che darebbero lo stesso output) ricevono un suffisso
+
+    Args:
+        upload_folder: cartella di upload della sessione
+        filename: nome originale del file
+        taken: nomi (senza estensione) già usati nel batch, aggiornato qui
+    """
+    name, ext = os.path.splitext(os.path.basename(filename))
+    candidate, counter = name, 1
+    while candidate.lower() in taken:
+        candidate = f"{name}_{counter}"
+        counter += 1
+    taken.add(candidate.lower())
+    return os.path.join(upload_folder, candidate + ext)
+
+def save_upload(file, path, chunk_size=1024 * 1024):
+    """Salva un file caricato calcolandone l'hash durante la scrittura"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+def build_task(input_path, session_folder, target_format, options):
+    """Descrive la conversione di un file caricato"""
+    filename = os.path.basename(input_path)
+    name_without_ext = os.path.splitext(filename)[0]
+    output_filename = f"{name_without_ext}.{target_format}"
+    if target_format in FOLDER_FORMATS:
+        # Playlist e segmenti (fotogrammi, tessere, varianti) in una cartella dedicata dentro la sessione
+        output_filename = f"{name_without_ext}_{target_format}/{FOLDER_FORMATS[target_format]}"
     
-    # Pulisci i file caricati
-    for input_path, _, _, _, _ in file_data:
-        try:
-            os.remove(input_path)
-        except:
-            pass
+    return {
+        'input_path': input_path,
+        'output_path': os.path.join(session_folder, output_filename),
+        'filename': output_filename,
+        'source_filename': filename,
+        'target_format': target_format,
+        'options': options
+    }
+
+def job_accepted_response(job):
+    """Risposta 202 con lo stato iniziale del job e i link per seguirlo"""
+    response = serialize_job(job)
+    response['message'] = "Conversione in coda"
+    response['status_url'] = url_for('get_job_status', job_id=job.id)
+    response['events_url'] = url_for('stream_job_events', job_id=job.id)
+    return jsonify(response), 202
+
+@app.route('/upload', methods=['POST'])
+def upload_files():
+    if 'files[]' not in request.files:
+        return jsonify({"error": "No files part"}), 400
+    
+    files = request.files.getlist('files[]')
+    if not files or files[0].filename == '':
+        return jsonify({"error": "No files selected"}), 400
+    
+    # Formato di destinazione
+    target_format = request.form.get('target_format', 'jpg')
+    
+    # Opzioni di conversione
+    options = parse_conversion_options(request.form)
     
-    # Salva i metadati della sessione
-    save_session_metadata(session_id, results)
+    # Crea una cartella di sessione unica per questo batch
+    session_id, session_folder, upload_folder = create_session()
+    job = job_queue.create(session_id, on_complete=finalize_job)
+    
+    # Werkzeug ha già ricevuto e bufferizzato l'intero corpo multipart: qui
+    # ogni file viene solo copiato in uploads/ e accodato subito, così la
+    # conversione dei primi si sovrappone alla copia dei successivi (non alla
+    # ricezione via rete; per quella c'è l'upload a blocchi).
+    # Il job viene chiuso in ogni caso, altrimenti resterebbe 'running' per sempre
+    taken = set()
+    try:
+        for file in files:
+            if not file:
+                continue
+            input_path = unique_upload_path(upload_folder, file.filename, taken)
+            task = build_task(input_path, session_folder, target_format, options)
+            try:
+                task['content_hash'] = save_upload(file, input_path)
+            except OSError as e:
+                print(f"Errore nel salvataggio di {file.filename}: {e}")
+                job_queue.reject(job, task, str(e))
+                continue
+            job_queue.add(job, task)
+    finally:
+        job_queue.seal(job)
+    
+    return job_accepted_response(job)
+
+@app.route('/upload/chunked', methods=['POST'])
+def create_chunked_upload():
+    """Inizia un upload a blocchi: il client invia nome e dimensione del file"""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload_id = chunked_uploads.create(data.get('filename'), int(data.get('size', -1)))
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({
-        "message": "Conversione completata",
-        "session_id": session_id,
-        "files": results
-    })
+        "upload_id": upload_id,
+        "chunk_size": app.config['UPLOAD_CHUNK_SIZE'],
+        "upload_url": url_for('upload_chunk', upload_id=upload_id)
+    }), 201
+
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Riceve un blocco all'offset indicato e lo scrive direttamente su disco"""
+    try:
+        offset = int(request.args.get('offset', -1))
+        length = request.content_length
+        if length is None:
+            return jsonify({"error": "Content-Length required"}), 411
+        
+        status = chunked_uploads.write_chunk(upload_id, offset, request.stream, length)
+    except UploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(status)
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Stato di un upload a blocchi: intervalli ricevuti, per la ripresa"""
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except UploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def discard_chunked_upload(upload_id):
+    """Annulla un upload a blocchi"""
+    try:
+        chunked_uploads.discard(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({'success': True})
+
+@app.route('/upload/chunked/finalize', methods=['POST'])
+def finalize_chunked_upload():
+    """Completa gli upload a blocchi indicati e accoda la conversione, come /upload"""
+    try:
+        upload_ids = json.loads(request.form.get('upload_ids', '[]'))
+    except ValueError:
+        return jsonify({"error": "Invalid upload_ids"}), 400
+    
+    if not isinstance(upload_ids, list) or not all(isinstance(upload_id, str) for upload_id in upload_ids):
+        return jsonify({"error": "Invalid upload_ids"}), 400
+    
+    # Lo stesso upload può essere finalizzato una volta sola
+    upload_ids = list(dict.fromkeys(upload_ids))
+    if not upload_ids:
+        return jsonify({"error": "No files selected"}), 400
+    
+    # Verifica che tutti gli upload siano completi prima di spostare qualsiasi file
+    for upload_id in upload_ids:
+        try:
+            if not chunked_uploads.status(upload_id)['complete']:
+                return jsonify({"error": f"Upload {upload_id} is not complete"}), 409
+        except UploadNotFound as e:
+            return jsonify({"error": str(e)}), 404
+        except UploadError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    target_format = request.form.get('target_format', 'jpg')
+    options = parse_conversion_options(request.form)
+    session_id, session_folder, upload_folder = create_session()
+    job = job_queue.create(session_id, on_complete=finalize_job)
+    
+    # Un upload rimosso nel frattempo (o un errore del disco) fa fallire solo il suo file
+    taken = set()
+    try:
+        for upload_id in upload_ids:
+            try:
+                filename = chunked_uploads.status(upload_id)['filename']
+            except UploadError as e:
+                job_queue.reject(job, {'filename': upload_id}, str(e))
+                continue
+            input_path = unique_upload_path(upload_folder, filename, taken)
+            task = build_task(input_path, session_folder, target_format, options)
+            try:
+                chunked_uploads.finalize(upload_id, input_path)
+            except (UploadError, OSError) as e:
+                print(f"Errore nel completamento dell'upload {upload_id}: {e}")
+                job_queue.reject(job, task, str(e))
+                continue
+            job_queue.add(job, task)
+    finally:
+        job_queue.seal(job)
+    
+    return job_accepted_response(job)
+
+def serialize_job(job):
+    """Serializza un job aggiungendo i link per il download dei file completati"""
+    data = job.to_dict()
+    for entry in data['files']:
+        if entry['status'] == 'completed':
+            entry['download_url'] = url_for('download_file', session_id=job.session_id,
+                                            filename=entry['filename'])
+    return data
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Endpoint per lo stato di un job di conversione"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(serialize_job(job))
 
-@app.route('/download/<session_id>/<filename>')
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-Sent Events con lo stato del job a ogni avanzamento"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def generate():
+        version = None
+        while True:
+            new_version = job.wait_for_change(version, timeout=15)
+            if new_version == version:
+                # Nessuna novità: commento keep-alive per i proxy
+                yield ": keep-alive\n\n"
+                continue
+            
+            version = new_version
+            data = serialize_job(job)
+            yield f"event: job\ndata: {json.dumps(data)}\n\n"
+            
+            if data['status'] == 'completed':
+                break
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/queue', methods=['GET'])
+def get_queue_stats():
+    """Endpoint per lo stato dei pool di conversione"""
+    stats = job_queue.stats()
+    stats['cpu'] = cpu_budget.stats()
+    return jsonify(stats)
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    """Endpoint per i contatori della cache dei risultati e delle cache di probe"""
+    # Le cache di probe sono sempre attive, anche senza cache dei risultati
+    stats = result_cache.stats() if result_cache else {}
+    stats['enabled'] = bool(result_cache)
+    stats['probe'] = probe_cache.stats()
+    stats['media_probe'] = media_probe.stats()
+    return jsonify(stats)
+
+@app.route('/download/<session_id>/<path:filename>')
 def download_file(session_id, filename):
     return send_from_directory(os.path.join(app.config['CONVERTED_FOLDER'], session_id), filename)
 
+# Sessioni con uno zip in streaming: non vanno cancellate finché l'invio non termina
+active_downloads = Counter()
+active_downloads_lock = threading.Lock()
+
+def track_download(session_id, chunks):
+    """Registra la sessione come in download per tutta la durata dello streaming"""
+    with active_downloads_lock:
+        active_downloads[session_id] += 1
+    try:
+        yield from chunks
+    finally:
+        with active_downloads_lock:
+            active_downloads[session_id] -= 1
+            if active_downloads[session_id] <= 0:
+                del active_downloads[session_id]
+
+def is_session_in_use(session_id):
+    """Una sessione è in uso se ha conversioni in corso o uno zip in streaming"""
+    with active_downloads_lock:
+        if active_downloads.get(session_id):
+            return True
+    return job_queue.is_session_active(session_id)
+
+# Pulizia in background: età massima delle sessioni e quota disco complessiva
+janitor = Janitor(app.config['CONVERTED_FOLDER'], app.config['UPLOAD_FOLDER'],
+                  max_age=app.config['SESSION_MAX_AGE'],
+                  max_bytes=app.config['STORAGE_MAX_BYTES'],
+                  interval=app.config['JANITOR_INTERVAL'],
+                  is_active=is_session_in_use,
+                  upload_grace=app.config['CHUNKED_UPLOAD_GRACE'])
+
+# Non avviare la pulizia nei processi figli del process pool
+if multiprocessing.parent_process() is None:
+    janitor.start()
+
+@app.route('/api/janitor', methods=['GET'])
+def get_janitor_stats():
+    """Endpoint con il resoconto della pulizia automatica"""
+    return jsonify(janitor.stats())
+
+@app.route('/api/janitor/run', methods=['POST'])
+def run_janitor():
+    """Esegue subito un passaggio di pulizia e ne restituisce il resoconto"""
+    return jsonify(janitor.run_once())
+
 @app.route('/download_all/<session_id>')
 def download_all(session_id):
-    """Crea un file zip di tutti i file convertiti e lo invia al client."""
+    """Invia al client un file zip di tutti i file convertiti, generato in streaming."""
     session_folder = os.path.join(app.config['CONVERTED_FOLDER'], session_id)
     if not os.path.exists(session_folder):
         return jsonify({"error": "Session not found"}), 404
     
-    import zipfile
-    zip_filename = f"converted_{session_id}.zip"
-    zip_path = os.path.join(app.config['CONVERTED_FOLDER'], zip_filename)
-    
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for root, _, files in os.walk(session_folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.basename(file_path))
+    entries = []
+    for root, _, files in os.walk(session_folder):
+        for file in files:
+            file_path = os.path.join(root, file)
+            # Percorsi relativi alla sessione: le cartelle HLS/DASH restano intatte
+            entries.append((file_path, os.path.relpath(file_path, session_folder)))
     
-    return send_from_directory(app.config['CONVERTED_FOLDER'], zip_filename, as_attachment=True)
+    zip_filename = f"converted_{session_id}.zip"
+    return Response(
+        stream_with_context(track_download(session_id, stream_zip(entries))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'}
+    )
 
 @app.route('/clear/<session_id>')
 def clear_session(session_id):
     """Pulisce la cartella di sessione dopo il download."""
-    session_folder = os.path.join(app.config['CONVERTED_FOLDER'], session_id)
-    if os.path.exists(session_folder):
-        shutil.rmtree(session_folder)
+    # Conversioni che scrivono ancora nella sessione o zip in streaming
+    if is_session_in_use(session_id):
+        return jsonify({'success': False, 'error': 'Session in use'}), 409
     
+    session_path = os.path.join(app.config['CONVERTED_FOLDER'], session_id)
     zip_file = os.path.join(app.config['CONVERTED_FOLDER'], f"converted_{session_id}.zip")
     try:
+        # Archivi zip lasciati dalle versioni che li scrivevano su disco
+        if os.path.exists(zip_file):
+            os.remove(zip_file)
+        
         if os.path.exists(session_path):
-            # Delete all files in the session directory
-            for file in os.listdir(session_path):
-                file_path = os.path.join(session_path, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-            
-            # Remove the directory itself
-            os.rmdir(session_path)
-            
+            shutil.rmtree(session_path)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Session not found'}), 404
@@ -385,11 +901,13 @@ def clear_session(session_id):
 @app.route('/api/history/delete/file/<session_id>/<path:filename>', methods=['DELETE'])
 def delete_file(session_id, filename):
     """Delete a specific file from a session"""
-    file_path = os.path.join(app.config['CONVERTED_FOLDER'], session_id, filename)
+    if is_session_in_use(session_id):
+        return jsonify({'success': False, 'error': 'Session in use'}), 409
+    file_path = converted_entry_path(session_id, filename)
     
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if file_path and os.path.exists(file_path):
+            remove_entry(file_path)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'File not found'}), 404
@@ -397,6 +915,23 @@ def delete_file(session_id, filename):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def converted_entry_path(session_id, filename):
+    """
+    Percorso da eliminare per un risultato: il file stesso oppure, per
+    HLS/DASH (es. video_hls/master.m3u8) e fotogrammi, l'intera cartella
+    
+    Returns:
+        str: percorso dentro la sessione, None se il nome non è valido
+    """
+    top_level = filename.replace('\\', '/').split('/')[0]
+    return safe_join(app.config['CONVERTED_FOLDER'], session_id, top_level)
+
+def remove_entry(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
 @app.route('/api/history/delete/batch', methods=['POST'])
 def delete_batch():
     """Delete multiple files or sessions"""
@@ -404,30 +939,29 @@ def delete_batch():
     
     if not data or ('files' not in data and 'sessions' not in data):
         return jsonify({'success': False, 'error': 'Invalid request'}), 400
+    
+    # Nessuna eliminazione se una delle sessioni ha conversioni o download in corso
+    session_ids = set(data.get('sessions', []))
+    session_ids.update(file_info.get('session_id') for file_info in data.get('files', [])
+                       if isinstance(file_info, dict))
+    if any(is_session_in_use(session_id) for session_id in session_ids if session_id):
+        return jsonify({'success': False, 'error': 'Session in use'}), 409
         
     try:
         # Delete specific files
         if 'files' in data:
             for file_info in data['files']:
                 if 'session_id' in file_info and 'filename' in file_info:
-                    file_path = os.path.join(
-                        app.config['CONVERTED_FOLDER'], 
-                        file_info['session_id'], 
-                        file_info['filename']
-                    )
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                    file_path = converted_entry_path(file_info['session_id'], file_info['filename'])
+                    if file_path and os.path.exists(file_path):
+                        remove_entry(file_path)
         
         # Delete entire sessions
         if 'sessions' in data:
             for session_id in data['sessions']:
                 session_path = os.path.join(app.config['CONVERTED_FOLDER'], session_id)
                 if os.path.exists(session_path):
-                    for file in os.listdir(session_path):
-                        file_path = os.path.join(session_path, file)
-                        if os.path.isfile(file_path):
-                            os.remove(file_path)
-                    os.rmdir(session_path)
+                    shutil.rmtree(session_path)
         
         return jsonify({'success': True})
         
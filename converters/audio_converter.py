@@ -1,6 +1,13 @@
 import os
-import subprocess
 from .base_converter import BaseConverter
+from .capabilities import capabilities
+from .media_probe import media_probe
+from .ffmpeg_utils import run_ffmpeg, accepts_codec
+from .trimmer import trim_copy
+
+# Opzioni che cambiano il flusso audio e quindi richiedono la ricodifica
+# (il trim no: in modalità 'fast' il flusso tagliato viene copiato)
+REENCODE_OPTIONS = ['bitrate', 'sample_rate', 'channels', 'volume_change', 'normalize']
 
 class AudioConverter(BaseConverter):
     """Convertitore per file audio"""
@@ -16,9 +23,14 @@ class AudioConverter(BaseConverter):
         ]
         
     def get_supported_output_formats(self):
-        return [
+        formats = [
             'mp3', 'wav', 'ogg', 'flac', 'aac', 'm4a', 'opus'
         ]
+        # Solo i formati per cui ffmpeg ha un encoder
+        return [fmt for fmt in formats if capabilities.supports_output(fmt)]
+    
+    def uses_thread_budget(self, target_format=None, input_path=None):
+        return True
     
     def convert(self, input_path, output_path, **kwargs):
         """
@@ -34,6 +46,11 @@ class AudioConverter(BaseConverter):
                 - volume_change: modificatore di volume in dB (es. +3, -5)
                 - normalize: normalizzazione audio (True/False)
                 - trim: tupla (start_ms, end_ms) per tagliare l'audio
+                - trim_mode: 'accurate' (ricodifica, preciso al campione) o 'fast'
+                  (copia del flusso, preciso al frame audio)
+                - force_reencode: ricodifica anche quando basterebbe copiare il flusso
+                - progress_callback: funzione chiamata con (percentuale, velocità)
+                - cpu_lease: quota del budget CPU che limita i thread di ffmpeg
         """
         try:
             # Estrai parametri dai kwargs
@@ -43,9 +60,47 @@ class AudioConverter(BaseConverter):
             volume_change = kwargs.get('volume_change')
             normalize = kwargs.get('normalize', False)
             trim = kwargs.get('trim')
+            progress_callback = kwargs.get('progress_callback')
+            cpu_lease = kwargs.get('cpu_lease')
+            
+            # Durata attesa dell'output, serve solo per la percentuale di avanzamento
+            duration = None
+            if progress_callback:
+                if trim and len(trim) == 2:
+                    duration = (trim[1] - trim[0]) / 1000
+                else:
+                    duration = self.get_audio_info(input_path).get('duration') or None
+            
+            # Percorso veloce: senza modifiche richieste e con un container che
+            # accetta il codec di partenza (es. m4a -> aac) si copia il flusso;
+            # con il trim solo in modalità 'fast', dato che si taglia al frame audio
+            trimmed = trim and len(trim) == 2
+            if (not kwargs.get('force_reencode') and not any(kwargs.get(name) for name in REENCODE_OPTIONS)
+                    and (not trimmed or kwargs.get('trim_mode') == 'fast')):
+                output_format = os.path.splitext(output_path)[1][1:].lower()
+                codec = self.get_audio_info(input_path).get('codec')
+                if codec and accepts_codec(output_format, 'audio', codec):
+                    if trimmed:
+                        if trim_copy(input_path, output_path, trim[0] / 1000, trim[1] / 1000,
+                                     video=False, progress_callback=progress_callback):
+                            return True
+                        print("Taglio senza ricodifica non riuscito, si ricodifica")
+                    else:
+                        copy_cmd = ['ffmpeg', '-y', '-i', input_path, '-vn', '-c:a', 'copy', output_path]
+                        result = run_ffmpeg(copy_cmd, duration, progress_callback)
+                        if result.returncode == 0:
+                            return True
+                        print(f"Copia del flusso non riuscita, si ricodifica: {result.stderr}")
             
             # Costruisci comando FFmpeg
-            cmd = ['ffmpeg', '-y', '-i', input_path]
+            cmd = ['ffmpeg', '-y']
+            
+            # Trim (taglio): seek lato input, così ffmpeg non decodifica
+            # tutto ciò che precede l'inizio (converti ms in secondi)
+            if trimmed:
+                cmd.extend(['-ss', str(trim[0]/1000), '-to', str(trim[1]/1000)])
+            
+            cmd.extend(['-i', input_path])
             
             # Aggiungi opzioni
             if bitrate:
@@ -69,16 +124,12 @@ class AudioConverter(BaseConverter):
             if af_filters:
                 cmd.extend(['-af', ','.join(af_filters)])
             
-            # Trim (taglio)
-            if trim and len(trim) == 2:
-                # -ss start -to end (converti ms in secondi)
-                cmd.extend(['-ss', str(trim[0]/1000), '-to', str(trim[1]/1000)])
-            
             # Output file
             cmd.append(output_path)
             
             # Esegui FFmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd, duration, progress_callback,
+                                threads=cpu_lease.threads if cpu_lease else None)
             
             if result.returncode != 0:
                 print(f"FFmpeg error: {result.stderr}")
@@ -90,54 +141,42 @@ class AudioConverter(BaseConverter):
             print(f"Errore durante la conversione audio: {e}")
             return False
     
-    def get_audio_info(self, input_path):
+    def estimate_cost(self, input_path, info=None):
+        """Stima il costo in base alla durata (la codifica audio è circa 50x il tempo reale)"""
+        if not info or not info.get('duration'):
+            info = self.get_audio_info(input_path)
+        if not info.get('duration'):
+            return super().estimate_cost(input_path)
+        
+        return info['duration'] / 50
+    
+    def get_audio_info(self, input_path, content_hash=None):
         """
         Ottiene informazioni su un file audio
         
         Args:
             input_path: percorso del file audio
+            content_hash: SHA-256 del contenuto, se già noto (per la cache)
             
         Returns:
             dict: dizionario con le informazioni sull'audio
         """
-        try:
-            # Usa ffprobe per ottenere informazioni dettagliate
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', input_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                import json
-                data = json.loads(result.stdout)
-                
-                # Trova lo stream audio principale
-                audio_stream = None
-                for stream in data.get('streams', []):
-                    if stream['codec_type'] == 'audio':
-                        audio_stream = stream
-                        break
-                
-                if not audio_stream:
-                    raise ValueError("No audio stream found")
-                
-                # Estrai informazioni rilevanti
-                info = {
-                    'format': data.get('format', {}).get('format_name', ''),
-                    'duration': float(data.get('format', {}).get('duration', 0)),
-                    'size': int(data.get('format', {}).get('size', 0)),
-                    'bitrate': int(data.get('format', {}).get('bit_rate', 0)),
-                    'codec': audio_stream.get('codec_name', ''),
-                    'sample_rate': int(audio_stream.get('sample_rate', 0)),
-                    'channels': int(audio_stream.get('channels', 0)),
-                }
-                
-                return info
-            else:
-                print(f"ffprobe error: {result.stderr}")
-                return {}
-            
-        except Exception as e:
-            print(f"Errore nel recupero delle informazioni audio: {e}")
-            return {}
\ No newline at end of file
+        # Un solo ffprobe per file: i risultati sono in cache
+        media = media_probe.probe(input_path, content_hash)
+        if not media:
+            return {}
+        
+        audio_stream = media['audio']
+        if not audio_stream:
+            print("Errore nel recupero delle informazioni audio: No audio stream found")
+            return {}
+        
+        return {
+            'format': media['format'],
+            'duration': media['duration'],
+            'size': media['size'],
+            'bitrate': media['bitrate'],
+            'codec': audio_stream['codec'],
+            'sample_rate': audio_stream['sample_rate'],
+            'channels': audio_stream['channels'],
+        }
@@ -33,6 +33,40 @@ class BaseConverter(ABC):
         """Restituisce una lista di formati supportati in output"""
         pass
     
+    def estimate_cost(self, input_path, info=None):
+        """
+        Stima il costo della conversione in secondi, usata per ordinare la coda.
+        Di default si basa sulla dimensione del file.
+        
+        Args:
+            input_path: percorso del file da convertire
+            info: metadati già noti del file (es. da /api/file-info), se disponibili
+            
+        Returns:
+            float: costo stimato in secondi
+        """
+        try:
+            return os.path.getsize(input_path) / (20 * 1024 * 1024)
+        except OSError:
+            return 0.0
+    
+    def is_cpu_bound(self, source_format, target_format, input_path=None):
+        """
+        Indica se la conversione gira in Python puro (trattenendo il GIL) e
+        conviene quindi eseguirla in un processo separato. I convertitori che
+        delegano a un sottoprocesso (ffmpeg, pandoc) restano sui thread.
+        input_path, se indicato, permette di decidere dal contenuto del file.
+        """
+        return False
+    
+    def uses_thread_budget(self, target_format=None, input_path=None):
+        """
+        Indica se la conversione (verso target_format, se indicato) accetta un
+        numero di thread dal budget CPU (cpu_lease). Gli altri convertitori
+        usano un solo core e lo riservano. input_path come in is_cpu_bound.
+        """
+        return False
+    
     def is_conversion_supported(self, source_format, target_format):
         """Verifica se la conversione è supportata"""
         return (source_format in self.get_supported_input_formats() and 
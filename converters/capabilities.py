@@ -0,0 +1,132 @@
+import subprocess
+import threading
+import time
+
+# Strumenti esterni usati dai convertitori
+TOOLS = ['ffmpeg', 'ffprobe', 'pandoc']
+
+# Encoder ffmpeg necessari per ciascun formato di output (ne basta uno)
+FORMAT_ENCODERS = {
+    'mp4': ['libx264'],
+    'webm': ['libvpx-vp9'],
+    'gif': ['gif'],
+    'webp': ['libwebp_anim'],
+    'hls': ['libx264'],
+    'dash': ['libx264'],
+    'mp3': ['libmp3lame'],
+    'ogg': ['libvorbis'],
+    'opus': ['libopus', 'opus'],
+    'aac': ['aac'],
+    'm4a': ['aac'],
+    'flac': ['flac'],
+    'wav': ['pcm_s16le'],
+}
+
+
+class CapabilityRegistry:
+    """
+    Registro delle capacità del sistema: quali strumenti esterni sono
+    installati (ffmpeg, ffprobe, pandoc) e quali encoder offre ffmpeg.
+
+    Le verifiche vengono fatte una volta sola, alla prima richiesta o con
+    refresh(), invece che a ogni costruzione di un convertitore.
+    """
+
+    def __init__(self):
+        self.tools = {}
+        self.encoders = set()
+        self.version = 0
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+
+    def refresh(self):
+        """
+        Ripete tutte le verifiche (es. dopo aver installato pandoc)
+
+        Returns:
+            dict: istantanea delle capacità
+        """
+        with self._refresh_lock:
+            tools = {name: self._probe_tool(name) for name in TOOLS}
+            encoders = self._probe_encoders() if tools['ffmpeg']['available'] else set()
+
+            if not tools['pandoc']['available']:
+                print("Pandoc non è installato. Alcune conversioni potrebbero essere limitate.")
+
+            with self._lock:
+                self.tools = tools
+                self.encoders = encoders
+                self.version += 1
+                self.refreshed_at = time.time()
+        return self.snapshot()
+
+    def _ensure_probed(self):
+        if self.version == 0:
+            with self._refresh_lock:
+                if self.version == 0:
+                    self.refresh()
+
+    def has_tool(self, name):
+        """True se lo strumento esterno è installato e risponde"""
+        self._ensure_probed()
+        return self.tools.get(name, {}).get('available', False)
+
+    def has_encoder(self, name):
+        """True se ffmpeg è stato compilato con l'encoder indicato"""
+        self._ensure_probed()
+        return name in self.encoders
+
+    def supports_output(self, output_format):
+        """True se ffmpeg ha almeno un encoder adatto al formato (o se non ne servono)"""
+        encoders = FORMAT_ENCODERS.get(output_format)
+        if not encoders:
+            return True
+        return any(self.has_encoder(encoder) for encoder in encoders)
+
+    def snapshot(self):
+        self._ensure_probed()
+        with self._lock:
+            return {
+                'version': self.version,
+                'refreshed_at': self.refreshed_at,
+                'tools': dict(self.tools),
+                'encoders': sorted(self.encoders),
+            }
+
+    @staticmethod
+    def _probe_tool(name):
+        """Esegue `<tool> -version` e ne legge la prima riga"""
+        try:
+            result = subprocess.run([name, '-version' if name != 'pandoc' else '--version'],
+                                    capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            return {'available': False, 'version': None}
+
+        first_line = result.stdout.splitlines()[0] if result.stdout else ''
+        return {'available': result.returncode == 0, 'version': first_line or None}
+
+    @staticmethod
+    def _probe_encoders():
+        """Elenca gli encoder dall'output di `ffmpeg -encoders`"""
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                    capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            return set()
+
+        encoders = set()
+        listing = False
+        for line in result.stdout.splitlines():
+            # Le righe prima di " ------" sono la legenda dei flag
+            if line.strip().startswith('------'):
+                listing = True
+                continue
+            parts = line.split()
+            if listing and len(parts) >= 2:
+                encoders.add(parts[1])
+        return encoders
+
+
+# Registro condiviso da tutto il processo
+capabilities = CapabilityRegistry()
@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import shutil
+
+
+class ConversionEdge:
+    """Un passo di conversione tra due formati, eseguito sui dati in memoria"""
+
+    def __init__(self, source, target, cost, function):
+        """
+        Args:
+            source: formato di partenza
+            target: formato di arrivo
+            cost: costo relativo del passo (più basso = preferito)
+            function: funzione (valore, **kwargs) -> valore nel formato target
+        """
+        self.source = source
+        self.target = target
+        self.cost = cost
+        self.function = function
+
+    def __repr__(self):
+        return f"{self.source}->{self.target}"
+
+
+class ConversionGraph:
+    """
+    Grafo delle conversioni tra formati.
+
+    Ogni formato ha un loader (file -> valore in memoria) e un dumper
+    (valore -> file); gli archi trasformano valori in memoria. Per una
+    coppia qualsiasi il planner sceglie con Dijkstra la catena di costo
+    minimo, e gli intermedi passano da un passo all'altro senza essere
+    riscritti su disco: il file viene letto una volta e scritto una volta.
+    """
+
+    def __init__(self):
+        self._formats = {}
+        self._edges = {}
+        self._aliases = {}
+
+    def add_format(self, name, load, dump, aliases=()):
+        """
+        Args:
+            name: nome del formato
+            load: funzione (percorso) -> valore in memoria
+            dump: funzione (valore, percorso) che scrive il file
+            aliases: estensioni equivalenti (es. 'htm' per 'html')
+        """
+        self._formats[name] = (load, dump)
+        self._edges.setdefault(name, [])
+        for alias in aliases:
+            self._aliases[alias] = name
+
+    def add_edge(self, source, target, cost, function):
+        self._edges.setdefault(source, []).append(ConversionEdge(source, target, cost, function))
+
+    def normalize(self, fmt):
+        """Risolve gli alias delle estensioni"""
+        return self._aliases.get(fmt, fmt)
+
+    def formats(self):
+        return set(self._formats)
+
+    def plan(self, source, target):
+        """
+        Trova la catena di conversione più economica
+
+        Returns:
+            tuple: (costo totale, lista di ConversionEdge) oppure None se non esiste
+        """
+        source, target = self.normalize(source), self.normalize(target)
+        if source not in self._formats or target not in self._formats:
+            return None
+        if source == target:
+            return 0, []
+
+        # Il contatore evita di confrontare le liste a parità di costo
+        counter = itertools.count()
+        queue = [(0, next(counter), source, [])]
+        best = {source: 0}
+        while queue:
+            cost, _, node, path = heapq.heappop(queue)
+            if node == target:
+                return cost, path
+            if cost > best.get(node, float('inf')):
+                continue
+            for edge in self._edges.get(node, []):
+                new_cost = cost + edge.cost
+                if new_cost < best.get(edge.target, float('inf')):
+                    best[edge.target] = new_cost
+                    heapq.heappush(queue, (new_cost, next(counter), edge.target, path + [edge]))
+        return None
+
+    def execute(self, path, input_path, output_path, **kwargs):
+        """
+        Esegue una catena: legge l'input, applica i passi in memoria e scrive l'output
+
+        Args:
+            path: lista di ConversionEdge restituita da plan()
+            input_path: file da convertire
+            output_path: file da scrivere
+            **kwargs: opzioni passate a ogni passo
+        """
+        if not path:
+            # Stesso formato: basta una copia
+            shutil.copyfile(input_path, output_path)
+            return
+
+        load, _ = self._formats[path[0].source]
+        _, dump = self._formats[path[-1].target]
+
+        value = load(input_path)
+        for edge in path:
+            value = edge.function(value, **kwargs)
+        dump(value, output_path)
@@ -1,3 +1,5 @@
+import threading
+
 from .image_converter import ImageConverter
 from .audio_converter import AudioConverter
 from .video_converter import VideoConverter
@@ -6,25 +8,40 @@ from .document_converter import DocumentConverter
 class ConverterFactory:
     """Factory per creare i convertitori appropriati basati sul tipo di file"""
     
-    @staticmethod
-    def get_converter(file_mime_type, source_format=None, target_format=None):
+    # I convertitori non hanno stato per file: un'istanza per classe basta
+    # a tutto il processo ed è condivisa tra i thread
+    _instances = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _shared(cls, converter_class):
+        instance = cls._instances.get(converter_class)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(converter_class)
+                if instance is None:
+                    instance = cls._instances[converter_class] = converter_class()
+        return instance
+    
+    @classmethod
+    def get_converter(cls, file_mime_type, source_format=None, target_format=None):
         """
         Restituisce un convertitore appropriato basato sul MIME type
         
         Args:
             file_mime_type: MIME type del file
-            source_format: formato sorgente (opzionale)
-            target_format: formato target (opzionale)
+            source_format: formato sorgente (opzionale, non più usato)
+            target_format: formato target (opzionale, non più usato)
             
         Returns:
-            BaseConverter: un'istanza del convertitore appropriato
+            BaseConverter: l'istanza condivisa del convertitore appropriato
         """
         if file_mime_type.startswith('image/'):
-            return ImageConverter(source_format, target_format)
+            return cls._shared(ImageConverter)
         elif file_mime_type.startswith('audio/'):
-            return AudioConverter(source_format, target_format)
+            return cls._shared(AudioConverter)
         elif file_mime_type.startswith('video/'):
-            return VideoConverter(source_format, target_format)
+            return cls._shared(VideoConverter)
         elif file_mime_type.startswith('application/pdf') or \
              file_mime_type.startswith('application/msword') or \
              file_mime_type.startswith('application/vnd.openxmlformats-officedocument') or \
@@ -32,6 +49,6 @@ class ConverterFactory:
              file_mime_type.startswith('application/rtf') or \
              file_mime_type.startswith('application/epub+zip') or \
              file_mime_type.startswith('application/vnd.oasis.opendocument'):
-            return DocumentConverter(source_format, target_format)
+            return cls._shared(DocumentConverter)
         else:
             return None
\ No newline at end of file
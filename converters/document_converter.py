@@ -1,4 +1,6 @@
 import os
+import io
+import html
 import shutil
 import subprocess
 import tempfile
@@ -28,25 +30,29 @@ import json
 import xml.etree.ElementTree as ET
 
 from .base_converter import BaseConverter
+from .capabilities import capabilities
+from .conversion_graph import ConversionGraph
+
+# Formati che Pandoc non legge o non scrive: per questi resta solo il grafo
+PANDOC_UNREADABLE = {'pdf', 'doc', 'csv', 'json', 'xml'}
+PANDOC_UNWRITABLE = {'csv', 'json', 'xml'}
+
+# Costo di Pandoc rispetto ai passi in memoria (avvia un processo, e per
+# il PDF anche un motore LaTeX)
+PANDOC_COST = 2.5
+PANDOC_PDF_COST = 4.5
 
 class DocumentConverter(BaseConverter):
     """Convertitore per documenti (PDF, DOC, DOCX, TXT, HTML, MD, ecc.)"""
     
     def __init__(self, source_format=None, target_format=None):
         super().__init__(source_format, target_format)
-        # Verifica se Pandoc è disponibile per conversioni avanzate
-        self.pandoc_available = self._check_pandoc()
+        self.graph = self._build_graph()
         
-    def _check_pandoc(self):
-        """Verifica se Pandoc è installato nel sistema"""
-        try:
-            result = subprocess.run(['pandoc', '--version'], 
-                                   stdout=subprocess.PIPE, 
-                                   stderr=subprocess.PIPE)
-            return result.returncode == 0
-        except FileNotFoundError:
-            print("Pandoc non è installato. Alcune conversioni potrebbero essere limitate.")
-            return False
+    @property
+    def pandoc_available(self):
+        """Pandoc serve per le conversioni avanzate; la verifica è fatta una volta dal registro"""
+        return capabilities.has_tool('pandoc')
     
     def get_supported_input_formats(self):
         formats = [
@@ -63,7 +69,7 @@ class DocumentConverter(BaseConverter):
     def get_supported_output_formats(self):
         formats = [
             'pdf', 'docx', 'odt', 'txt', 'rtf', 'html',
-            'md', 'markdown', 'csv', 'json'
+            'md', 'markdown', 'csv', 'json', 'xml'
         ]
         
         # Se Pandoc è disponibile, aggiungi altri formati
@@ -72,6 +78,35 @@ class DocumentConverter(BaseConverter):
             
         return formats
     
+    def is_cpu_bound(self, source_format, target_format, input_path=None):
+        plan = self._plan(source_format, target_format)
+        return plan is not None and plan[0] != 'pandoc'
+    
+    def _plan(self, source_format, target_format):
+        """
+        Sceglie come eseguire una conversione: la catena più economica del
+        grafo oppure Pandoc in un solo passo, se costa meno
+        
+        Returns:
+            tuple: ('graph', lista di passi) o ('pandoc', None); None se non supportata
+        """
+        candidates = []
+        
+        planned = self.graph.plan(source_format, target_format)
+        if planned is not None:
+            candidates.append((planned[0], 'graph', planned[1]))
+        
+        if (self.pandoc_available and source_format not in PANDOC_UNREADABLE
+                and target_format not in PANDOC_UNWRITABLE):
+            cost = PANDOC_PDF_COST if target_format == 'pdf' else PANDOC_COST
+            candidates.append((cost, 'pandoc', None))
+        
+        if not candidates:
+            return None
+        # A parità di costo vince il grafo, che non avvia processi esterni
+        _, route, path = min(candidates, key=lambda candidate: candidate[0])
+        return route, path
+    
     def convert(self, input_path, output_path, **kwargs):
         """
         Converte un documento dal formato sorgente al formato target
@@ -95,372 +130,331 @@ class DocumentConverter(BaseConverter):
             source_format = os.path.splitext(input_path)[1][1:].lower()
             target_format = os.path.splitext(output_path)[1][1:].lower()
             
-            # Estrai opzioni
-            preserve_metadata = kwargs.get('preserve_metadata', True)
-            paper_size = kwargs.get('paper_size', 'A4')
-            margins = kwargs.get('margins', {'top': 20, 'right': 20, 'bottom': 20, 'left': 20})
-            font = kwargs.get('font', None)
-            font_size = kwargs.get('font_size', None)
-            header_footer = kwargs.get('header_footer', None)
-            toc = kwargs.get('toc', False)
-            template = kwargs.get('template', None)
-            encrypted_pdf = kwargs.get('encrypted_pdf', False)
-            password = kwargs.get('password', '')
-            
-            # Per conversioni da/a PDF
-            if source_format in ['pdf'] or target_format in ['pdf']:
-                return self._convert_pdf(input_path, output_path, source_format, target_format, **kwargs)
-            
-            # Per conversioni tra formati Office
-            elif source_format in ['doc', 'docx', 'odt', 'rtf'] and target_format in ['doc', 'docx', 'odt', 'rtf']:
-                return self._convert_office_formats(input_path, output_path, source_format, target_format, **kwargs)
-            
-            # Per conversioni da/a formati di testo semplice
-            elif source_format in ['txt', 'md', 'markdown', 'html', 'htm'] or target_format in ['txt', 'md', 'markdown', 'html', 'htm']:
-                return self._convert_text_formats(input_path, output_path, source_format, target_format, **kwargs)
-            
-            # Per conversioni da/a formati strutturati (CSV, JSON, XML)
-            elif source_format in ['csv', 'json', 'xml'] or target_format in ['csv', 'json', 'xml']:
-                return self._convert_structured_formats(input_path, output_path, source_format, target_format, **kwargs)
+            plan = self._plan(source_format, target_format)
+            if plan is None:
+                print(f"Conversione da {source_format} a {target_format} non supportata")
+                return False
             
-            # Utilizzo Pandoc per altre conversioni se disponibile
-            elif self.pandoc_available:
+            route, path = plan
+            if route == 'pandoc':
                 return self._convert_with_pandoc(input_path, output_path, source_format, target_format, **kwargs)
             
-            else:
-                print(f"Conversione da {source_format} a {target_format} non supportata")
-                return False
+            # Catena di passi in memoria: il file viene letto e scritto una sola volta
+            self.graph.execute(path, input_path, output_path, **kwargs)
+            return True
                 
         except Exception as e:
             print(f"Errore durante la conversione del documento: {e}")
             return False
-
-    def _convert_pdf(self, input_path, output_path, source_format, target_format, **kwargs):
-        """Gestisce la conversione da/a PDF"""
+    
+    def _build_graph(self):
+        """Registra formati e passi di conversione in Python puro"""
+        graph = ConversionGraph()
         
-        if source_format == 'pdf' and target_format in ['txt', 'md', 'markdown', 'html']:
-            # Conversione da PDF a testo/markdown/html
-            try:
-                reader = PdfReader(input_path)
-                
-                # Se il PDF è crittografato, prova a decifrarlo
-                if kwargs.get('encrypted_pdf', False) and reader.is_encrypted:
-                    if not reader.decrypt(kwargs.get('password', '')):
-                        raise ValueError("Password PDF non valida")
-                
-                # Estrai il testo da tutte le pagine
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n\n"
-                
-                # Converti in formato appropriato
-                if target_format in ['md', 'markdown']:
-                    # Tentativo molto semplice di formattazione markdown
-                    # Una soluzione più completa richiederebbe l'analisi della struttura del documento
-                    text = text.replace('\n\n', '\n\n## ').replace('\t', '    ')
-                    text = "# Documento convertito\n\n" + text
-                elif target_format == 'html':
-                    # Conversione molto semplice, senza analisi della struttura
-                    text = f"<html><body><pre>{text}</pre></body></html>"
-                
-                # Salva il risultato
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                
-                return True
-                
-            except Exception as e:
-                print(f"Errore nella conversione da PDF: {e}")
-                return False
-                
-        elif target_format == 'pdf':
-            # Conversione a PDF
-            try:
-                if source_format == 'docx':
-                    # Usa docx2pdf se disponibile (Windows/Office installato)
-                    if docx_to_pdf is not None:
-                        try:
-                            docx_to_pdf(input_path, output_path)
-                            return True
-                        except Exception as e:
-                            print(f"docx2pdf fallito, tento fallback: {e}")
-                    
-                    # Fallback: Pure Python conversion (Linux/Render)
-                    return self._docx_to_pdf_fallback(input_path, output_path)
-
-                elif source_format in ['md', 'markdown', 'txt', 'html', 'htm']:
-                    # Usa Pandoc se disponibile
-                    if self.pandoc_available:
-                        return self._convert_with_pandoc(input_path, output_path, source_format, target_format, **kwargs)
-                    else:
-                        # Fallback: converti a HTML e poi usa una libreria di rendering HTML a PDF
-                        # Questo è un esempio semplificato, una versione completa richiederebbe weasyprint o simili
-                        if source_format in ['md', 'markdown']:
-                            with open(input_path, 'r', encoding='utf-8') as f:
-                                html_content = markdown(f.read())
-                        elif source_format == 'txt':
-                            with open(input_path, 'r', encoding='utf-8') as f:
-                                text = f.read()
-                                html_content = f"<html><body><pre>{text}</pre></body></html>"
-                        else:  # HTML
-                            with open(input_path, 'r', encoding='utf-8') as f:
-                                html_content = f.read()
-                        
-                        # Qui dovresti usare una libreria come weasyprint per convertire HTML a PDF
-                        # Questo è solo un segnaposto
-                        print("Necessaria una libreria HTML-to-PDF come WeasyPrint per questa conversione")
-                        return False
-            except Exception as e:
-                print(f"Errore nella conversione a PDF: {e}")
-                return False
+        # Formati e rappresentazione in memoria
+        for fmt, aliases in [('txt', ()), ('md', ('markdown',)), ('html', ('htm',))]:
+            graph.add_format(fmt, self._load_text, self._dump_text, aliases)
+        graph.add_format('csv', self._load_csv, self._dump_csv)      # lista di righe (dict)
+        graph.add_format('json', self._load_json, self._dump_json)   # oggetti Python
+        graph.add_format('xml', self._load_xml, self._dump_xml)      # ElementTree.Element
+        graph.add_format('pdf', self._load_binary, self._dump_binary)
+        graph.add_format('docx', self._load_binary, self._dump_binary)
         
-        # Se siamo qui, il formato non è supportato
-        return self._convert_with_pandoc(input_path, output_path, source_format, target_format, **kwargs)
-    
-    def _convert_office_formats(self, input_path, output_path, source_format, target_format, **kwargs):
-        """Gestisce la conversione tra formati Office (docx, odt, rtf)"""
+        # Testo
+        graph.add_edge('md', 'html', 1, lambda content, **kwargs: markdown(content))
+        graph.add_edge('html', 'md', 1, self._html_to_markdown)
+        graph.add_edge('html', 'txt', 1, lambda content, **kwargs: BeautifulSoup(content, 'html.parser').get_text())
+        # Conversione semplice per markdown -> txt: rimuove i caratteri speciali
+        graph.add_edge('md', 'txt', 1, lambda content, **kwargs: content.replace('#', '').replace('*', '').replace('_', ''))
+        graph.add_edge('txt', 'html', 1, lambda content, **kwargs: f"<html><body><pre>{content}</pre></body></html>")
+        graph.add_edge('txt', 'md', 1, self._text_to_markdown)
         
-        # Per la maggior parte delle conversioni tra formati Office, Pandoc è l'opzione migliore
-        if self.pandoc_available:
-            return self._convert_with_pandoc(input_path, output_path, source_format, target_format, **kwargs)
+        # Dati strutturati
+        graph.add_edge('csv', 'json', 1, lambda rows, **kwargs: rows)
+        graph.add_edge('json', 'csv', 1, self._json_to_records)
+        graph.add_edge('xml', 'json', 1, self._xml_to_json)
+        graph.add_edge('json', 'xml', 1, self._json_to_xml)
+        graph.add_edge('csv', 'md', 1, self._records_to_markdown)
+        graph.add_edge('csv', 'html', 1, self._records_to_html)
         
-        # Implementazione base per docx -> txt
-        if source_format == 'docx' and target_format == 'txt':
-            try:
-                doc = docx.Document(input_path)
-                full_text = []
-                for para in doc.paragraphs:
-                    full_text.append(para.text)
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(full_text))
-                
-                return True
-            except Exception as e:
-                print(f"Errore nella conversione docx -> txt: {e}")
-                return False
+        # PDF e DOCX
+        graph.add_edge('pdf', 'txt', 3, self._pdf_to_text)
+        graph.add_edge('pdf', 'md', 3, self._pdf_to_markdown)
+        graph.add_edge('pdf', 'html', 3, self._pdf_to_html)
+        graph.add_edge('docx', 'txt', 2, self._docx_to_text)
+        graph.add_edge('docx', 'pdf', 4, self._docx_to_pdf)
+        graph.add_edge('txt', 'docx', 2, self._text_to_docx)
+        graph.add_edge('txt', 'pdf', 4, self._text_to_pdf)
         
-        # Per altre conversioni, non abbiamo un percorso diretto
-        print(f"Conversione diretta da {source_format} a {target_format} non implementata")
-        return False
+        return graph
     
-    def _convert_text_formats(self, input_path, output_path, source_format, target_format, **kwargs):
-        """Gestisce la conversione tra formati di testo (txt, md, html)"""
-        try:
-            # Carica il contenuto di origine
-            with open(input_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Converti in base al formato di destinazione
-            if source_format in ['md', 'markdown'] and target_format == 'html':
-                # Markdown a HTML
-                html_content = markdown(content)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-                
-            elif source_format in ['html', 'htm'] and target_format in ['md', 'markdown']:
-                # HTML a Markdown
-                h = html2text.HTML2Text()
-                h.ignore_links = False
-                md_content = h.handle(content)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(md_content)
-                
-            elif source_format in ['html', 'htm', 'md', 'markdown'] and target_format == 'txt':
-                # HTML/Markdown a testo semplice
-                if source_format in ['html', 'htm']:
-                    soup = BeautifulSoup(content, 'html.parser')
-                    text_content = soup.get_text()
-                else:
-                    # Conversione più semplice per markdown -> txt
-                    # Rimuove i caratteri speciali di markdown
-                    text_content = content.replace('#', '').replace('*', '').replace('_', '')
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text_content)
-                
-            elif source_format == 'txt' and target_format in ['html', 'htm']:
-                # Testo semplice a HTML
-                html_content = f"<html><body><pre>{content}</pre></body></html>"
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-                
-            elif source_format == 'txt' and target_format in ['md', 'markdown']:
-                # Testo semplice a Markdown (aggiungendo struttura minima)
-                lines = content.split('\n')
-                md_content = ""
-                for i, line in enumerate(lines):
-                    if i == 0:
-                        md_content += f"# {line}\n\n"
-                    elif line.strip() == '':
-                        md_content += "\n"
-                    else:
-                        md_content += f"{line}\n"
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(md_content)
-            
+    # Lettura e scrittura dei formati
+    @staticmethod
+    def _load_text(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    @staticmethod
+    def _dump_text(content, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    
+    @staticmethod
+    def _load_csv(path):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    
+    @staticmethod
+    def _dump_csv(rows, path):
+        # Estrai tutti i campi possibili
+        fieldnames = set()
+        for row in rows:
+            fieldnames.update(row.keys())
+        
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=sorted(fieldnames))
+            writer.writeheader()
+            writer.writerows(rows)
+    
+    @staticmethod
+    def _load_json(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    @staticmethod
+    def _dump_json(data, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    
+    @staticmethod
+    def _load_xml(path):
+        return ET.parse(path).getroot()
+    
+    @staticmethod
+    def _dump_xml(root, path):
+        ET.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
+    
+    @staticmethod
+    def _load_binary(path):
+        # PyPDF2 e python-docx accettano sia percorsi che file in memoria
+        return path
+    
+    @staticmethod
+    def _dump_binary(value, path):
+        if isinstance(value, str):
+            shutil.copyfile(value, path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(value.getvalue())
+    
+    # Passi tra formati di testo
+    @staticmethod
+    def _html_to_markdown(content, **kwargs):
+        h = html2text.HTML2Text()
+        h.ignore_links = False
+        return h.handle(content)
+    
+    @staticmethod
+    def _text_to_markdown(content, **kwargs):
+        """Testo semplice a Markdown (aggiungendo struttura minima)"""
+        lines = content.split('\n')
+        md_content = ""
+        for i, line in enumerate(lines):
+            if i == 0:
+                md_content += f"# {line}\n\n"
+            elif line.strip() == '':
+                md_content += "\n"
             else:
-                # Per altre conversioni, usa Pandoc se disponibile
-                if self.pandoc_available:
-                    return self._convert_with_pandoc(input_path, output_path, source_format, target_format, **kwargs)
-                else:
-                    return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"Errore nella conversione di formati testuali: {e}")
-            return False
+                md_content += f"{line}\n"
+        return md_content
     
-    def _convert_structured_formats(self, input_path, output_path, source_format, target_format, **kwargs):
-        """Gestisce la conversione tra formati strutturati (csv, json, xml)"""
-        try:
-            # CSV -> JSON
-            if source_format == 'csv' and target_format == 'json':
-                data = []
-                with open(input_path, 'r', newline='', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        data.append(row)
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2)
-                
-                return True
-            
-            # JSON -> CSV
-            elif source_format == 'json' and target_format == 'csv':
-                with open(input_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Supporta solo array di oggetti
-                if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
-                    raise ValueError("Il JSON deve essere un array di oggetti")
-                
-                # Estrai tutti i campi possibili
-                fieldnames = set()
-                for item in data:
-                    fieldnames.update(item.keys())
-                
-                with open(output_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=sorted(fieldnames))
-                    writer.writeheader()
-                    writer.writerows(data)
-                
-                return True
-            
-            # XML -> JSON
-            elif source_format == 'xml' and target_format == 'json':
-                def _parse_xml_element(elem):
-                    """Converte un elemento XML in dizionario per JSON"""
-                    result = {}
-                    # Gestisci attributi
-                    if elem.attrib:
-                        result["@attributes"] = elem.attrib
+    # Passi tra formati strutturati
+    @staticmethod
+    def _json_to_records(data, **kwargs):
+        """Riduce un JSON a righe per il CSV"""
+        # Un JSON che viene da un XML è annidato sotto il tag radice
+        # (es. {"rows": {"row": [...]}}): si scende finché c'è un solo figlio
+        while isinstance(data, dict) and len(data) == 1:
+            data = next(iter(data.values()))
+        
+        # Supporta solo array di oggetti
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise ValueError("Il JSON deve essere un array di oggetti")
+        
+        rows = []
+        for item in data:
+            row = {}
+            for key, value in item.items():
+                # Gli elementi XML semplici diventano {"#text": valore}
+                if isinstance(value, dict) and '#text' in value:
+                    value = value['#text']
+                row[key] = value
+            rows.append(row)
+        return rows
+    
+    @staticmethod
+    def _xml_to_json(root, **kwargs):
+        def _parse_xml_element(elem):
+            """Converte un elemento XML in dizionario per JSON"""
+            result = {}
+            # Gestisci attributi
+            if elem.attrib:
+                result["@attributes"] = elem.attrib
+            
+            # Gestisci elementi figli
+            children = list(elem)
+            if not children:
+                result["#text"] = elem.text.strip() if elem.text else ""
+            else:
+                child_elements = {}
+                for child in children:
+                    tag = child.tag
+                    child_dict = _parse_xml_element(child)
                     
-                    # Gestisci elementi figli
-                    children = list(elem)
-                    if not children:
-                        result["#text"] = elem.text.strip() if elem.text else ""
+                    if tag in child_elements:
+                        if not isinstance(child_elements[tag], list):
+                            child_elements[tag] = [child_elements[tag]]
+                        child_elements[tag].append(child_dict)
                     else:
-                        child_elements = {}
-                        for child in children:
-                            tag = child.tag
-                            child_dict = _parse_xml_element(child)
-                            
-                            if tag in child_elements:
-                                if not isinstance(child_elements[tag], list):
-                                    child_elements[tag] = [child_elements[tag]]
-                                child_elements[tag].append(child_dict)
-                            else:
-                                child_elements[tag] = child_dict
-                        
-                        result.update(child_elements)
-                    
-                    return result
-                
-                # Parse XML
-                tree = ET.parse(input_path)
-                root = tree.getroot()
-                data = {root.tag: _parse_xml_element(root)}
+                        child_elements[tag] = child_dict
                 
-                # Save as JSON
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2)
-                
-                return True
+                result.update(child_elements)
             
-            elif source_format == 'json' and target_format == 'xml':
-                # Questa è una conversione semplificata, una versione completa richiederebbe una mappatura più sofisticata
-                def _json_to_xml_element(data, root_name):
-                    """Converte strutture JSON in elementi XML"""
-                    if isinstance(data, dict):
-                        root = ET.Element(root_name)
-                        for key, value in data.items():
-                            if key == "@attributes":
-                                for attr_key, attr_val in value.items():
-                                    root.set(attr_key, str(attr_val))
-                            elif key == "#text":
-                                root.text = str(value)
-                            else:
-                                root.append(_json_to_xml_element(value, key))
-                        return root
-                    elif isinstance(data, list):
-                        root = ET.Element(root_name)
-                        for item in data:
-                            root.append(_json_to_xml_element(item, "item"))
-                        return root
+            return result
+        
+        return {root.tag: _parse_xml_element(root)}
+    
+    @staticmethod
+    def _json_to_xml(data, **kwargs):
+        # Questa è una conversione semplificata, una versione completa richiederebbe una mappatura più sofisticata
+        def _json_to_xml_element(data, root_name):
+            """Converte strutture JSON in elementi XML"""
+            if isinstance(data, dict):
+                root = ET.Element(root_name)
+                for key, value in data.items():
+                    if key == "@attributes":
+                        for attr_key, attr_val in value.items():
+                            root.set(attr_key, str(attr_val))
+                    elif key == "#text":
+                        root.text = str(value)
                     else:
-                        # Caso base: elementi semplici
-                        elem = ET.Element(root_name)
-                        elem.text = str(data)
-                        return elem
-                
-                # Parse JSON
-                with open(input_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Converti in XML
-                if isinstance(data, dict):
-                    # Usa la prima chiave come nome dell'elemento root
-                    root_name = next(iter(data))
-                    root = _json_to_xml_element(data[root_name], root_name)
-                else:
-                    # Se è una lista o valore semplice, crea un elemento "root"
-                    root = _json_to_xml_element(data, "root")
-                
-                # Salva come XML
-                tree = ET.ElementTree(root)
-                tree.write(output_path, encoding='utf-8', xml_declaration=True)
-                
-                return True
-            
-            elif source_format == 'csv' and target_format == 'xml':
-                # Prima converti CSV -> JSON, poi JSON -> XML
-                temp_json = tempfile.mktemp(suffix='.json')
-                if self._convert_structured_formats(input_path, temp_json, 'csv', 'json'):
-                    result = self._convert_structured_formats(temp_json, output_path, 'json', 'xml')
-                    os.unlink(temp_json)
-                    return result
-                return False
-            
-            elif source_format == 'xml' and target_format == 'csv':
-                # Prima converti XML -> JSON, poi JSON -> CSV
-                temp_json = tempfile.mktemp(suffix='.json')
-                if self._convert_structured_formats(input_path, temp_json, 'xml', 'json'):
-                    result = self._convert_structured_formats(temp_json, output_path, 'json', 'csv')
-                    os.unlink(temp_json)
-                    return result
-                return False
-            
+                        root.append(_json_to_xml_element(value, key))
+                return root
+            elif isinstance(data, list):
+                root = ET.Element(root_name)
+                for item in data:
+                    root.append(_json_to_xml_element(item, "item"))
+                return root
             else:
-                print(f"Conversione da {source_format} a {target_format} non supportata per formati strutturati")
-                return False
-            
-        except Exception as e:
-            print(f"Errore nella conversione di formati strutturati: {e}")
-            return False
+                # Caso base: elementi semplici
+                elem = ET.Element(root_name)
+                elem.text = str(data)
+                return elem
+        
+        if isinstance(data, dict):
+            # Usa la prima chiave come nome dell'elemento root
+            root_name = next(iter(data))
+            return _json_to_xml_element(data[root_name], root_name)
+        # Se è una lista o valore semplice, crea un elemento "root"
+        return _json_to_xml_element(data, "root")
+    
+    @staticmethod
+    def _records_fieldnames(rows):
+        fieldnames = []
+        for row in rows:
+            for key in row:
+                if key not in fieldnames:
+                    fieldnames.append(key)
+        return fieldnames
+    
+    def _records_to_markdown(self, rows, **kwargs):
+        """Righe CSV come tabella Markdown"""
+        fieldnames = self._records_fieldnames(rows)
+        
+        def cell(value):
+            return str(value if value is not None else '').replace('|', '\\|').replace('\n', ' ')
+        
+        lines = ['| ' + ' | '.join(cell(name) for name in fieldnames) + ' |',
+                 '|' + '---|' * len(fieldnames)]
+        for row in rows:
+            lines.append('| ' + ' | '.join(cell(row.get(name)) for name in fieldnames) + ' |')
+        return '\n'.join(lines) + '\n'
+    
+    def _records_to_html(self, rows, **kwargs):
+        """Righe CSV come tabella HTML"""
+        fieldnames = self._records_fieldnames(rows)
+        
+        def cell(tag, value):
+            return f"<{tag}>{html.escape(str(value if value is not None else ''))}</{tag}>"
+        
+        lines = ['<html><body><table>',
+                 '<tr>' + ''.join(cell('th', name) for name in fieldnames) + '</tr>']
+        for row in rows:
+            lines.append('<tr>' + ''.join(cell('td', row.get(name)) for name in fieldnames) + '</tr>')
+        lines.append('</table></body></html>')
+        return '\n'.join(lines)
+    
+    # Passi da/a PDF e DOCX
+    @staticmethod
+    def _pdf_to_text(source, **kwargs):
+        reader = PdfReader(source)
+        
+        # Se il PDF è crittografato, prova a decifrarlo
+        if kwargs.get('encrypted_pdf', False) and reader.is_encrypted:
+            if not reader.decrypt(kwargs.get('password', '')):
+                raise ValueError("Password PDF non valida")
+        
+        # Estrai il testo da tutte le pagine
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text() + "\n\n"
+        return text
+    
+    def _pdf_to_markdown(self, source, **kwargs):
+        # Tentativo molto semplice di formattazione markdown
+        # Una soluzione più completa richiederebbe l'analisi della struttura del documento
+        text = self._pdf_to_text(source, **kwargs)
+        text = text.replace('\n\n', '\n\n## ').replace('\t', '    ')
+        return "# Documento convertito\n\n" + text
+    
+    def _pdf_to_html(self, source, **kwargs):
+        # Conversione molto semplice, senza analisi della struttura
+        return f"<html><body><pre>{self._pdf_to_text(source, **kwargs)}</pre></body></html>"
+    
+    @staticmethod
+    def _docx_to_text(source, **kwargs):
+        doc = docx.Document(source)
+        return '\n'.join(para.text for para in doc.paragraphs)
+    
+    @staticmethod
+    def _text_to_docx(content, **kwargs):
+        doc = docx.Document()
+        for line in content.split('\n'):
+            doc.add_paragraph(line)
+        
+        output = io.BytesIO()
+        doc.save(output)
+        return output
+    
+    def _docx_to_pdf(self, source, **kwargs):
+        # Usa docx2pdf se disponibile (Windows/Office installato)
+        if docx_to_pdf is not None and isinstance(source, str):
+            try:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    temp_pdf = os.path.join(temp_dir, 'output.pdf')
+                    docx_to_pdf(source, temp_pdf)
+                    with open(temp_pdf, 'rb') as f:
+                        return io.BytesIO(f.read())
+            except Exception as e:
+                print(f"docx2pdf fallito, tento fallback: {e}")
+        
+        # Fallback: Pure Python conversion (Linux/Render)
+        doc = docx.Document(source)
+        paragraphs = [(para.text, para.style.name.startswith('Heading')) for para in doc.paragraphs]
+        return self._render_pdf(paragraphs)
+    
+    def _text_to_pdf(self, content, **kwargs):
+        return self._render_pdf([(line, False) for line in content.split('\n')])
     
     def _convert_with_pandoc(self, input_path, output_path, source_format, target_format, **kwargs):
         """Utilizza Pandoc per conversioni avanzate"""
@@ -569,53 +563,53 @@ class DocumentConverter(BaseConverter):
             print(f"Errore nel recupero delle informazioni del documento: {e}")
             return {'format': ext, 'error': str(e)}
 
-    def _docx_to_pdf_fallback(self, input_path, output_path):
+    def _render_pdf(self, paragraphs):
         """
-        Fallback puro Python per convertire DOCX in PDF senza Word/LibreOffice.
+        Fallback puro Python per generare un PDF senza Word/LibreOffice.
         Utile per ambienti serverless come Render/Vercel.
-        """
-        try:
-            doc = docx.Document(input_path)
-            c = canvas.Canvas(output_path, pagesize=letter)
-            width, height = letter
+        
+        Args:
+            paragraphs: lista di tuple (testo, è_un_titolo)
             
-            # Margini
-            margin_left = 50
-            margin_top = 50
-            y_position = height - margin_top
+        Returns:
+            io.BytesIO: il PDF generato
+        """
+        output = io.BytesIO()
+        c = canvas.Canvas(output, pagesize=letter)
+        width, height = letter
+        
+        # Margini
+        margin_left = 50
+        margin_top = 50
+        y_position = height - margin_top
+        
+        # Font base
+        c.setFont("Helvetica", 12)
+        
+        for text, is_heading in paragraphs:
+            if not text:
+                continue
+            
+            # Gestione semplice dello stile (grassetto per titoli)
+            if is_heading:
+                c.setFont("Helvetica-Bold", 14)
+                y_position -= 10
+            else:
+                c.setFont("Helvetica", 12)
             
-            # Font base
-            c.setFont("Helvetica", 12)
+            # Wrap del testo
+            lines = textwrap.wrap(text, width=90)  # Approssimativo
             
-            for para in doc.paragraphs:
-                text = para.text
-                if not text:
-                    continue
-                
-                # Gestione semplice dello stile (grassetto per titoli)
-                if para.style.name.startswith('Heading'):
-                    c.setFont("Helvetica-Bold", 14)
-                    y_position -= 10
-                else:
+            for line in lines:
+                if y_position < 50:  # Nuova pagina
+                    c.showPage()
+                    y_position = height - margin_top
                     c.setFont("Helvetica", 12)
                 
-                # Wrap del testo
-                lines = textwrap.wrap(text, width=90)  # Approssimativo
-                
-                for line in lines:
-                    if y_position < 50:  # Nuova pagina
-                        c.showPage()
-                        y_position = height - margin_top
-                        c.setFont("Helvetica", 12)
-                    
-                    c.drawString(margin_left, y_position, line)
-                    y_position -= 15
-                
-                y_position -= 10  # Spazio tra paragrafi
+                c.drawString(margin_left, y_position, line)
+                y_position -= 15
             
-            c.save()
-            return True
-            
-        except Exception as e:
-            print(f"Errore nel fallback DOCX->PDF: {e}")
-            return False
\ No newline at end of file
+            y_position -= 10  # Spazio tra paragrafi
+        
+        c.save()
+        return output
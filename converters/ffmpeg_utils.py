@@ -0,0 +1,118 @@
+import subprocess
+import threading
+from collections import deque
+
+
+def _parse_out_time(value):
+    """Converte il campo out_time di ffmpeg (HH:MM:SS.micro) in secondi"""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def run_ffmpeg(cmd, duration=None, progress_callback=None, threads=None):
+    """
+    Esegue ffmpeg leggendo l'avanzamento dalla pipe -progress
+
+    Args:
+        cmd: comando ffmpeg come lista (il primo elemento deve essere 'ffmpeg')
+        duration: durata attesa dell'output in secondi, per calcolare la percentuale
+        progress_callback: funzione chiamata con (percentuale, velocità)
+        threads: thread per encoder e filtri (es. dal budget CPU); None lascia
+            decidere a ffmpeg, che usa tutti i core
+
+    Returns:
+        subprocess.CompletedProcess: con returncode e le ultime righe di stderr
+    """
+    # -progress scrive coppie chiave=valore su stdout, -nostats evita il
+    # riepilogo continuo su stderr che altrimenti andrebbe bufferizzato
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    if threads:
+        cmd = with_threads(cmd, threads)
+
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, errors='replace')
+
+    # stderr va letto in parallelo per non bloccare ffmpeg; teniamo solo la coda
+    stderr_tail = deque(maxlen=50)
+    stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    stderr_reader.start()
+
+    last_percent = -1
+    speed = None
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+
+        if key == 'speed':
+            speed = value.strip() or None
+        elif key == 'out_time' and duration:
+            seconds = _parse_out_time(value)
+            if seconds is not None and progress_callback:
+                percent = max(0.0, min(99.9, seconds / duration * 100))
+                # Notifica solo variazioni apprezzabili
+                if percent - last_percent >= 0.5:
+                    last_percent = percent
+                    progress_callback(round(percent, 1), speed)
+        elif key == 'progress' and value == 'end' and progress_callback:
+            progress_callback(100.0, speed)
+
+    process.wait()
+    stderr_reader.join()
+
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout='',
+                                       stderr=''.join(stderr_tail))
+
+
+def with_threads(cmd, threads):
+    """
+    Limita i thread di un comando ffmpeg: -filter_threads e
+    -filter_complex_threads sono opzioni globali, -threads vale per
+    l'encoder e va quindi subito prima del file di output (ultimo elemento).
+    """
+    threads = str(threads)
+    return ([cmd[0], '-filter_threads', threads, '-filter_complex_threads', threads] +
+            list(cmd[1:-1]) + ['-threads', threads, cmd[-1]])
+
+
+# Codec che ciascun container accetta senza ricodifica (None = qualsiasi)
+CONTAINER_CODECS = {
+    'mp4': {'video': {'h264', 'hevc', 'mpeg4', 'av1', 'vp9'},
+            'audio': {'aac', 'mp3', 'alac', 'opus', 'ac3', 'eac3', 'flac'}},
+    'm4v': {'video': {'h264', 'hevc', 'mpeg4'},
+            'audio': {'aac', 'mp3', 'alac', 'ac3', 'eac3'}},
+    'mov': {'video': {'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'},
+            'audio': {'aac', 'mp3', 'alac', 'pcm_s16le', 'pcm_s24le'}},
+    'mkv': {'video': None, 'audio': None},
+    'webm': {'video': {'vp8', 'vp9', 'av1'},
+             'audio': {'opus', 'vorbis'}},
+    'avi': {'video': {'mpeg4', 'h264', 'mjpeg', 'msmpeg4v3'},
+            'audio': {'mp3', 'ac3', 'pcm_s16le'}},
+    # Container solo audio
+    'm4a': {'video': set(), 'audio': {'aac', 'alac'}},
+    'aac': {'video': set(), 'audio': {'aac'}},
+    'mp3': {'video': set(), 'audio': {'mp3'}},
+    'ogg': {'video': set(), 'audio': {'vorbis', 'opus', 'flac'}},
+    'opus': {'video': set(), 'audio': {'opus'}},
+    'flac': {'video': set(), 'audio': {'flac'}},
+    'wav': {'video': set(), 'audio': {'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_f32le', 'pcm_u8'}},
+}
+
+
+def accepts_codec(container, kind, codec):
+    """
+    Indica se un container può contenere un flusso così com'è
+
+    Args:
+        container: formato di output (estensione)
+        kind: 'video' o 'audio'
+        codec: nome del codec secondo ffprobe
+
+    Returns:
+        bool: True se il flusso può essere copiato senza ricodifica
+    """
+    codecs = CONTAINER_CODECS.get(container, {}).get(kind, set())
+    if codecs is None:
+        return True
+    return codec in codecs
@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Target che produce una cartella di fotogrammi con il relativo indice
+FRAMES_FORMAT = 'frames'
+FRAMES_INDEX = 'frames.json'
+
+# Formati immagine in cui un video può essere esportato (miniatura o sprite sheet)
+FRAME_IMAGE_FORMATS = ['jpg', 'jpeg', 'png']
+
+# Limite ai fotogrammi estratti in una sola richiesta
+MAX_FRAMES = 500
+
+# Valori di default per sprite sheet e istantanee
+SPRITE_FRAMES = 25
+SPRITE_WIDTH = 160
+SNAPSHOT_FRAMES = 10
+
+
+def is_frames_output(output_path):
+    """True se output_path è l'indice di una cartella di fotogrammi"""
+    return os.path.basename(output_path) == FRAMES_INDEX
+
+
+def frame_times(duration, count=None, interval=None, timestamps=None):
+    """
+    Calcola gli istanti da estrarre
+
+    Args:
+        duration: durata del video in secondi
+        count: numero di fotogrammi distribuiti uniformemente
+        interval: un fotogramma ogni `interval` secondi
+        timestamps: istanti espliciti (hanno la precedenza)
+
+    Returns:
+        list: istanti in secondi, ordinati e compresi nella durata
+    """
+    if timestamps:
+        times = sorted(float(t) for t in timestamps if float(t) >= 0)
+        if duration:
+            times = [t for t in times if t < duration]
+        return times[:MAX_FRAMES]
+
+    if not duration:
+        return [0.0]
+
+    if interval and interval > 0:
+        count = min(MAX_FRAMES, max(1, int(duration // interval)))
+        return [round(index * interval, 3) for index in range(count)]
+
+    # Al centro di intervalli uguali: si evitano il primo fotogramma (spesso
+    # nero) e la fine del file, dove un seek potrebbe non trovare nulla
+    count = min(MAX_FRAMES, max(1, int(count or 1)))
+    step = duration / count
+    return [round((index + 0.5) * step, 3) for index in range(count)]
+
+
+def extract_frames(input_path, times, output_pattern, width=None, exact=False, workers=None):
+    """
+    Estrae un fotogramma per ogni istante, con seek lato input e processi in parallelo
+
+    Ogni estrazione è un ffmpeg indipendente che salta direttamente al
+    punto richiesto. Quando non serve il fotogramma esatto vengono decodificati
+    solo i keyframe: si ottiene il keyframe più vicino prima dell'istante, senza
+    decodificare il resto del GOP.
+
+    Args:
+        input_path: video sorgente
+        times: istanti in secondi
+        output_pattern: percorso con un segnaposto per l'indice (es. 'frame_{:04d}.jpg')
+        width: larghezza dei fotogrammi (None = originale)
+        exact: True per il fotogramma esatto (decodifica dal keyframe precedente)
+        workers: processi ffmpeg contemporanei (di default uno per core)
+
+    Returns:
+        list: tuple (istante, percorso) dei fotogrammi estratti, nell'ordine di times
+    """
+    def grab(index):
+        path = output_pattern.format(index + 1)
+        cmd = ['ffmpeg', '-y', '-v', 'error']
+        if not exact:
+            cmd.extend(['-noaccurate_seek', '-skip_frame', 'nokey'])
+        # passthrough: il keyframe precede l'istante richiesto, quindi ha un
+        # timestamp negativo che la conversione del frame rate scarterebbe
+        cmd.extend(['-ss', str(times[index]), '-i', input_path,
+                    '-map', '0:v:0', '-frames:v', '1', '-fps_mode', 'passthrough', '-threads', '1'])
+        if width:
+            cmd.extend(['-vf', f'scale={int(width)}:-2'])
+        if path.lower().endswith(('.jpg', '.jpeg')):
+            cmd.extend(['-q:v', '3'])
+        cmd.append(path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.isfile(path):
+            print(f"Estrazione del fotogramma a {times[index]}s non riuscita: {result.stderr}")
+            return None
+        return times[index], path
+
+    workers = max(1, min(len(times), workers or os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = list(executor.map(grab, range(len(times))))
+    return [frame for frame in frames if frame]
+
+
+def extract_thumbnail(input_path, output_path, time, width=None, exact=True):
+    """
+    Salva un singolo fotogramma come immagine
+
+    Returns:
+        bool: True se l'immagine è stata scritta
+    """
+    stem, ext = os.path.splitext(output_path)
+    frames = extract_frames(input_path, [time], stem + '.frame{:04d}' + ext, width, exact, 1)
+    if not frames:
+        return False
+    os.replace(frames[0][1], output_path)
+    return True
+
+
+def extract_sprite(input_path, output_path, times, image_converter, width=SPRITE_WIDTH,
+                   columns=None, exact=False, workers=None):
+    """
+    Estrae i fotogrammi in parallelo e li unisce in uno sprite sheet
+
+    Args:
+        image_converter: ImageConverter che compone la griglia
+
+    Returns:
+        bool: True se lo sprite sheet è stato scritto
+    """
+    work_dir = output_path + '.frames'
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        ext = os.path.splitext(output_path)[1]
+        frames = extract_frames(input_path, times, os.path.join(work_dir, 'frame_{:04d}' + ext),
+                                width, exact, workers)
+        if not frames:
+            return False
+        return image_converter.build_sprite_sheet([path for _, path in frames], output_path,
+                                                  columns) is not None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def extract_snapshots(input_path, index_path, times, width=None, exact=False, image_format='jpg',
+                      workers=None):
+    """
+    Salva i fotogrammi in una cartella insieme a un indice JSON (istante -> file)
+
+    Args:
+        index_path: percorso di frames.json; le immagini vengono scritte accanto
+
+    Returns:
+        bool: True se almeno un fotogramma è stato estratto
+    """
+    folder = os.path.dirname(index_path)
+    os.makedirs(folder, exist_ok=True)
+    frames = extract_frames(input_path, times, os.path.join(folder, 'frame_{:04d}.' + image_format),
+                            width, exact, workers)
+    if not frames:
+        return False
+
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': os.path.basename(input_path),
+            'exact': exact,
+            'frames': [{'time': time, 'file': os.path.basename(path)} for time, path in frames],
+        }, f, indent=2)
+    return True
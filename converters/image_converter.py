@@ -1,12 +1,26 @@
 import os
 import io
-from PIL import Image, ImageOps, ImageFilter
+import math
+from PIL import Image
 from pillow_heif import register_heif_opener
 from .base_converter import BaseConverter
+from .image_transforms import plan_transforms, apply_transforms
+from .image_frames import (MULTI_FRAME_INPUTS, MULTI_FRAME_OUTPUTS, is_multi_frame, file_is_multi_frame,
+                           iter_frames, map_frames, save_frames)
+from .image_variants import (VARIANTS_FORMAT, is_variants_output, variant_widths,
+                             variant_formats, write_variants)
+from .tiled_image import (TILES_FORMAT, TILED_OUTPUT_FORMATS, ImageBandReader, open_band_reader,
+                          can_convert_tiled, convert_tiled, output_format_of, is_tiles_output)
 
 # Registra l'opener per i file HEIF
 register_heif_opener()
 
+# Pixel massimi elaborati in memoria (circa 8K x 8K)
+MAX_PIXELS = 89478485
+
+# Fattore di Image.resize: oltre questa riduzione si usa prima reduce() a blocchi
+REDUCING_GAP = 3.0
+
 class ImageConverter(BaseConverter):
     """Convertitore per file immagine"""
     
@@ -23,9 +37,31 @@ class ImageConverter(BaseConverter):
     def get_supported_output_formats(self):
         return [
             'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'tif', 'webp', 'ico', 'pdf',
-            'ppm', 'pgm', 'pbm', 'pnm'
+            'ppm', 'pgm', 'pbm', 'pnm', TILES_FORMAT, VARIANTS_FORMAT
         ]
     
+    def is_cpu_bound(self, source_format, target_format, input_path=None):
+        # Varianti, tessere e fotogrammi si elaborano su più thread (Pillow rilascia il GIL)
+        if target_format in (VARIANTS_FORMAT, TILES_FORMAT):
+            return False
+        return not self._converts_frames(source_format, target_format, input_path)
+    
+    def uses_thread_budget(self, target_format=None, input_path=None):
+        if target_format in (VARIANTS_FORMAT, TILES_FORMAT):
+            return True
+        source_format = os.path.splitext(input_path)[1][1:].lower() if input_path else None
+        return self._converts_frames(source_format, target_format, input_path)
+    
+    def _converts_frames(self, source_format, target_format, input_path=None):
+        """
+        True se la conversione passa da _convert_frames: sorgente con più
+        fotogrammi verso un formato che li conserva. Con input_path si legge
+        l'header, così GIF, PNG e TIFF statici restano sul percorso normale.
+        """
+        if source_format not in MULTI_FRAME_INPUTS or target_format not in MULTI_FRAME_OUTPUTS:
+            return False
+        return input_path is None or file_is_multi_frame(input_path)
+    
     def convert(self, input_path, output_path, **kwargs):
         """
         Converte un'immagine dal formato sorgente al formato target
@@ -40,7 +76,12 @@ class ImageConverter(BaseConverter):
                 - flip: 'horizontal', 'vertical', o None
                 - filter: filtro da applicare ('blur', 'sharpen', ecc.)
                 - dpi: risoluzione in DPI
+                - variant_widths, variant_formats: larghezze e formati del target 'variants'
+                - cpu_lease: quota CPU, determina i thread per varianti e fotogrammi
         """
+        if is_variants_output(output_path):
+            return self.convert_variants(input_path, output_path, **kwargs)
+        
         try:
             # Estrai parametri dai kwargs
             quality = kwargs.get('quality', self.quality)
@@ -50,92 +91,303 @@ class ImageConverter(BaseConverter):
             filter_name = kwargs.get('filter', None)
             dpi = kwargs.get('dpi', None)
             
-            # Carica l'immagine
+            # PNG e TIFF enormi (o il target 'tiles'): conversione a bande a piena
+            # risoluzione, senza decodificare l'immagine intera
+            cpu_lease = kwargs.get('cpu_lease')
+            workers = cpu_lease.threads if cpu_lease else None
+            result = self._convert_tiled(input_path, output_path, resize, rotate, flip,
+                                         filter_name, quality, dpi, workers)
+            if result is not None:
+                return result
+            
+            # Apri l'immagine: per ora viene letto solo l'header
             img = Image.open(input_path)
             
-            # Gestione della memoria per file grandi
-            max_pixels = 89478485  # Circa 8K x 8K
-            if img.width * img.height > max_pixels:
-                print(f"Immagine molto grande ({img.width}x{img.height}), ottimizzando il processo...")
-                # Riduci temporaneamente per operazioni
-                scale_factor = (max_pixels / (img.width * img.height)) ** 0.5
-                temp_size = (int(img.width * scale_factor), int(img.height * scale_factor))
-                img = img.resize(temp_size, Image.LANCZOS)
-            
-            # Applica le trasformazioni
-            if resize:
-                if isinstance(resize, float) and 0 < resize <= 1:
-                    # Resize by percentage
-                    new_width = int(img.width * resize)
-                    new_height = int(img.height * resize)
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
-                elif isinstance(resize, tuple) and len(resize) == 2:
-                    # Resize to specific dimensions
-                    img = img.resize(resize, Image.LANCZOS)
-            
-            if rotate is not None:
-                img = img.rotate(rotate, expand=True)
-            
-            if flip:
-                if flip == 'horizontal':
-                    img = ImageOps.mirror(img)
-                elif flip == 'vertical':
-                    img = ImageOps.flip(img)
-            
-            if filter_name:
-                if filter_name == 'blur':
-                    img = img.filter(ImageFilter.BLUR)
-                elif filter_name == 'sharpen':
-                    img = img.filter(ImageFilter.SHARPEN)
-                elif filter_name == 'contour':
-                    img = img.filter(ImageFilter.CONTOUR)
-                elif filter_name == 'detail':
-                    img = img.filter(ImageFilter.DETAIL)
-                elif filter_name == 'edge_enhance':
-                    img = img.filter(ImageFilter.EDGE_ENHANCE)
-                elif filter_name == 'emboss':
-                    img = img.filter(ImageFilter.EMBOSS)
-                elif filter_name == 'grayscale':
-                    img = ImageOps.grayscale(img)
-            
-            # Converti in RGB per formati che non supportano alpha o altri modelli di colore
-            if self.target_format.lower() in ['jpg', 'jpeg']:
-                if img.mode in ['RGBA', 'LA', 'P']:
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    bg.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else img.split()[1])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-            # Estrai formato target dall'output_path
-            format_name = os.path.splitext(output_path)[1][1:].upper()
-            # Gestisci caso speciale JPEG
-            if format_name.lower() == 'jpg':
-                format_name = 'JPEG'
+            # Animazioni e TIFF multipagina: tutti i fotogrammi, se il formato li conserva
+            target_format = os.path.splitext(output_path)[1][1:].lower()
+            if target_format in MULTI_FRAME_OUTPUTS and is_multi_frame(img):
+                return self._convert_frames(img, output_path, resize, rotate, flip, filter_name,
+                                            quality, dpi, cpu_lease)
             
-            # Prepara le opzioni di salvataggio
-            save_options = {}
-            if format_name.upper() in ['JPEG', 'WEBP']:
-                save_options['quality'] = quality
-            elif format_name.upper() == 'PNG':
-                save_options['compress_level'] = int(9 - (quality / 100.0 * 9))
-            elif format_name.upper() == 'TIFF':
-                save_options['compression'] = 'tiff_deflate'
+            # Dimensione finale calcolata prima di decodificare, così si
+            # decodifica solo la risoluzione che serve davvero
+            target_size = self._target_size(img.size, resize, MAX_PIXELS)
+            if target_size != img.size:
+                # JPEG: riduzione 1/2, 1/4, 1/8 direttamente nel dominio DCT
+                # (senza effetto sugli altri formati)
+                img.draft(img.mode, target_size)
             
-            # Aggiungi DPI se specificato
-            if dpi is not None:
-                save_options['dpi'] = (dpi, dpi)
+            # Applica le trasformazioni con il minor numero di passaggi
+            # (vedi plan_transforms); reducing_gap: riduzione rapida a blocchi
+            # fino a 3x la dimensione finale, poi LANCZOS sull'immagine già ridotta
+            steps = plan_transforms(img.size, target_size, rotate, flip, filter_name)
+            img = apply_transforms(img, steps, reducing_gap=REDUCING_GAP)
             
+            # Cartella di tessere: scritta a bande anche dall'immagine in memoria
+            if is_tiles_output(output_path):
+                return convert_tiled(ImageBandReader(img), output_path, quality=quality, dpi=dpi,
+                                     workers=workers)
+                
             # Salva il risultato
-            img.save(output_path, format=format_name, **save_options)
+            self._save(img, output_path, quality, dpi)
             return True
             
         except Exception as e:
             print(f"Errore durante la conversione dell'immagine: {e}")
             return False
     
+    def _convert_frames(self, img, output_path, resize, rotate, flip, filter_name, quality, dpi,
+                        cpu_lease=None):
+        """
+        Converte tutti i fotogrammi di un'immagine animata o multipagina
+        
+        I fotogrammi vengono decodificati man mano e trasformati in parallelo
+        (ridimensionamento, rotazione, ribaltamento e filtro come in convert);
+        durate, ripetizioni e disposal della sorgente vengono mantenuti.
+        
+        Returns:
+            bool: True se il file è stato scritto
+        """
+        loop = img.info.get('loop')
+        durations = []
+        disposals = []
+        
+        def source_frames():
+            for frame, duration, disposal in iter_frames(img):
+                durations.append(duration)
+                disposals.append(disposal)
+                yield frame
+        
+        def transform(frame):
+            target_size = self._target_size(frame.size, resize, MAX_PIXELS)
+            steps = plan_transforms(frame.size, target_size, rotate, flip, filter_name)
+            return apply_transforms(frame, steps, reducing_gap=REDUCING_GAP)
+        
+        # I fotogrammi passano all'encoder man mano, senza tenerli tutti in una lista
+        frames = map_frames(transform, source_frames(), cpu_lease.threads if cpu_lease else None)
+        return save_frames(frames, output_path, durations, disposals, loop, quality, dpi)
+    
+    def convert_variants(self, input_path, output_path, **kwargs):
+        """
+        Genera un set responsive (larghezze x formati) decodificando la sorgente una sola volta
+        
+        Args:
+            input_path: percorso del file da convertire
+            output_path: percorso di manifest.json; le varianti vengono scritte accanto
+            **kwargs: come in convert, più:
+                - variant_widths: larghezze in pixel (di default 320, 640, 1280, 2560)
+                - variant_formats: formati tra 'jpg', 'webp' e 'avif'
+                - cpu_lease: quota CPU, determina le codifiche contemporanee
+                
+        Returns:
+            bool: True se il manifest è stato scritto
+        """
+        try:
+            quality = kwargs.get('quality', self.quality)
+            rotate = kwargs.get('rotate', None)
+            cpu_lease = kwargs.get('cpu_lease')
+            
+            img = Image.open(input_path)
+            base_size = self._target_size(img.size, kwargs.get('resize'), MAX_PIXELS)
+            
+            # Larghezza dell'immagine finale: con un quarto di giro è l'altezza
+            quarter_turn = (rotate or 0) % 180 == 90
+            output_width = base_size[1] if quarter_turn else base_size[0]
+            widths = variant_widths(output_width, kwargs.get('variant_widths'))
+            
+            # Si decodifica e si trasforma direttamente alla variante più grande
+            # (le rotazioni arbitrarie allargano la tela: lì si parte da base_size)
+            if not (rotate or 0) % 90:
+                scale = widths[-1] / output_width
+                base_size = (max(1, round(base_size[0] * scale)), max(1, round(base_size[1] * scale)))
+            if base_size != img.size:
+                img.draft(img.mode, base_size)
+            steps = plan_transforms(img.size, base_size, rotate, kwargs.get('flip'), kwargs.get('filter'))
+            img = apply_transforms(img, steps, reducing_gap=REDUCING_GAP)
+            
+            name = os.path.splitext(os.path.basename(input_path))[0]
+            return write_variants(img, output_path, variant_widths(img.width, widths),
+                                  variant_formats(kwargs.get('variant_formats')), self._save,
+                                  quality, name, REDUCING_GAP, cpu_lease.threads if cpu_lease else None)
+            
+        except Exception as e:
+            print(f"Errore durante la generazione delle varianti: {e}")
+            return False
+    
+    def _save(self, img, output_path, quality, dpi=None):
+        """
+        Salva un'immagine nel formato indicato dall'estensione di output_path
+        
+        Args:
+            img: immagine PIL
+            output_path: percorso di destinazione
+            quality: qualità (livello di compressione per PNG)
+            dpi: risoluzione in DPI
+            
+        Returns:
+            bool: True (gli errori sono eccezioni)
+        """
+        # Converti in RGB per formati che non supportano alpha o altri modelli di colore
+        target_format = os.path.splitext(output_path)[1][1:].lower()
+        if target_format in ['jpg', 'jpeg']:
+            if img.mode in ['RGBA', 'LA', 'P']:
+                bg = Image.new('RGB', img.size, (255, 255, 255))
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                bg.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else img.split()[1])
+                img = bg
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+        # Estrai formato target dall'output_path
+        format_name = os.path.splitext(output_path)[1][1:].upper()
+        # Gestisci caso speciale JPEG
+        if format_name.lower() == 'jpg':
+            format_name = 'JPEG'
+        
+        # Prepara le opzioni di salvataggio
+        save_options = {}
+        if format_name.upper() in ['JPEG', 'WEBP', 'AVIF']:
+            save_options['quality'] = quality
+        elif format_name.upper() == 'PNG':
+            save_options['compress_level'] = int(9 - (quality / 100.0 * 9))
+        elif format_name.upper() == 'TIFF':
+            save_options['compression'] = 'tiff_deflate'
+        
+        # Aggiungi DPI se specificato
+        if dpi is not None:
+            save_options['dpi'] = (dpi, dpi)
+        
+        # Salva il risultato
+        img.save(output_path, format=format_name, **save_options)
+        return True
+    
+    def _convert_tiled(self, input_path, output_path, resize, rotate, flip, filter_name,
+                       quality, dpi, workers=None):
+        """
+        Converte a bande (vedi tiled_image) le immagini oltre MAX_PIXELS e il
+        target 'tiles', quando le operazioni richieste lo permettono: cambio di
+        formato, ribaltamenti, rotazione di 180° e scala di grigi (solo la prima
+        pagina, quindi non per i TIFF multipagina verso un formato multipagina)
+        
+        Returns:
+            bool: esito della conversione, None se serve il percorso normale
+        """
+        if (resize or (rotate or 0) % 360 not in (0, 180) or filter_name not in (None, 'grayscale')
+                or output_format_of(output_path) not in TILED_OUTPUT_FORMATS):
+            return None
+        # Le bande leggono solo la prima pagina: i TIFF multipagina verso TIFF
+        # passano da _convert_frames, che le conserva tutte
+        if output_format_of(output_path) in MULTI_FRAME_OUTPUTS and file_is_multi_frame(input_path):
+            return None
+        
+        # La rotazione di 180° equivale ai due ribaltamenti
+        half_turn = (rotate or 0) % 360 == 180
+        flip_horizontal = (flip == 'horizontal') != half_turn
+        flip_vertical = (flip == 'vertical') != half_turn
+        
+        reader = open_band_reader(input_path)
+        if not can_convert_tiled(reader, output_path):
+            if reader:
+                reader.close()
+            return None
+        width, height = reader.size
+        if width * height <= MAX_PIXELS and not is_tiles_output(output_path):
+            reader.close()
+            return None
+        
+        print(f"Conversione a bande ({width}x{height})")
+        return convert_tiled(reader, output_path, flip_horizontal, flip_vertical,
+                             filter_name == 'grayscale', quality, dpi, workers)
+    
+    def build_sprite_sheet(self, image_paths, output_path, columns=None, quality=None):
+        """
+        Affianca più immagini della stessa dimensione in una griglia (sprite sheet)
+        
+        Args:
+            image_paths: immagini da unire, in ordine di lettura (riga per riga)
+            output_path: immagine di destinazione
+            columns: colonne della griglia (di default la più vicina a un quadrato)
+            quality: qualità per JPEG/WebP (1-100)
+        
+        Returns:
+            dict: layout della griglia (colonne, righe, dimensione delle celle),
+                None in caso di errore
+        """
+        try:
+            if not image_paths:
+                return None
+            columns = columns or math.ceil(math.sqrt(len(image_paths)))
+            rows = math.ceil(len(image_paths) / columns)
+            
+            with Image.open(image_paths[0]) as first:
+                tile_width, tile_height = first.size
+            
+            sheet = Image.new('RGB', (tile_width * columns, tile_height * rows), (0, 0, 0))
+            for index, path in enumerate(image_paths):
+                with Image.open(path) as tile:
+                    if tile.size != (tile_width, tile_height):
+                        tile = tile.resize((tile_width, tile_height))
+                    sheet.paste(tile.convert('RGB'),
+                                ((index % columns) * tile_width, (index // columns) * tile_height))
+            
+            format_name = os.path.splitext(output_path)[1][1:].upper()
+            if format_name == 'JPG':
+                format_name = 'JPEG'
+            save_options = {}
+            if format_name in ['JPEG', 'WEBP']:
+                save_options['quality'] = quality or self.quality
+            sheet.save(output_path, format=format_name, **save_options)
+            
+            return {
+                'columns': columns,
+                'rows': rows,
+                'tile_width': tile_width,
+                'tile_height': tile_height,
+            }
+        except Exception as e:
+            print(f"Errore durante la creazione dello sprite sheet: {e}")
+            return None
+    
+    @staticmethod
+    def _target_size(size, resize, max_pixels):
+        """
+        Calcola la dimensione finale dell'immagine a partire da quella originale
+        
+        Args:
+            size: (larghezza, altezza) originali
+            resize: percentuale (0-1] o (larghezza, altezza), come in convert
+            max_pixels: pixel massimi prima del ridimensionamento richiesto
+            
+        Returns:
+            tuple: (larghezza, altezza) finali
+        """
+        width, height = size
+        
+        # Gestione della memoria per file grandi
+        if width * height > max_pixels:
+            print(f"Immagine molto grande ({width}x{height}), ottimizzando il processo...")
+            scale_factor = (max_pixels / (width * height)) ** 0.5
+            width, height = int(width * scale_factor), int(height * scale_factor)
+        
+        if isinstance(resize, float) and 0 < resize <= 1:
+            # Resize by percentage
+            return int(width * resize), int(height * resize)
+        if isinstance(resize, tuple) and len(resize) == 2:
+            # Resize to specific dimensions
+            return tuple(resize)
+        return width, height
+    
+    def estimate_cost(self, input_path, info=None):
+        """Stima il costo in base ai pixel da decodificare (legge solo l'header)"""
+        if info and info.get('width') and info.get('height'):
+            return info['width'] * info['height'] / 40_000_000
+        try:
+            with Image.open(input_path) as img:
+                return img.width * img.height / 40_000_000
+        except Exception:
+            return super().estimate_cost(input_path)
+    
     def get_image_info(self, input_path):
         """
         Ottiene informazioni su un'immagine
@@ -0,0 +1,170 @@
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageSequence, TiffImagePlugin
+
+# Sorgenti che possono contenere più fotogrammi (GIF/WebP/APNG animati) o pagine (TIFF)
+MULTI_FRAME_INPUTS = ['gif', 'webp', 'png', 'tif', 'tiff']
+
+# Formati che conservano tutti i fotogrammi: animazioni (GIF, WebP) e documenti multipagina
+MULTI_FRAME_OUTPUTS = ['gif', 'webp', 'tif', 'tiff', 'pdf']
+
+# Durata di un fotogramma quando la sorgente non la indica (ms)
+DEFAULT_DURATION = 100
+
+# Byte decodificati che gli encoder GIF, WebP e PDF di Pillow tengono in
+# memoria fino alla scrittura (i TIFF si scrivono una pagina alla volta)
+MAX_BUFFERED_BYTES = 1024 ** 3
+
+
+def is_multi_frame(img):
+    """True se l'immagine aperta ha più di un fotogramma (legge al massimo il secondo)"""
+    return bool(getattr(img, 'is_animated', False))
+
+
+def file_is_multi_frame(path):
+    """Come is_multi_frame, aprendo il file (False se non è un'immagine leggibile)"""
+    try:
+        with Image.open(path) as img:
+            return is_multi_frame(img)
+    except Exception:
+        return False
+
+
+def iter_frames(img):
+    """
+    Scorre i fotogrammi su richiesta, senza decodificarli tutti in anticipo
+
+    Le animazioni vengono restituite come fotogrammi interi già composti
+    (come li mostra un visualizzatore) in RGBA, così hanno tutti lo stesso
+    modo; le pagine di un TIFF mantengono il proprio.
+
+    Yields:
+        tuple: (fotogramma indipendente dalla sorgente, durata in ms o None,
+            metodo di disposal GIF o None)
+    """
+    animated = img.format != 'TIFF'
+    for frame in ImageSequence.Iterator(img):
+        # La durata (WebP) è disponibile solo dopo la decodifica del fotogramma
+        copy = frame.convert('RGBA') if animated else frame.copy()
+        duration = frame.info.get('duration') if animated else None
+        if animated and duration is None:
+            duration = DEFAULT_DURATION
+        yield copy, duration, getattr(frame, 'disposal_method', None)
+
+
+def map_frames(transform, frames, workers=None):
+    """
+    Applica transform ai fotogrammi su più thread, restituendoli in ordine
+
+    Restano in sospeso al massimo due fotogrammi per worker: la sorgente
+    viene decodificata man mano che i worker si liberano.
+
+    Args:
+        transform: funzione (fotogramma) -> fotogramma trasformato
+        frames: iterabile di fotogrammi
+        workers: thread contemporanei (di default uno per core)
+
+    Yields:
+        Image: fotogrammi trasformati
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for frame in frames:
+            pending.append(executor.submit(transform, frame))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def save_frames(frames, output_path, durations=None, disposals=None, loop=None, quality=95, dpi=None):
+    """
+    Salva più fotogrammi come animazione (GIF, WebP) o documento multipagina (TIFF, PDF)
+
+    I fotogrammi vengono consumati man mano: il TIFF viene scritto una pagina
+    alla volta, mentre GIF, WebP e PDF (che Pillow scrive solo alla fine)
+    accettano al più MAX_BUFFERED_BYTES di fotogrammi decodificati.
+
+    Args:
+        frames: fotogrammi trasformati, nell'ordine (anche un iteratore)
+        output_path: percorso di destinazione, il formato dipende dall'estensione
+        durations: durata di ogni fotogramma in ms (animazioni); può essere una
+            lista riempita mentre si consumano i fotogrammi
+        disposals: metodo di disposal GIF di ogni fotogramma (solo verso GIF)
+        loop: ripetizioni (0 = infinite, None = una sola riproduzione)
+        quality: qualità per WebP
+        dpi: risoluzione in DPI (TIFF, PDF)
+
+    Returns:
+        bool: True (gli errori sono eccezioni)
+    """
+    frames = iter(frames)
+    first = next(frames)
+    target_format = os.path.splitext(output_path)[1][1:].lower()
+
+    if target_format in ['tif', 'tiff']:
+        options = {'compression': 'tiff_deflate'}
+        if dpi is not None:
+            options['dpi'] = (dpi, dpi)
+        with TiffImagePlugin.AppendingTiffWriter(output_path, new=True) as tiff:
+            for page in itertools.chain([first], frames):
+                page.save(tiff, format='TIFF', **options)
+                tiff.newFrame()
+        return True
+
+    rest = _limit_buffered(frames, first)
+    options = {'save_all': True, 'append_images': rest}
+
+    # Le liste si leggono dopo il primo fotogramma: durate e disposal sono
+    # tutti presenti o tutti assenti (vedi iter_frames)
+    if target_format == 'gif':
+        if durations and None not in durations:
+            options['duration'] = durations
+        if disposals and None not in disposals:
+            options['disposal'] = disposals
+        if loop is not None:
+            options['loop'] = loop
+        format_name = 'GIF'
+    elif target_format == 'webp':
+        if durations and None not in durations:
+            options['duration'] = durations
+        # Nel WebP 0 indica ripetizioni infinite: senza loop nella sorgente si riproduce una volta
+        options['loop'] = 1 if loop is None else loop
+        options['quality'] = quality
+        format_name = 'WEBP'
+    else:
+        first = _flatten(first)
+        options['append_images'] = (_flatten(page) for page in rest)
+        format_name = 'PDF'
+        if dpi is not None:
+            options['resolution'] = dpi
+
+    first.save(output_path, format=format_name, **options)
+    return True
+
+
+def _limit_buffered(frames, first):
+    """Fotogrammi successivi al primo, con un errore oltre MAX_BUFFERED_BYTES in totale"""
+    total = _frame_bytes(first)
+    for frame in frames:
+        total += _frame_bytes(frame)
+        if total > MAX_BUFFERED_BYTES:
+            raise ValueError(f"Troppi fotogrammi: oltre {MAX_BUFFERED_BYTES // 1024 ** 2} MB decodificati")
+        yield frame
+
+
+def _frame_bytes(frame):
+    return frame.width * frame.height * len(frame.getbands())
+
+
+def _flatten(page):
+    """Pagina PDF senza trasparenza: le zone trasparenti diventano bianche, come nei JPEG"""
+    if page.mode not in ['RGBA', 'LA', 'P']:
+        return page
+    page = page.convert('RGBA')
+    background = Image.new('RGBA', page.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, page).convert('RGB')
@@ -0,0 +1,182 @@
+import math
+from PIL import Image, ImageFilter, ImageOps
+
+# Filtri supportati da ImageConverter (grayscale è un'operazione per pixel a parte)
+FILTERS = {
+    'blur': ImageFilter.BLUR,
+    'sharpen': ImageFilter.SHARPEN,
+    'contour': ImageFilter.CONTOUR,
+    'detail': ImageFilter.DETAIL,
+    'edge_enhance': ImageFilter.EDGE_ENHANCE,
+    'emboss': ImageFilter.EMBOSS,
+}
+
+# Rotazioni di 90° e ribaltamenti come matrici 2x2 sulle coordinate (y verso il basso):
+# qualsiasi combinazione è ancora una di queste otto e costa un solo transpose
+_TRANSPOSE_MATRICES = {
+    None: (1, 0, 0, 1),
+    Image.Transpose.FLIP_LEFT_RIGHT: (-1, 0, 0, 1),
+    Image.Transpose.FLIP_TOP_BOTTOM: (1, 0, 0, -1),
+    Image.Transpose.ROTATE_90: (0, 1, -1, 0),
+    Image.Transpose.ROTATE_180: (-1, 0, 0, -1),
+    Image.Transpose.ROTATE_270: (0, -1, 1, 0),
+    Image.Transpose.TRANSPOSE: (0, 1, 1, 0),
+    Image.Transpose.TRANSVERSE: (0, -1, -1, 0),
+}
+_TRANSPOSE_METHODS = {matrix: method for method, matrix in _TRANSPOSE_MATRICES.items()}
+
+_FLIPS = {
+    'horizontal': Image.Transpose.FLIP_LEFT_RIGHT,
+    'vertical': Image.Transpose.FLIP_TOP_BOTTOM,
+}
+
+
+def _compose(first, then):
+    """Matrice dell'operazione `then` applicata dopo `first`"""
+    a, b, c, d = then
+    e, f, g, h = first
+    return (a * e + b * g, a * f + b * h, c * e + d * g, c * f + d * h)
+
+
+def plan_transforms(size, target_size=None, rotate=None, flip=None, filter_name=None):
+    """
+    Pianifica ridimensionamento, rotazione, ribaltamento e filtro come in
+    ImageConverter.convert (in quest'ordine), ma con meno passaggi sull'immagine:
+
+    - rotazioni multiple di 90° e ribaltamenti diventano un solo transpose
+    - una rotazione arbitraria insieme a un ridimensionamento viene unita al
+      ribaltamento in un'unica trasformazione affine, con un solo
+      ricampionamento BICUBIC (il risultato non è identico pixel per pixel a
+      LANCZOS seguito dalla rotazione NEAREST di Pillow, ma di qualità pari o
+      migliore); senza ridimensionamento si usa la rotazione di Pillow e
+      l'output è identico
+    - il ridimensionamento precede sempre le altre operazioni e la scala di
+      grigi precede il transpose, che così sposta un solo canale
+
+    Args:
+        size: (larghezza, altezza) dell'immagine decodificata
+        target_size: dimensione dopo il ridimensionamento (None = invariata)
+        rotate: angolo in gradi, antiorario come Image.rotate
+        flip: 'horizontal', 'vertical' o None
+        filter_name: nome del filtro (vedi FILTERS) o 'grayscale'
+
+    Returns:
+        list: passi da eseguire con apply_transforms
+    """
+    target_size = tuple(target_size or size)
+    angle = (rotate or 0) % 360
+    steps = []
+
+    if angle % 90:
+        if target_size != tuple(size):
+            # Rotazione arbitraria e ridimensionamento: ridimensionamento,
+            # rotazione e ribaltamento in un solo ricampionamento
+            steps.append(('affine', target_size, angle, flip))
+        else:
+            steps.append(('rotate', angle))
+            if flip in _FLIPS:
+                steps.append(('transpose', _FLIPS[flip]))
+        if filter_name:
+            steps.append(('filter', filter_name))
+        return steps
+
+    if target_size != tuple(size):
+        steps.append(('resize', target_size))
+
+    # Le operazioni per pixel commutano con il transpose, che sposta i pixel senza ricampionarli
+    if filter_name == 'grayscale':
+        steps.append(('filter', filter_name))
+
+    matrix = _TRANSPOSE_MATRICES[None]
+    for _ in range(int(angle) // 90):
+        matrix = _compose(matrix, _TRANSPOSE_MATRICES[Image.Transpose.ROTATE_90])
+    if flip in _FLIPS:
+        matrix = _compose(matrix, _TRANSPOSE_MATRICES[_FLIPS[flip]])
+    method = _TRANSPOSE_METHODS[matrix]
+    if method is not None:
+        steps.append(('transpose', method))
+
+    if filter_name and filter_name != 'grayscale':
+        steps.append(('filter', filter_name))
+    return steps
+
+
+def apply_transforms(img, steps, reducing_gap=3.0):
+    """
+    Esegue i passi di plan_transforms
+
+    Args:
+        img: immagine PIL
+        steps: passi pianificati
+        reducing_gap: come in Image.resize, riduzione a blocchi prima del ricampionamento
+
+    Returns:
+        Image: immagine trasformata
+    """
+    for step in steps:
+        kind = step[0]
+        if kind == 'resize':
+            img = img.resize(step[1], Image.LANCZOS, reducing_gap=reducing_gap)
+        elif kind == 'transpose':
+            img = img.transpose(step[1])
+        elif kind == 'rotate':
+            img = img.rotate(step[1], expand=True)
+        elif kind == 'affine':
+            img = _affine(img, *step[1:])
+        elif kind == 'filter':
+            if step[1] == 'grayscale':
+                img = ImageOps.grayscale(img)
+            elif step[1] in FILTERS:
+                img = img.filter(FILTERS[step[1]])
+    return img
+
+
+def _rotation_matrix(size, angle):
+    """
+    Matrice affine inversa (dall'output all'input) di Image.rotate con
+    expand=True, calcolata come fa Pillow, e dimensione della nuova tela
+    """
+    width, height = size
+    radians = -math.radians(angle)
+    matrix = [round(math.cos(radians), 15), round(math.sin(radians), 15), 0.0,
+              round(-math.sin(radians), 15), round(math.cos(radians), 15), 0.0]
+
+    def transform(x, y):
+        a, b, c, d, e, f = matrix
+        return a * x + b * y + c, d * x + e * y + f
+
+    matrix[2], matrix[5] = transform(-width / 2, -height / 2)
+    matrix[2] += width / 2
+    matrix[5] += height / 2
+
+    corners = [transform(x, y) for x, y in ((0, 0), (width, 0), (width, height), (0, height))]
+    new_width = math.ceil(max(x for x, _ in corners)) - math.floor(min(x for x, _ in corners))
+    new_height = math.ceil(max(y for _, y in corners)) - math.floor(min(y for _, y in corners))
+    matrix[2], matrix[5] = transform(-(new_width - width) / 2.0, -(new_height - height) / 2.0)
+    return (new_width, new_height), matrix
+
+
+def _affine(img, target_size, angle, flip):
+    """Ridimensiona, ruota (expand=True) e ribalta con un'unica trasformazione affine"""
+    # Immagini a palette o a 1 bit: solo NEAREST, come in Image.resize
+    resample = Image.NEAREST if img.mode in ('1', 'P') else Image.BICUBIC
+
+    # La trasformazione affine non filtra: oltre 2x si riduce prima a blocchi
+    factor = int(min(img.width / target_size[0], img.height / target_size[1]))
+    if factor >= 2 and resample != Image.NEAREST:
+        img = img.reduce(factor)
+
+    (width, height), matrix = _rotation_matrix(target_size, angle)
+    a, b, c, d, e, f = matrix
+
+    # Ribaltamento dell'output: x -> larghezza - x (o y -> altezza - y)
+    if flip == 'horizontal':
+        a, c, d, f = -a, a * width + c, -d, d * width + f
+    elif flip == 'vertical':
+        b, c, e, f = -b, b * height + c, -e, e * height + f
+
+    # Dalle coordinate dell'immagine ridimensionata a quelle della sorgente
+    scale_x = img.width / target_size[0]
+    scale_y = img.height / target_size[1]
+    data = (a * scale_x, b * scale_x, c * scale_x, d * scale_y, e * scale_y, f * scale_y)
+    return img.transform((width, height), Image.Transform.AFFINE, data, resample=resample)
@@ -0,0 +1,132 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+# Target 'variants': cartella di varianti (larghezze x formati) con il manifest per srcset
+VARIANTS_FORMAT = 'variants'
+VARIANTS_INDEX = 'manifest.json'
+
+# Valori di default di un set responsive
+DEFAULT_WIDTHS = [320, 640, 1280, 2560]
+DEFAULT_FORMATS = ['jpg', 'webp']
+
+# Formati delle varianti (AVIF solo se Pillow è compilato con libavif)
+VARIANT_FORMATS = ['jpg', 'webp'] + (['avif'] if features.check('avif') else [])
+
+# Limite alle larghezze di una sola richiesta
+MAX_WIDTHS = 12
+
+_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+
+def is_variants_output(output_path):
+    """True se output_path è il manifest di una cartella di varianti"""
+    return os.path.basename(output_path) == VARIANTS_INDEX
+
+
+def variant_widths(source_width, widths=None):
+    """
+    Larghezze da generare, senza ingrandire la sorgente
+
+    Args:
+        source_width: larghezza dell'immagine dopo le trasformazioni
+        widths: larghezze richieste (di default DEFAULT_WIDTHS)
+
+    Returns:
+        list: larghezze crescenti; se sono tutte oltre la sorgente resta
+            solo la larghezza originale
+    """
+    widths = sorted({int(width) for width in (widths or DEFAULT_WIDTHS) if int(width) > 0})
+    widths = [width for width in widths if width <= source_width][:MAX_WIDTHS]
+    return widths or [source_width]
+
+
+def variant_formats(formats=None):
+    """Formati richiesti tra quelli disponibili, senza duplicati ('jpeg' vale 'jpg')"""
+    requested = [('jpg' if fmt == 'jpeg' else fmt) for fmt in (formats or DEFAULT_FORMATS)]
+    return [fmt for fmt in dict.fromkeys(requested) if fmt in VARIANT_FORMATS] or DEFAULT_FORMATS
+
+
+def write_variants(img, index_path, widths, formats, save, quality=95, name=None,
+                   reducing_gap=3.0, workers=None):
+    """
+    Genera tutte le varianti da un'immagine già decodificata e scrive il manifest
+
+    Le larghezze vengono ricavate a cascata, ognuna dalla precedente più
+    grande, e ogni variante viene codificata nei vari formati in parallelo
+    mentre si ridimensiona la successiva (gli encoder di Pillow rilasciano il GIL).
+
+    Args:
+        img: immagine già trasformata, larga almeno quanto la variante più grande
+        index_path: percorso di manifest.json; le varianti vengono scritte accanto
+        widths: larghezze da generare (vedi variant_widths)
+        formats: estensioni dei formati (vedi variant_formats)
+        save: funzione (immagine, percorso, qualità) che salva una variante;
+            se solleva un'eccezione la variante viene saltata
+        quality: qualità per JPEG/WebP/AVIF
+        name: prefisso dei file (di default 'image')
+        reducing_gap: come in Image.resize
+        workers: codifiche contemporanee (di default una per core)
+
+    Returns:
+        bool: True se almeno una variante è stata scritta
+    """
+    folder = os.path.dirname(index_path)
+    os.makedirs(folder, exist_ok=True)
+    name = name or 'image'
+
+    def encode(variant, path):
+        # Image.save annota l'immagine (encoderinfo): ogni thread salva la sua copia
+        return save(variant.copy(), path, quality)
+
+    pending = []
+    workers = max(1, workers or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        current = img
+        for width in sorted(widths, reverse=True):
+            height = max(1, round(img.height * width / img.width))
+            if current.size != (width, height):
+                current = current.resize((width, height), Image.LANCZOS, reducing_gap=reducing_gap)
+            for fmt in formats:
+                path = os.path.join(folder, f'{name}-{width}w.{fmt}')
+                pending.append((width, height, fmt, path, executor.submit(encode, current, path)))
+
+    variants = []
+    for width, height, fmt, path, future in sorted(pending, key=lambda item: (item[2], item[0])):
+        # Un encoder che fallisce non invalida le altre varianti
+        try:
+            saved = future.result()
+        except Exception as e:
+            print(f"Variante {os.path.basename(path)} non riuscita: {e}")
+            continue
+        if not saved or not os.path.isfile(path):
+            print(f"Variante {os.path.basename(path)} non riuscita")
+            continue
+        variants.append({
+            'file': os.path.basename(path),
+            'format': fmt,
+            'type': _MIME_TYPES[fmt],
+            'width': width,
+            'height': height,
+            'bytes': os.path.getsize(path),
+        })
+    if not variants:
+        return False
+
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'width': img.width,
+            'height': img.height,
+            'variants': variants,
+            # Attributo srcset pronto per ogni formato (<source type="..." srcset="...">)
+            'srcset': {fmt: ', '.join(f"{variant['file']} {variant['width']}w" for variant in variants
+                                      if variant['format'] == fmt)
+                       for fmt in formats if any(variant['format'] == fmt for variant in variants)},
+        }, f, indent=2)
+    return True
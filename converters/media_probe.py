@@ -0,0 +1,186 @@
+import copy
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+
+
+def parse_frame_rate(value):
+    """
+    Converte un frame rate di ffprobe ('30000/1001', '25/1', '0/0') in float
+
+    Returns:
+        float: fotogrammi al secondo, 0.0 se il valore non è valido
+    """
+    try:
+        rate = Fraction(str(value))
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+    return round(float(rate), 3) if rate > 0 else 0.0
+
+
+def _number(value, kind=float):
+    """Numero da un campo di ffprobe, che può mancare o valere 'N/A'"""
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return kind(0)
+
+
+class MediaProbe:
+    """
+    Metadati dei file audio/video, letti con un solo ffprobe per file.
+
+    I risultati restano in una cache LRU indicizzata per percorso, dimensione
+    e data di modifica: la stessa conversione può chiedere durata, codec e
+    risoluzione più volte (copia dei flussi, segmenti, avanzamento) senza
+    lanciare altri processi, e un file sovrascritto viene riletto. Quando è
+    noto l'hash del contenuto il risultato è indicizzato anche per hash, così
+    quanto letto da /api/file-info vale anche per il file caricato dopo.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _path_key(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return ('path', os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+    def probe(self, path, content_hash=None):
+        """
+        Restituisce i metadati di un file, lanciando ffprobe solo se non sono in cache
+
+        Args:
+            path: percorso del file
+            content_hash: SHA-256 del contenuto, se già calcolato
+
+        Returns:
+            dict: formato, durata, dimensione, bitrate e i primi flussi
+                'video' e 'audio' (None se assenti); {} se il file non è leggibile
+        """
+        keys = [key for key in (('hash', content_hash) if content_hash else None,
+                                self._path_key(path)) if key]
+
+        with self._lock:
+            for key in keys:
+                media = self._entries.get(key)
+                if media is not None:
+                    self.hits += 1
+                    self._store(keys, media)
+                    return copy.deepcopy(media)
+            self.misses += 1
+
+        media = self._run_ffprobe(path)
+        if media:
+            with self._lock:
+                self._store(keys, media)
+        return copy.deepcopy(media)
+
+    def remember(self, path, content_hash):
+        """
+        Associa al percorso i metadati già letti per lo stesso contenuto
+
+        Returns:
+            bool: True se il contenuto era in cache
+        """
+        path_key = self._path_key(path)
+        if not content_hash or not path_key:
+            return False
+        with self._lock:
+            media = self._entries.get(('hash', content_hash))
+            if media is None:
+                return False
+            self._store([path_key], media)
+            return True
+
+    def _store(self, keys, media):
+        for key in keys:
+            self._entries[key] = media
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _run_ffprobe(self, path):
+        cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+               '-show_format', '-show_streams', path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            print(f"ffprobe non disponibile: {e}")
+            return {}
+        if result.returncode != 0:
+            print(f"ffprobe error: {result.stderr}")
+            return {}
+
+        try:
+            data = json.loads(result.stdout)
+        except ValueError:
+            return {}
+        return self._parse(data)
+
+    @staticmethod
+    def _parse(data):
+        container = data.get('format', {})
+        media = {
+            'format': container.get('format_name', ''),
+            'duration': _number(container.get('duration')),
+            'size': _number(container.get('size'), int),
+            'bitrate': _number(container.get('bit_rate'), int),
+            'video': None,
+            'audio': None,
+        }
+
+        for stream in data.get('streams', []):
+            codec_type = stream.get('codec_type')
+            if codec_type == 'video' and media['video'] is None:
+                # Le copertine di mp3/m4a sono flussi video di un solo fotogramma
+                if stream.get('disposition', {}).get('attached_pic'):
+                    continue
+                fps = parse_frame_rate(stream.get('r_frame_rate'))
+                media['video'] = {
+                    'codec': stream.get('codec_name', ''),
+                    'width': _number(stream.get('width'), int),
+                    'height': _number(stream.get('height'), int),
+                    'fps': fps or parse_frame_rate(stream.get('avg_frame_rate')),
+                    'pix_fmt': stream.get('pix_fmt', ''),
+                    'duration': _number(stream.get('duration')),
+                }
+            elif codec_type == 'audio' and media['audio'] is None:
+                media['audio'] = {
+                    'codec': stream.get('codec_name', ''),
+                    'sample_rate': _number(stream.get('sample_rate'), int),
+                    'channels': _number(stream.get('channels'), int),
+                    'duration': _number(stream.get('duration')),
+                }
+
+        if not media['duration']:
+            # Alcuni container non riportano la durata globale
+            media['duration'] = max((media[kind] or {}).get('duration', 0) for kind in ('video', 'audio'))
+        return media
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Istanza condivisa da convertitori e API
+media_probe = MediaProbe()
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ffmpeg_utils import run_ffmpeg
+
+# Container che il demuxer concat ricompone senza problemi con -c copy
+SEGMENTABLE_FORMATS = ['mp4', 'm4v', 'mov', 'mkv', 'webm']
+
+# Sotto questa durata per segmento l'avvio dei processi non conviene
+MIN_SEGMENT_SECONDS = 30
+MAX_SEGMENTS = 16
+
+# Differenza massima di durata (in secondi) tra sorgente e risultato
+SYNC_TOLERANCE = 0.25
+
+
+def segment_count(duration, cores=None):
+    """
+    Sceglie in quanti segmenti dividere un video
+
+    Args:
+        duration: durata del video in secondi
+        cores: core disponibili (di default tutti quelli della macchina)
+
+    Returns:
+        int: numero di segmenti, 1 se non conviene dividere
+    """
+    cores = cores or os.cpu_count() or 1
+    if not duration:
+        return 1
+    return max(1, min(cores, MAX_SEGMENTS, int(duration // MIN_SEGMENT_SECONDS)))
+
+
+def encode_segmented(input_path, output_path, video_args, audio_args, segments,
+                     progress_callback=None, cores=None):
+    """
+    Codifica un video dividendolo in segmenti ai keyframe, codificati in parallelo
+
+    L'audio viene codificato a parte in un unico passaggio e unito alla fine,
+    così le giunzioni tra i segmenti video non possono introdurre salti o
+    sfasamenti; al termine le durate vengono confrontate con la sorgente.
+
+    Args:
+        input_path: video da convertire
+        output_path: file di destinazione
+        video_args: argomenti ffmpeg per la traccia video
+        audio_args: argomenti ffmpeg per la traccia audio (['-an'] per nessun audio)
+        segments: numero di segmenti desiderato
+        progress_callback: funzione chiamata con (percentuale, velocità)
+        cores: core da dividere tra i processi ffmpeg
+
+    Returns:
+        bool: True se il risultato è stato scritto e verificato
+    """
+    work_dir = output_path + '.segments'
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        return _encode_segmented(input_path, output_path, video_args, audio_args, segments,
+                                 progress_callback, cores or os.cpu_count() or 1, work_dir)
+    except Exception as e:
+        print(f"Errore nella codifica a segmenti: {e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _encode_segmented(input_path, output_path, video_args, audio_args, segments,
+                      progress_callback, cores, work_dir):
+    ext = os.path.splitext(output_path)[1]
+    source_durations = stream_durations(input_path)
+
+    # 1. Divisione della traccia video ai keyframe, senza ricodifica
+    parts = _split_video(input_path, work_dir, source_durations.get('video') or 0, segments, ext)
+    if len(parts) < 2:
+        return False
+    total = sum(part['duration'] for part in parts) or 1
+
+    # 2. Codifica dei segmenti (e dell'audio) in parallelo: i core della
+    # quota si dividono tra tutti i processi ffmpeg, audio compreso
+    audio_path = os.path.join(work_dir, 'audio' + ext)
+    has_audio = audio_args != ['-an'] and source_durations.get('audio')
+    threads = max(1, cores // (len(parts) + (1 if has_audio else 0)))
+    done = [0.0] * len(parts)
+    progress_lock = threading.Lock()
+
+    def encode_part(index):
+        part = parts[index]
+
+        def on_progress(percent, speed):
+            if not progress_callback:
+                return
+            with progress_lock:
+                done[index] = part['duration'] * percent / 100
+                overall = min(99.9, sum(done) / total * 100)
+            progress_callback(round(overall, 1), speed)
+
+        cmd = ['ffmpeg', '-y', '-i', part['source']] + video_args + ['-an', part['encoded']]
+        return run_ffmpeg(cmd, part['duration'], on_progress, threads=threads).returncode == 0
+
+    def encode_audio():
+        cmd = ['ffmpeg', '-y', '-i', input_path, '-vn'] + audio_args + [audio_path]
+        return run_ffmpeg(cmd, threads=threads).returncode == 0
+
+    with ThreadPoolExecutor(max_workers=len(parts) + 1) as executor:
+        futures = [executor.submit(encode_part, index) for index in range(len(parts))]
+        if has_audio:
+            futures.append(executor.submit(encode_audio))
+        if not all(future.result() for future in futures):
+            return False
+
+    # 3. Concatenazione senza perdita e unione dell'audio
+    list_path = os.path.join(work_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for part in parts:
+            f.write(f"file '{os.path.basename(part['encoded'])}'\n")
+
+    # La sorgente è l'ultimo input: da lì vengono i metadati del contenitore
+    # (titolo, tag globali) e i capitoli, che i segmenti non hanno
+    cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if has_audio:
+        cmd.extend(['-i', audio_path])
+    source_index = str(2 if has_audio else 1)
+    cmd.extend(['-i', input_path, '-map', '0:v'])
+    if has_audio:
+        cmd.extend(['-map', '1:a'])
+    cmd.extend(['-map_metadata', source_index, '-map_chapters', source_index,
+                '-c', 'copy', output_path])
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return False
+
+    # 4. Verifica: giunzioni continue e audio allineato al video
+    output_durations = stream_durations(output_path)
+    for kind in ['video', 'audio'] if has_audio else ['video']:
+        expected = source_durations.get(kind)
+        actual = output_durations.get(kind)
+        if expected and (actual is None or abs(actual - expected) > SYNC_TOLERANCE):
+            print(f"Durata {kind} non allineata dopo la concatenazione: {actual} invece di {expected}")
+            return False
+
+    if progress_callback:
+        progress_callback(100.0, None)
+    return True
+
+
+def _split_video(input_path, work_dir, duration, segments, ext):
+    """Divide la traccia video in segmenti che iniziano con un keyframe"""
+    list_path = os.path.join(work_dir, 'segments.csv')
+    cmd = [
+        'ffmpeg', '-y', '-i', input_path, '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_time', f'{duration / segments:.3f}',
+        '-reset_timestamps', '1', '-segment_list', list_path, '-segment_list_type', 'csv',
+        os.path.join(work_dir, 'source_%03d.mkv'),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return []
+
+    parts = []
+    with open(list_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            name, start, end = row[0], float(row[1]), float(row[2])
+            index = len(parts)
+            parts.append({
+                'source': os.path.join(work_dir, name),
+                'encoded': os.path.join(work_dir, f'encoded_{index:03d}{ext}'),
+                'duration': max(0.0, end - start),
+            })
+    return parts
+
+
+def stream_durations(path):
+    """
+    Durata in secondi della prima traccia video e della prima traccia audio
+
+    Returns:
+        dict: {'video': secondi, 'audio': secondi}, con le sole tracce presenti
+    """
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+           '-show_entries', 'stream=codec_type,duration:stream_tags=DURATION:format=duration', path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+
+    data = json.loads(result.stdout)
+    format_duration = _to_seconds(data.get('format', {}).get('duration'))
+    durations = {}
+    for stream in data.get('streams', []):
+        kind = stream.get('codec_type')
+        if kind not in ('video', 'audio') or kind in durations:
+            continue
+        # Matroska/WebM riportano la durata solo nei tag
+        duration = _to_seconds(stream.get('duration'))
+        if duration is None:
+            duration = _to_seconds(stream.get('tags', {}).get('DURATION'))
+        durations[kind] = duration if duration is not None else format_duration
+    return durations
+
+
+def _to_seconds(value):
+    if value in (None, '', 'N/A'):
+        return None
+    try:
+        if ':' in str(value):
+            hours, minutes, seconds = str(value).split(':')
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        return float(value)
+    except ValueError:
+        return None
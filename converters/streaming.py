@@ -0,0 +1,140 @@
+import os
+
+from .ffmpeg_utils import run_ffmpeg
+
+# Target di streaming adattivo e file principale (playlist/manifest) di ciascuno
+STREAMING_FORMATS = {
+    'hls': 'master.m3u8',
+    'dash': 'manifest.mpd',
+}
+
+# Bitrate video per altezza della rendition
+LADDER_BITRATES = {
+    2160: 14000,
+    1440: 8000,
+    1080: 5000,
+    720: 2800,
+    480: 1400,
+    360: 800,
+    240: 400,
+}
+DEFAULT_LADDER = [1080, 720, 480, 360]
+
+# Durata dei segmenti: i keyframe vengono forzati allo stesso intervallo in
+# tutte le rendition, così il player può cambiare qualità a ogni segmento
+SEGMENT_SECONDS = 4
+
+
+def streaming_format(output_path):
+    """Restituisce 'hls' o 'dash' se output_path è una playlist di streaming, altrimenti None"""
+    name = os.path.basename(output_path)
+    for fmt, playlist in STREAMING_FORMATS.items():
+        if name == playlist:
+            return fmt
+    return None
+
+
+def build_ladder(source_height, heights=None):
+    """
+    Sceglie le rendition da produrre, senza mai ingrandire la sorgente
+
+    Args:
+        source_height: altezza del video sorgente (None se sconosciuta)
+        heights: altezze richieste (di default DEFAULT_LADDER)
+
+    Returns:
+        list: tuple (altezza, bitrate in kbit/s) dalla più alta alla più bassa
+    """
+    heights = sorted({int(h) for h in (heights or DEFAULT_LADDER) if int(h) in LADDER_BITRATES},
+                     reverse=True)
+    if source_height:
+        ladder = [h for h in heights if h <= source_height]
+        if not ladder:
+            # Sorgente più piccola di tutte le rendition: una sola, all'altezza originale
+            nearest = min(LADDER_BITRATES, key=lambda h: abs(h - source_height))
+            return [(source_height - source_height % 2, LADDER_BITRATES[nearest])]
+        heights = ladder
+    return [(h, LADDER_BITRATES[h]) for h in heights]
+
+
+def encode_ladder(input_path, output_path, ladder, has_audio=True, audio_bitrate='128k',
+                  preset='veryfast', trim=None, duration=None, progress_callback=None, threads=None):
+    """
+    Produce tutte le rendition in un solo processo ffmpeg: l'input viene
+    decodificato una volta e diviso con split, ogni ramo viene scalato e
+    codificato con il proprio bitrate. L'audio è codificato una volta e
+    condiviso da tutte le rendition.
+
+    Args:
+        input_path: video sorgente
+        output_path: playlist principale (master.m3u8 o manifest.mpd); i
+            segmenti vengono scritti nella stessa cartella
+        ladder: lista di (altezza, bitrate in kbit/s) da build_ladder
+        has_audio: False se la sorgente non ha una traccia audio
+        audio_bitrate: bitrate dell'audio AAC
+        preset: preset di x264
+        trim: tupla (inizio, fine) in secondi, applicata con seek lato input
+        duration: durata del video, per la percentuale di avanzamento
+        progress_callback: funzione chiamata con (percentuale, velocità)
+        threads: thread per encoder e filtri
+
+    Returns:
+        bool: True se playlist e segmenti sono stati scritti
+    """
+    fmt = streaming_format(output_path)
+    if not fmt or not ladder:
+        return False
+
+    folder = os.path.dirname(output_path)
+    os.makedirs(folder, exist_ok=True)
+
+    outputs = ''.join(f'[s{index}]' for index in range(len(ladder)))
+    scales = ';'.join(f'[s{index}]scale=-2:{height}[v{index}]' for index, (height, _) in enumerate(ladder))
+    cmd = ['ffmpeg', '-y']
+    if trim and len(trim) == 2:
+        cmd.extend(['-ss', str(trim[0]), '-to', str(trim[1])])
+    cmd.extend(['-i', input_path,
+                '-filter_complex', f'[0:v]split={len(ladder)}{outputs};{scales}'])
+
+    for index, (_, bitrate) in enumerate(ladder):
+        # maxrate/bufsize limitano i picchi, così ogni rendition resta nella sua banda
+        cmd.extend(['-map', f'[v{index}]', f'-c:v:{index}', 'libx264',
+                    f'-b:v:{index}', f'{bitrate}k',
+                    f'-maxrate:v:{index}', f'{int(bitrate * 1.07)}k',
+                    f'-bufsize:v:{index}', f'{int(bitrate * 1.5)}k'])
+
+    cmd.extend(['-preset', preset, '-pix_fmt', 'yuv420p', '-sc_threshold', '0',
+                '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})'])
+
+    if has_audio:
+        cmd.extend(['-map', '0:a:0', '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2'])
+
+    if fmt == 'hls':
+        # Segmenti fMP4 (HLS v7): gli stessi che userebbe DASH
+        stream_map = ' '.join(f'v:{index}' + (',agroup:audio' if has_audio else '')
+                              for index in range(len(ladder)))
+        if has_audio:
+            stream_map += ' a:0,agroup:audio'
+        cmd.extend(['-f', 'hls', '-hls_time', str(SEGMENT_SECONDS),
+                    '-hls_playlist_type', 'vod', '-hls_segment_type', 'fmp4',
+                    '-hls_fmp4_init_filename', 'stream_%v_init.mp4',
+                    '-hls_segment_filename', os.path.join(folder, 'stream_%v_%03d.m4s'),
+                    '-master_pl_name', STREAMING_FORMATS['hls'],
+                    '-var_stream_map', stream_map,
+                    os.path.join(folder, 'stream_%v.m3u8')])
+    else:
+        # DASH, con le playlist HLS degli stessi segmenti
+        adaptation_sets = 'id=0,streams=v' + (' id=1,streams=a' if has_audio else '')
+        cmd.extend(['-f', 'dash', '-seg_duration', str(SEGMENT_SECONDS),
+                    '-use_template', '1', '-use_timeline', '1',
+                    '-adaptation_sets', adaptation_sets,
+                    '-init_seg_name', 'init_$RepresentationID$.m4s',
+                    '-media_seg_name', 'chunk_$RepresentationID$_$Number%05d$.m4s',
+                    '-hls_playlist', '1', '-hls_master_name', STREAMING_FORMATS['hls'],
+                    output_path])
+
+    result = run_ffmpeg(cmd, duration, progress_callback, threads=threads)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return False
+    return os.path.isfile(output_path)
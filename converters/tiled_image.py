@@ -0,0 +1,772 @@
+import io
+import json
+import math
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, ImageChops, PngImagePlugin, TiffImagePlugin
+
+# Byte decodificati per banda: la memoria usata (qualche copia della banda)
+# non dipende dalle dimensioni dell'immagine
+BAND_BYTES = 16 * 1024 * 1024
+
+# Dimensione indicativa delle strisce dei TIFF scritti
+STRIP_BYTES = 1024 * 1024
+
+# Target 'tiles': cartella di tessere WebP con il relativo indice
+TILES_FORMAT = 'tiles'
+TILES_INDEX = 'tiles.json'
+TILE_SIZE = 512
+
+# Formati di output scritti una banda alla volta
+TILED_OUTPUT_FORMATS = ['png', 'tif', 'tiff', TILES_FORMAT]
+
+# Modi dei TIFF letti a bande (8 bit per campione)
+BAND_MODES = ['1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'CMYK']
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_COLOR_TYPES = {'L': 0, 'RGB': 2, 'P': 3, 'LA': 4, 'RGBA': 6}
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Tag copiati dal TIFF sorgente nei TIFF di una sola banda
+_TIFF_COPIED_TAGS = [258, 259, 262, 266, 277, 284, 317, 320, 338, 339, 347, 530, 531, 532]
+
+
+def is_tiles_output(output_path):
+    """True se output_path è l'indice di una cartella di tessere"""
+    return os.path.basename(output_path) == TILES_INDEX
+
+
+def _band_height(width, mode, unit=1):
+    """Righe per banda (multiplo di unit) entro BAND_BYTES"""
+    row_bytes = max(1, width * len(Image.new(mode, (1, 1)).getbands()))
+    return max(unit, BAND_BYTES // row_bytes // unit * unit)
+
+
+class ImageBandReader:
+    """Bande di un'immagine già in memoria (per i formati non leggibili a bande)"""
+
+    random_access = True
+
+    def __init__(self, img):
+        self.img = img
+        self.size = img.size
+        self.mode = img.mode
+        self.info = dict(img.info)
+        self.band_height = _band_height(img.width, img.mode)
+
+    def bands(self, reverse=False):
+        starts = range(0, self.size[1], self.band_height)
+        for y in (reversed(starts) if reverse else starts):
+            yield y, self.img.crop((0, y, self.size[0], min(self.size[1], y + self.band_height)))
+
+    def close(self):
+        pass
+
+
+class PngBandReader:
+    """
+    Legge un PNG non interlacciato (qualsiasi profondità) a bande di righe,
+    senza mai decodificare l'intera immagine.
+
+    Lo stream zlib viene decompresso man mano; le righe filtrate di ogni banda
+    diventano un piccolo PNG autonomo, preceduto dall'ultima riga già
+    decodificata (non filtrata). Il piccolo PNG dichiara un tipo a 8 bit con
+    gli stessi byte per pixel dell'originale, così Pillow restituisce i byte
+    non filtrati senza convertirli; i campioni vengono poi interpretati con il
+    rawmode del PNG originale. Le righe si leggono solo in ordine.
+    """
+
+    random_access = False
+
+    def __init__(self, path):
+        png = PngImagePlugin.PngImageFile(path)
+        try:
+            if png.info.get('interlace'):
+                raise ValueError("PNG interlacciato non leggibile a bande")
+            self.size = png.size
+            self.mode = png.mode
+            self.info = dict(png.info)
+            self._rawmode = png.tile[0].args
+            self._palette = png.palette.copy() if png.mode == 'P' and png.palette else None
+        finally:
+            png.close()
+
+        self.path = path
+        with open(path, 'rb') as f:
+            f.read(8)
+            ihdr = next(self._chunks(f))[1]
+        depth, color_type = ihdr[8], ihdr[9]
+
+        bits = depth * _PNG_CHANNELS[color_type]
+        self._pixel_bytes = max(1, bits // 8)  # distanza usata dai filtri PNG
+        self._stride = math.ceil(self.size[0] * bits / 8)
+        self.band_height = max(1, BAND_BYTES // self._stride)
+
+    @staticmethod
+    def _chunks(f, skip=()):
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                return
+            length, chunk_type = struct.unpack('>I4s', head)
+            if chunk_type in skip:
+                f.seek(length + 4, 1)
+                continue
+            yield chunk_type, f.read(length)
+            f.read(4)
+            if chunk_type == b'IEND':
+                return
+
+    def _idat_data(self):
+        with open(self.path, 'rb') as f:
+            f.read(8)
+            for chunk_type, data in self._chunks(f):
+                if chunk_type == b'IDAT':
+                    yield data
+
+    def bands(self, reverse=False):
+        if reverse:
+            raise ValueError("Un PNG si legge a bande solo dall'alto in basso")
+
+        width, height = self.size
+        row_bytes = self._stride + 1
+        previous = bytes(self._stride)  # Prima della prima riga: zeri, come da specifica
+        pending = bytearray()
+        decompressor = zlib.decompressobj()
+        y = 0
+
+        for data in self._idat_data():
+            while data:
+                # max_length: un chunk molto comprimibile non riempie la memoria
+                pending += decompressor.decompress(data, BAND_BYTES)
+                data = decompressor.unconsumed_tail
+                while y < height:
+                    rows = min(self.band_height, height - y)
+                    if len(pending) < rows * row_bytes:
+                        break
+                    raw = self._unfilter(previous, pending[:rows * row_bytes], rows)
+                    del pending[:rows * row_bytes]
+                    previous = raw[-self._stride:]
+                    band = Image.frombytes(self.mode, (width, rows), raw, 'raw', self._rawmode)
+                    if self._palette:
+                        band.putpalette(self._palette)
+                    if 'transparency' in self.info:
+                        band.info['transparency'] = self.info['transparency']
+                    yield y, band
+                    y += rows
+        if y < height:
+            raise ValueError("PNG troncato")
+
+    def _unfilter(self, previous, rows_data, rows):
+        """Byte non filtrati delle righe di una banda"""
+        if self._pixel_bytes <= 4:
+            # Tipo a 8 bit con gli stessi byte per pixel: i byte passano invariati
+            color_type = {1: 0, 2: 4, 3: 2, 4: 6}[self._pixel_bytes]
+            return self._decode_raw(color_type, 8, self._stride // self._pixel_bytes,
+                                    previous, rows_data, rows)
+
+        # RGB e RGBA a 16 bit: Pillow tiene solo il byte alto di ogni campione.
+        # Una seconda decodifica con ogni riga spostata di un byte (preceduta da
+        # un byte a zero, che resta zero con qualsiasi filtro) dà i byte bassi
+        color_type = 2 if self._pixel_bytes == 6 else 6
+        pixels = self._stride // self._pixel_bytes
+        high = self._decode_raw(color_type, 16, pixels, previous, rows_data, rows)
+        pad = bytes(self._pixel_bytes - 1)
+        shifted = bytearray()
+        for row in range(rows):
+            start = row * (self._stride + 1)
+            shifted += rows_data[start:start + 1] + b'\x00' + rows_data[start + 1:start + 1 + self._stride] + pad
+        low = self._decode_raw(color_type, 16, pixels + 1, b'\x00' + previous + pad, shifted, rows)
+
+        half, shifted_half = self._stride // 2, (self._stride + self._pixel_bytes) // 2
+        raw = bytearray(rows * self._stride)
+        for row in range(rows):
+            start = row * self._stride
+            raw[start:start + self._stride:2] = high[row * half:(row + 1) * half]
+            raw[start + 1:start + self._stride:2] = low[row * shifted_half + 1:row * shifted_half + 1 + half]
+        return bytes(raw)
+
+    def _decode_raw(self, color_type, depth, width, previous, rows_data, rows):
+        ihdr = struct.pack('>IIBBBBB', width, rows + 1, depth, color_type, 0, 0, 0)
+        buffer = io.BytesIO()
+        buffer.write(_PNG_SIGNATURE)
+        _png_chunk(buffer, b'IHDR', ihdr)
+        _png_chunk(buffer, b'IDAT', zlib.compress(b'\x00' + previous + bytes(rows_data), 0))
+        _png_chunk(buffer, b'IEND', b'')
+        buffer.seek(0)
+        with Image.open(buffer) as img:
+            data = img.tobytes()
+        # Senza la riga precedente, che serve solo a togliere i filtri
+        return data[len(data) // (rows + 1):]
+
+    def close(self):
+        pass
+
+
+class TiffBandReader:
+    """
+    Legge un TIFF a strisce o a tessere una banda alla volta, in qualsiasi ordine.
+
+    Ogni banda (alcune strisce, oppure una riga di tessere) viene copiata in un
+    piccolo TIFF con gli stessi tag di compressione e colore e decodificata da
+    Pillow/libtiff: valgono tutte le compressioni che Pillow sa leggere. Nei
+    TIFF non compressi le righe si leggono direttamente dal file, anche
+    quando tutta l'immagine è in una sola striscia.
+    """
+
+    random_access = True
+
+    def __init__(self, path):
+        tiff = TiffImagePlugin.TiffImageFile(path)  # senza il controllo "decompression bomb"
+        try:
+            tags = tiff.tag_v2
+            if tiff.mode not in BAND_MODES or tags.get(284, 1) != 1:
+                raise ValueError(f"TIFF non leggibile a bande ({tiff.mode})")
+            self.size = tiff.size
+            self.mode = tiff.mode
+            self.info = dict(tiff.info)
+            self._byteorder = tags.prefix
+            # La palette (ColorMap) è già letta con i tag, senza decodificare l'immagine
+            self._palette = tiff.palette.copy() if tiff.mode == 'P' and tiff.palette else None
+            tile = tiff.tile[0]
+            self._rawmode = tile.args[0] if tile.codec_name == 'raw' else None
+            self._row_bytes = math.ceil(tiff.size[0] * sum(tags.get(258, (8,))) / 8)
+            self._tags = {tag: (tags[tag], tags.tagtype.get(tag)) for tag in _TIFF_COPIED_TAGS
+                          if tag in tags}
+
+            width, height = self.size
+            if 322 in tags:
+                self._tile_width = tags[322]
+                self._unit_rows = tags[323]
+                self._offsets = tags[324]
+                self._counts = tags[325]
+                self._across = math.ceil(width / self._tile_width)
+            else:
+                self._tile_width = None
+                self._unit_rows = min(tags.get(278, height), height)
+                self._offsets = tags[273]
+                self._counts = tags[279]
+                self._across = 1
+        finally:
+            tiff.close()
+
+        if self._rawmode and not self._tile_width:
+            # Non compresso: qualsiasi riga si legge al suo offset
+            self.band_height = _band_height(self.size[0], self.mode)
+        elif self._unit_rows * self._row_bytes > BAND_BYTES:
+            raise ValueError("Strisce troppo grandi per la lettura a bande")
+        else:
+            self.band_height = _band_height(self.size[0], self.mode, self._unit_rows)
+
+        self.path = path
+        self._file = open(path, 'rb')
+
+    def bands(self, reverse=False):
+        starts = range(0, self.size[1], self.band_height)
+        for y in (reversed(starts) if reverse else starts):
+            yield y, self.band(y)
+
+    def band(self, y):
+        """Righe da y a y + band_height (o fino alla fine)"""
+        rows = min(self.band_height, self.size[1] - y)
+        if self._rawmode and not self._tile_width:
+            return self._raw_band(y, rows)
+
+        first_unit = y // self._unit_rows
+        units = math.ceil(rows / self._unit_rows)
+        indexes = range(first_unit * self._across, (first_unit + units) * self._across)
+
+        chunks = []
+        for index in indexes:
+            self._file.seek(self._offsets[index])
+            chunks.append(self._file.read(self._counts[index]))
+
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=self._byteorder)
+        for tag, (value, tagtype) in self._tags.items():
+            ifd[tag] = value
+            if tagtype is not None:
+                ifd.tagtype[tag] = tagtype
+        ifd[256] = self.size[0]
+        ifd[257] = rows
+        offsets_tag, counts_tag = (324, 325) if self._tile_width else (273, 279)
+        if self._tile_width:
+            ifd[322] = self._tile_width
+            ifd[323] = self._unit_rows
+        else:
+            ifd[278] = self._unit_rows
+        # Header, IFD e subito dopo i dati. Pillow somma da sé la fine dell'IFD
+        # agli StripOffsets, non ai TileOffsets: questi si spostano a mano
+        offsets, position = [], 0
+        for chunk in chunks:
+            offsets.append(position)
+            position += len(chunk)
+        ifd[offsets_tag] = tuple(offsets)
+        ifd[counts_tag] = tuple(len(chunk) for chunk in chunks)
+        ifd.tagtype[offsets_tag] = ifd.tagtype[counts_tag] = 4  # LONG
+        directory = ifd.tobytes(8)
+        if self._tile_width:
+            ifd[offsets_tag] = tuple(offset + 8 + len(directory) for offset in offsets)
+            directory = ifd.tobytes(8)
+
+        little_endian = self._byteorder == b'II'
+        buffer = io.BytesIO()
+        buffer.write(self._byteorder + (b'*\x00' if little_endian else b'\x00*'))
+        buffer.write(struct.pack('<I' if little_endian else '>I', 8))
+        buffer.write(directory)
+        for chunk in chunks:
+            buffer.write(chunk)
+        buffer.seek(0)
+        with Image.open(buffer) as img:
+            img.load()
+            return img.copy()
+
+    def _raw_band(self, y, rows):
+        data = bytearray()
+        row = y
+        while row < y + rows:
+            strip = row // self._unit_rows
+            last = min(y + rows, (strip + 1) * self._unit_rows)
+            self._file.seek(self._offsets[strip] + (row - strip * self._unit_rows) * self._row_bytes)
+            data += self._file.read((last - row) * self._row_bytes)
+            row = last
+        band = Image.frombytes(self.mode, (self.size[0], rows), bytes(data), 'raw', self._rawmode)
+        if self._palette:
+            band.putpalette(self._palette)
+        return band
+
+    def close(self):
+        self._file.close()
+
+
+class SpilledBandReader:
+    """
+    Rende ad accesso casuale un lettore sequenziale (PNG): al primo passaggio
+    le bande vengono copiate non compresse in un file temporaneo, da cui si
+    rileggono in qualsiasi ordine. Su disco serve spazio per l'immagine
+    decodificata, in memoria resta una banda.
+    """
+
+    random_access = True
+
+    def __init__(self, reader):
+        self._reader = reader
+        self.size = reader.size
+        self.mode = reader.mode
+        self.info = reader.info
+        self._row_bytes = len(Image.new(self.mode, (self.size[0], 1)).tobytes())
+        self._file = None
+        self._bands = []
+        self._palette = None
+
+    def bands(self, reverse=False):
+        if not reverse:
+            yield from self._reader.bands()
+            return
+
+        self._file = tempfile.TemporaryFile()
+        for y, band in self._reader.bands():
+            if band.mode == 'P' and self._palette is None:
+                self._palette = band.getpalette()
+            self._bands.append((y, band.height, self._file.tell()))
+            self._file.write(band.tobytes())
+        for y, rows, offset in reversed(self._bands):
+            self._file.seek(offset)
+            band = Image.frombytes(self.mode, (self.size[0], rows), self._file.read(rows * self._row_bytes))
+            if self._palette:
+                band.putpalette(self._palette)
+            if 'transparency' in self.info:
+                band.info['transparency'] = self.info['transparency']
+            yield y, band
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._reader.close()
+
+
+def open_band_reader(path):
+    """
+    Apre un file per la lettura a bande leggendo solo l'header
+
+    Returns:
+        PngBandReader o TiffBandReader, None se il file non si può leggere a bande
+    """
+    try:
+        with open(path, 'rb') as f:
+            signature = f.read(8)
+        if signature == _PNG_SIGNATURE:
+            return PngBandReader(path)
+        if signature[:4] in (b'II*\x00', b'MM\x00*'):
+            return TiffBandReader(path)
+    except Exception as e:
+        print(f"Lettura a bande non disponibile: {e}")
+    return None
+
+
+def _png_chunk(f, chunk_type, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+class PngStreamWriter:
+    """
+    Scrive un PNG una banda alla volta, dall'alto in basso. Ogni riga usa il
+    filtro Up (differenza byte per byte con la riga precedente), calcolato su
+    tutta la banda con ImageChops.
+    """
+
+    random_access = False
+    modes = list(_PNG_COLOR_TYPES) + ['I;16']
+
+    def __init__(self, path, size, mode, info, quality=95):
+        self.size = size
+        self.mode = mode
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(max(1, int(9 - quality / 100.0 * 9)))
+        self._previous = None
+        self._next_row = 0
+        self._palette_written = mode != 'P'
+        self._info = info
+
+        # I;16: scala di grigi a 16 bit
+        depth, color_type = (16, 0) if mode == 'I;16' else (8, _PNG_COLOR_TYPES[mode])
+        self._file.write(_PNG_SIGNATURE)
+        _png_chunk(self._file, b'IHDR', struct.pack('>IIBBBBB', size[0], size[1], depth,
+                                                    color_type, 0, 0, 0))
+        dpi = info.get('dpi')
+        if dpi:
+            ppm = [int(value / 0.0254 + 0.5) for value in dpi]
+            _png_chunk(self._file, b'pHYs', struct.pack('>IIB', ppm[0], ppm[1], 1))
+
+    def write(self, y, band):
+        if y != self._next_row:
+            raise ValueError("Le bande di un PNG vanno scritte in ordine")
+        if not self._palette_written:
+            _png_chunk(self._file, b'PLTE', bytes(band.getpalette()))
+            transparency = self._info.get('transparency')
+            if isinstance(transparency, int):
+                _png_chunk(self._file, b'tRNS', b'\xff' * transparency + b'\x00')
+            elif isinstance(transparency, bytes):
+                _png_chunk(self._file, b'tRNS', transparency)
+            self._palette_written = True
+
+        # Le righe come immagine 'L' di byte: il filtro Up non dipende dai campioni
+        rows = band.height
+        data = band.tobytes('raw', 'I;16B') if band.mode == 'I;16' else band.tobytes()
+        stride = len(data) // rows
+        current = Image.frombytes('L', (stride, rows), data)
+        above = Image.new('L', (stride, rows))
+        if self._previous:
+            above.paste(self._previous, (0, 0))
+        if rows > 1:
+            above.paste(current.crop((0, 0, stride, rows - 1)), (0, 1))
+        filtered = ImageChops.subtract_modulo(current, above).tobytes()
+        self._previous = current.crop((0, rows - 1, stride, rows))
+
+        raw = bytearray()
+        for row in range(rows):
+            raw += b'\x02'
+            raw += filtered[row * stride:(row + 1) * stride]
+        data = self._compressor.compress(bytes(raw))
+        if data:
+            _png_chunk(self._file, b'IDAT', data)
+        self._next_row += rows
+
+    def close(self):
+        data = self._compressor.flush()
+        if data:
+            _png_chunk(self._file, b'IDAT', data)
+        _png_chunk(self._file, b'IEND', b'')
+        self._file.close()
+        return self._next_row == self.size[1]
+
+
+class _RowAssembler:
+    """
+    Raccoglie bande di altezza qualsiasi in unità di righe fisse (strisce o
+    righe di tessere), anche quando arrivano dal basso verso l'alto
+    """
+
+    random_access = True
+
+    def __init__(self, size, mode, unit_rows):
+        self.size = size
+        self.mode = mode
+        self.unit_rows = unit_rows
+        self._partial = {}
+
+    def write(self, y, band):
+        width, height = self.size
+        top = y
+        while top < y + band.height:
+            unit = top // self.unit_rows
+            unit_top = unit * self.unit_rows
+            unit_height = min(self.unit_rows, height - unit_top)
+            bottom = min(y + band.height, unit_top + unit_height)
+            piece = band.crop((0, top - y, width, bottom - y))
+            if piece.height == unit_height:
+                self._write_unit(unit, piece)
+            else:
+                buffer, filled = self._partial.get(unit) or (Image.new(band.mode, (width, unit_height)), 0)
+                if band.mode == 'P':
+                    buffer.putpalette(band.getpalette())
+                buffer.paste(piece, (0, top - unit_top))
+                filled += piece.height
+                if filled == unit_height:
+                    self._partial.pop(unit, None)
+                    self._write_unit(unit, buffer)
+                else:
+                    self._partial[unit] = (buffer, filled)
+            top = bottom
+
+
+class TiffStreamWriter(_RowAssembler):
+    """
+    Scrive un TIFF a strisce compresse (Deflate) man mano che arrivano le
+    bande, in qualsiasi ordine. L'IFD va in fondo al file; oltre 4GB di dati
+    si usa BigTIFF.
+    """
+
+    modes = ['L', 'LA', 'P', 'RGB', 'RGBA', 'CMYK', 'I;16']
+
+    def __init__(self, path, size, mode, info, quality=95):
+        pixel_bytes = len(Image.new(mode, (1, 1)).tobytes())
+        super().__init__(size, mode, max(1, min(size[1], STRIP_BYTES // (size[0] * pixel_bytes))))
+        self.samples = len(Image.new(mode, (1, 1)).getbands())
+        self.bits = 8 * pixel_bytes // self.samples
+        self.info = info
+        self.big = size[0] * size[1] * pixel_bytes > 0xF0000000
+        self._level = max(1, int(9 - quality / 100.0 * 9))
+        strips = math.ceil(size[1] / self.unit_rows)
+        self._offsets = [None] * strips
+        self._counts = [0] * strips
+        self._palette = None
+
+        self._file = open(path, 'wb')
+        if self.big:
+            self._file.write(b'II+\x00' + struct.pack('<HHQ', 8, 0, 0))
+        else:
+            self._file.write(b'II*\x00' + struct.pack('<I', 0))
+
+    def _write_unit(self, index, band):
+        if band.mode == 'P' and self._palette is None:
+            self._palette = band.getpalette()
+        data = zlib.compress(band.tobytes(), self._level)
+        self._offsets[index] = self._file.tell()
+        self._counts[index] = len(data)
+        self._file.write(data)
+
+    def close(self):
+        if None in self._offsets or self._partial:
+            self._file.close()
+            return False
+
+        long_type = 16 if self.big else 4
+        photometric = {'L': 1, 'LA': 1, 'P': 3, 'RGB': 2, 'RGBA': 2, 'CMYK': 5, 'I;16': 1}[self.mode]
+        entries = [
+            (256, 4, [self.size[0]]),
+            (257, 4, [self.size[1]]),
+            (258, 3, [self.bits] * self.samples),
+            (259, 3, [8]),  # Deflate
+            (262, 3, [photometric]),
+            (273, long_type, self._offsets),
+            (277, 3, [self.samples]),
+            (278, 4, [self.unit_rows]),
+            (279, long_type, self._counts),
+            (284, 3, [1]),
+        ]
+        dpi = self.info.get('dpi')
+        if dpi:
+            entries += [(282, 5, [(int(dpi[0] * 100), 100)]), (283, 5, [(int(dpi[1] * 100), 100)]),
+                        (296, 3, [2])]
+        if self.mode == 'P':
+            palette = (self._palette or []) + [0] * (768 - len(self._palette or []))
+            entries.append((320, 3, [value * 257 for channel in range(3)
+                                     for value in palette[channel:768:3]]))
+        if self.mode in ('LA', 'RGBA'):
+            entries.append((338, 3, [2]))  # Alpha non premoltiplicato
+        _write_ifd(self._file, sorted(entries), self.big)
+        self._file.close()
+        return True
+
+
+def _write_ifd(f, entries, big):
+    """Scrive l'IFD in fondo al file e ne aggiorna l'offset nell'header"""
+    formats = {3: 'H', 4: 'I', 5: 'II', 16: 'Q'}
+    entry_size, inline = (20, 8) if big else (12, 4)
+    count_size = 8 if big else 2
+    next_size = 8 if big else 4
+
+    f.seek(0, os.SEEK_END)
+    if f.tell() % 2:
+        f.write(b'\x00')
+    ifd_offset = f.tell()
+    extra_offset = ifd_offset + count_size + len(entries) * entry_size + next_size
+
+    table, extra = bytearray(), bytearray()
+    for tag, field_type, values in entries:
+        flat = [part for value in values for part in (value if isinstance(value, tuple) else (value,))]
+        data = struct.pack('<' + formats[field_type] * len(values), *flat)
+        table += struct.pack('<HHQ' if big else '<HHI', tag, field_type, len(values))
+        if len(data) <= inline:
+            table += data.ljust(inline, b'\x00')
+        else:
+            table += struct.pack('<Q' if big else '<I', extra_offset + len(extra))
+            extra += data
+            if len(extra) % 2:
+                extra += b'\x00'
+
+    f.write(struct.pack('<Q' if big else '<H', len(entries)))
+    f.write(table)
+    f.write(bytes(next_size))
+    f.write(extra)
+    f.seek(8 if big else 4)
+    f.write(struct.pack('<Q' if big else '<I', ifd_offset))
+
+
+class TileWriter(_RowAssembler):
+    """
+    Divide l'immagine in tessere WebP quadrate (riga_colonna.webp) più un
+    indice JSON; le tessere di ogni riga vengono codificate in parallelo su
+    workers thread (di default uno per core)
+    """
+
+    modes = ['RGB', 'RGBA']
+
+    def __init__(self, index_path, size, mode, info, quality=95, tile_size=TILE_SIZE, workers=None):
+        super().__init__(size, mode, tile_size)
+        self.index_path = index_path
+        self.folder = os.path.dirname(index_path)
+        self.quality = quality
+        self.columns = math.ceil(size[0] / tile_size)
+        self.rows = math.ceil(size[1] / tile_size)
+        self._written = 0
+        os.makedirs(self.folder, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers or os.cpu_count() or 1))
+
+    def _write_unit(self, row, band):
+        def save(column):
+            left = column * self.unit_rows
+            tile = band.crop((left, 0, min(self.size[0], left + self.unit_rows), band.height))
+            tile.save(os.path.join(self.folder, f'{row}_{column}.webp'), format='WEBP',
+                      quality=self.quality)
+        # Una riga alla volta: in memoria resta al più una riga di tessere
+        list(self._executor.map(save, range(self.columns)))
+        self._written += 1
+
+    def close(self):
+        try:
+            if self._written != self.rows or self._partial:
+                return False
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'width': self.size[0],
+                    'height': self.size[1],
+                    'tile_size': self.unit_rows,
+                    'columns': self.columns,
+                    'rows': self.rows,
+                    'format': 'webp',
+                    'pattern': '{row}_{column}.webp',
+                }, f, indent=2)
+            return True
+        finally:
+            self._executor.shutdown()
+
+
+_WRITERS = {
+    'png': PngStreamWriter,
+    'tif': TiffStreamWriter,
+    'tiff': TiffStreamWriter,
+    TILES_FORMAT: TileWriter,
+}
+
+
+def output_format_of(output_path):
+    if is_tiles_output(output_path):
+        return TILES_FORMAT
+    return os.path.splitext(output_path)[1][1:].lower()
+
+
+def can_convert_tiled(reader, output_path):
+    """True se il file può essere convertito a bande verso output_path"""
+    return bool(reader) and output_format_of(output_path) in _WRITERS
+
+
+def convert_tiled(reader, output_path, flip_horizontal=False, flip_vertical=False,
+                  grayscale=False, quality=95, dpi=None, workers=None):
+    """
+    Converte un'immagine banda per banda, a piena risoluzione e con memoria
+    limitata: in memoria ci sono solo la banda corrente e i buffer dei writer
+
+    Args:
+        reader: lettore a bande (open_band_reader o ImageBandReader)
+        output_path: PNG, TIFF o indice di una cartella di tessere
+        flip_horizontal: ribalta ogni banda orizzontalmente
+        flip_vertical: inverte l'ordine delle righe
+        grayscale: converte in scala di grigi
+        quality: qualità (livello di compressione per PNG/TIFF)
+        dpi: risoluzione da scrivere nel file (di default quella della sorgente)
+        workers: thread per la codifica delle tessere (di default uno per core)
+
+    Returns:
+        bool: True se il file è stato scritto per intero
+    """
+    writer_class = _WRITERS[output_format_of(output_path)]
+    mode = reader.mode
+    if grayscale and mode != 'I;16':
+        mode = 'L'
+    # La trasparenza di una palette si conserva solo nel PNG
+    if mode == 'P' and 'transparency' in reader.info and writer_class is not PngStreamWriter:
+        mode = 'RGBA'
+    if mode not in writer_class.modes:
+        if mode == 'P':
+            mode = 'RGBA' if 'transparency' in reader.info else 'RGB'
+        elif mode in ('L', '1', 'I;16') and 'L' not in writer_class.modes:
+            mode = 'RGB'
+        elif mode == '1':
+            mode = 'L'
+        else:
+            mode = 'RGBA' if 'A' in mode else 'RGB'
+
+    info = dict(reader.info)
+    if dpi is not None:
+        info['dpi'] = (dpi, dpi)
+    width, height = reader.size
+    options = {'workers': workers} if writer_class is TileWriter else {}
+
+    # PNG verso PNG: né il lettore né il writer vanno dal basso verso l'alto,
+    # le bande passano da un file temporaneo
+    if flip_vertical and not reader.random_access and not writer_class.random_access:
+        reader = SpilledBandReader(reader)
+    # Con un lettore ad accesso casuale il ribaltamento verticale legge le
+    # bande dal basso, così anche il PNG viene scritto dall'alto in basso
+    reverse = flip_vertical and reader.random_access
+    try:
+        writer = writer_class(output_path, reader.size, mode, info, quality, **options)
+        try:
+            for y, band in reader.bands(reverse=reverse):
+                if band.mode == 'I;16' and mode != 'I;16':
+                    # 16 bit -> 8 bit in scala (convert taglierebbe i valori oltre 255)
+                    band = band.point(lambda value: value / 256, 'L')
+                if grayscale and band.mode not in ('L', 'I;16'):
+                    band = ImageOps.grayscale(band)
+                if band.mode != mode:
+                    band = band.convert(mode)
+                if flip_horizontal:
+                    band = band.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+                if flip_vertical:
+                    band = band.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+                    y = height - y - band.height
+                writer.write(y, band)
+        except Exception:
+            writer.close()
+            raise
+        return writer.close()
+    finally:
+        reader.close()
@@ -0,0 +1,227 @@
+import os
+import shutil
+import subprocess
+
+from .ffmpeg_utils import run_ffmpeg
+from .media_probe import media_probe
+from .segmented_encoder import stream_durations
+
+# Modalità di taglio: 'fast' taglia al keyframe precedente l'inizio copiando
+# i flussi, 'accurate' ricodifica solo i GOP parziali ai bordi
+TRIM_MODES = ['fast', 'accurate']
+
+# Ampiezza (in secondi) della finestra in cui si cercano i keyframe
+# attorno ai punti di taglio, invece di leggere l'intero file
+KEYFRAME_WINDOW = 60
+
+# Margine per gli arrotondamenti dei timestamp stampati da ffprobe
+EPSILON = 0.0005
+
+# Encoder per ricodificare i bordi nello stesso codec della sorgente. Solo
+# codec che il demuxer concat sa ricucire: per H.264 reinserisce SPS/PPS di
+# ciascuna parte, VP8/VP9 non hanno parametri globali
+EDGE_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-crf', '18', '-preset', 'fast'],
+    'vp8': ['-c:v', 'libvpx', '-crf', '8', '-b:v', '0'],
+    'vp9': ['-c:v', 'libvpx-vp9', '-crf', '28', '-b:v', '0', '-deadline', 'good', '-cpu-used', '4'],
+}
+
+# Differenza massima di durata (in secondi) tra il taglio richiesto e il risultato
+DURATION_TOLERANCE = 0.25
+
+
+def trim_copy(input_path, output_path, start, end, mode='accurate', video=True, audio=True,
+              progress_callback=None, threads=None):
+    """
+    Estrae un intervallo da un file audio/video senza ricodificarlo per intero
+
+    Il seek avviene sempre lato input, quindi ffmpeg salta direttamente al
+    punto di partenza invece di decodificare tutto ciò che lo precede.
+
+    Args:
+        input_path: file sorgente
+        output_path: file di destinazione (container compatibile con i codec sorgente)
+        start: inizio del taglio in secondi
+        end: fine del taglio in secondi
+        mode: 'fast' (parte dal keyframe precedente, nessuna ricodifica) o
+            'accurate' (ricodifica solo i frame prima del primo keyframe e
+            dopo l'ultimo, il resto viene copiato)
+        video: False per estrarre solo l'audio
+        audio: False per scartare l'audio
+        progress_callback: funzione chiamata con (percentuale, velocità)
+        threads: thread per le ricodifiche dei bordi
+
+    Returns:
+        bool: True se il file è stato scritto e ha la durata attesa
+    """
+    if end <= start:
+        return False
+
+    if not video:
+        # Nell'audio ogni pacchetto è un punto di accesso: il taglio è preciso al frame
+        return _finish(run_ffmpeg(_audio_copy_cmd(input_path, output_path, start, end),
+                                  end - start, progress_callback),
+                       output_path, 'audio', end - start, progress_callback)
+
+    before, first, last = keyframes_around(input_path, start, end)
+
+    if mode == 'fast':
+        if before is None:
+            return False
+        cmd = (['ffmpeg', '-y', '-ss', _ts(before + EPSILON), '-t', str(end - before),
+                '-i', input_path, '-map', '0:v:0'] + _audio_map(audio) +
+               ['-c', 'copy', '-avoid_negative_ts', 'make_zero', output_path])
+        return _finish(run_ffmpeg(cmd, end - before, progress_callback), output_path,
+                       'video', end - before, progress_callback)
+
+    # Modalità accurata: servono almeno un GOP intero da copiare e un encoder adatto
+    source = media_probe.probe(input_path).get('video') or {}
+    encoder = EDGE_ENCODERS.get(source.get('codec'))
+    if first is None or last is None or last <= first or not encoder:
+        return False
+
+    work_dir = output_path + '.trim'
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        return _smart_cut(input_path, output_path, start, end, first, last, source, encoder,
+                          audio, progress_callback, threads, work_dir)
+    except Exception as e:
+        print(f"Errore nel taglio: {e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _smart_cut(input_path, output_path, start, end, first, last, source, encoder,
+               audio, progress_callback, threads, work_dir):
+    ext = '.mkv'
+    edge_args = encoder + ['-pix_fmt', source.get('pix_fmt') or 'yuv420p']
+    total = end - start
+
+    def report(base, length):
+        def on_progress(percent, speed):
+            if progress_callback:
+                progress_callback(round(min(99.9, (base + length * percent / 100) / total * 100), 1), speed)
+        return on_progress
+
+    parts = []
+
+    # 1. Bordo iniziale: dal punto richiesto al primo keyframe, ricodificato
+    if first - start > EPSILON:
+        head = os.path.join(work_dir, 'head' + ext)
+        cmd = (['ffmpeg', '-y', '-ss', str(start), '-t', _ts(first - start - EPSILON),
+                '-i', input_path, '-map', '0:v:0', '-an'] + edge_args + [head])
+        if run_ffmpeg(cmd, first - start, report(0, first - start), threads).returncode != 0:
+            return False
+        parts.append(head)
+
+    # 2. GOP interi: copiati così come sono
+    middle = os.path.join(work_dir, 'middle' + ext)
+    cmd = ['ffmpeg', '-y', '-ss', _ts(first + EPSILON), '-t', _ts(last - first - 2 * EPSILON),
+           '-i', input_path, '-map', '0:v:0', '-an', '-c:v', 'copy', middle]
+    if run_ffmpeg(cmd).returncode != 0:
+        return False
+    parts.append(middle)
+    if progress_callback:
+        progress_callback(round(min(99.9, (last - start) / total * 100), 1), None)
+
+    # 3. Bordo finale: dall'ultimo keyframe alla fine richiesta, ricodificato
+    if end - last > EPSILON:
+        tail = os.path.join(work_dir, 'tail' + ext)
+        cmd = (['ffmpeg', '-y', '-ss', _ts(last), '-t', str(end - last),
+                '-i', input_path, '-map', '0:v:0', '-an'] + edge_args + [tail])
+        if run_ffmpeg(cmd, end - last, report(last - start, end - last), threads).returncode != 0:
+            return False
+        parts.append(tail)
+
+    # 4. Audio copiato dall'intervallo esatto
+    audio_path = os.path.join(work_dir, 'audio.mka')
+    if audio:
+        audio = run_ffmpeg(_audio_copy_cmd(input_path, audio_path, start, end)).returncode == 0
+
+    # 5. Unione delle parti video e dell'audio
+    list_path = os.path.join(work_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for part in parts:
+            f.write(f"file '{os.path.basename(part)}'\n")
+
+    cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio:
+        cmd.extend(['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0'])
+    cmd.extend(['-c', 'copy', output_path])
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return False
+
+    return _finish(result, output_path, 'video', total, progress_callback)
+
+
+def _audio_copy_cmd(input_path, output_path, start, end):
+    """
+    Copia la prima traccia audio dell'intervallo. Il seek lato input si
+    posiziona sul keyframe video precedente, quindi i pacchetti audio prima
+    dell'inizio arrivano con timestamp negativi: -ss 0 in output li scarta.
+    """
+    return ['ffmpeg', '-y', '-ss', str(start), '-t', str(end - start), '-i', input_path,
+            '-map', '0:a:0', '-c:a', 'copy', '-ss', '0', output_path]
+
+
+def _finish(result, output_path, kind, expected, progress_callback):
+    """Controlla l'esito di ffmpeg e la durata del file prodotto"""
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return False
+
+    actual = stream_durations(output_path).get(kind)
+    if actual is None or abs(actual - expected) > DURATION_TOLERANCE:
+        print(f"Durata del taglio non valida: {actual} invece di {expected}")
+        return False
+    if progress_callback:
+        progress_callback(100.0, None)
+    return True
+
+
+def keyframes_around(input_path, start, end):
+    """
+    Cerca i keyframe vicini ai punti di taglio leggendo solo i pacchetti
+    (nessuna decodifica) in due finestre attorno a inizio e fine
+
+    Returns:
+        tuple: (ultimo keyframe <= start, primo keyframe >= start,
+                ultimo keyframe <= end), None dove non trovato
+    """
+    near_start = _keyframe_times(input_path, max(0.0, start - KEYFRAME_WINDOW), start + KEYFRAME_WINDOW)
+    near_end = _keyframe_times(input_path, max(0.0, end - KEYFRAME_WINDOW), end + 1)
+
+    before = max((t for t in near_start if t <= start + EPSILON), default=None)
+    first = min((t for t in near_start if t >= start - EPSILON), default=None)
+    last = max((t for t in near_end if t <= end + EPSILON), default=None)
+    return before, first, last
+
+
+def _keyframe_times(input_path, start, end):
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-read_intervals', f'{start:.3f}%{end:.3f}',
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return []
+
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue
+    return times
+
+
+def _audio_map(audio):
+    return ['-map', '0:a:0?'] if audio else ['-an']
+
+
+def _ts(seconds):
+    return f'{max(0.0, seconds):.6f}'
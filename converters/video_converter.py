@@ -1,6 +1,22 @@
 import os
-import subprocess
 from .base_converter import BaseConverter
+from .capabilities import capabilities
+from .media_probe import media_probe
+from .ffmpeg_utils import run_ffmpeg, accepts_codec
+from .segmented_encoder import SEGMENTABLE_FORMATS, segment_count, encode_segmented
+from .trimmer import trim_copy
+from .streaming import streaming_format, build_ladder, encode_ladder
+from . import frame_extractor
+
+# Opzioni che cambiano il contenuto dei flussi e quindi richiedono la ricodifica
+# (il trim no: lo gestisce trim_copy ricodificando al più i bordi)
+REENCODE_OPTIONS = ['video_bitrate', 'audio_bitrate', 'resolution', 'fps', 'rotate', 'codec']
+
+# Formati di output che contengono solo l'audio del video
+AUDIO_ONLY_FORMATS = ['mp3', 'ogg', 'wav', 'flac']
+
+# Immagini animate generate dal video
+ANIMATED_FORMATS = ['gif', 'webp']
 
 class VideoConverter(BaseConverter):
     """Convertitore per file video"""
@@ -18,9 +34,15 @@ class VideoConverter(BaseConverter):
         ]
         
     def get_supported_output_formats(self):
-        return [
-            'mp4', 'avi', 'mov', 'mkv', 'webm', 'gif', 'mp3', 'ogg'
+        formats = [
+            'mp4', 'avi', 'mov', 'mkv', 'webm', 'gif', 'webp', 'mp3', 'ogg',
+            'hls', 'dash', 'jpg', 'png', 'frames'
         ]
+        # Solo i formati per cui ffmpeg ha un encoder
+        return [fmt for fmt in formats if capabilities.supports_output(fmt)]
+    
+    def uses_thread_budget(self, target_format=None, input_path=None):
+        return True
     
     def convert(self, input_path, output_path, **kwargs):
         """
@@ -33,212 +55,388 @@ class VideoConverter(BaseConverter):
         """
         try:
             # Estrai parametri dai kwargs
-            video_bitrate = kwargs.get('video_bitrate', self.video_bitrate)
             audio_bitrate = kwargs.get('audio_bitrate', self.audio_bitrate)
-            resolution = kwargs.get('resolution', self.resolution)
-            fps = kwargs.get('fps')
-            no_audio = kwargs.get('no_audio', False)
             trim = kwargs.get('trim')
-            rotate = kwargs.get('rotate')
-            codec = kwargs.get('codec')
-            preset = kwargs.get('preset', "medium")
             extract_audio = kwargs.get('extract_audio', False)
+            progress_callback = kwargs.get('progress_callback')
+            cpu_lease = kwargs.get('cpu_lease')
+            
+            # Durata attesa dell'output, serve solo per la percentuale di avanzamento
+            duration = None
+            if progress_callback:
+                duration = self._expected_duration(input_path, trim)
             
             # Formato di output
             output_format = os.path.splitext(output_path)[1][1:].lower()
             
-            # Base del comando FFmpeg
-            cmd = ['ffmpeg', '-y', '-i', input_path]
+            # Streaming adattivo: tutte le rendition da una sola decodifica
+            if streaming_format(output_path):
+                info = self.get_video_info(input_path)
+                ladder = build_ladder(info.get('height'), kwargs.get('ladder'))
+                return encode_ladder(input_path, output_path, ladder,
+                                     has_audio=bool(info.get('audio_codec')) and not kwargs.get('no_audio'),
+                                     audio_bitrate=kwargs.get('audio_bitrate') or '128k',
+                                     preset=kwargs.get('preset', 'veryfast'), trim=trim,
+                                     duration=duration, progress_callback=progress_callback,
+                                     threads=cpu_lease.threads if cpu_lease else None)
+            
+            # Fotogrammi: miniatura, sprite sheet o cartella di istantanee
+            if (output_format in frame_extractor.FRAME_IMAGE_FORMATS
+                    or frame_extractor.is_frames_output(output_path)):
+                return self.extract_frames(input_path, output_path, kwargs)
+            
+            # Percorso veloce: se i flussi vanno bene così come sono basta
+            # cambiare container, senza decodificare né ricodificare nulla
+            copy_args = self._stream_copy_args(input_path, output_format, kwargs)
+            if copy_args and trim and len(trim) == 2:
+                # Taglio: seek lato input e copia, ricodificando al più i GOP ai bordi
+                if trim_copy(input_path, output_path, trim[0], trim[1],
+                             mode=kwargs.get('trim_mode', 'accurate'),
+                             video='-vn' not in copy_args, audio='-an' not in copy_args,
+                             progress_callback=progress_callback,
+                             threads=cpu_lease.threads if cpu_lease else None):
+                    return True
+                print("Taglio senza ricodifica non riuscito, si ricodifica l'intervallo")
+            elif copy_args:
+                copy_cmd = ['ffmpeg', '-y', '-i', input_path] + copy_args + [output_path]
+                result = run_ffmpeg(copy_cmd, duration, progress_callback)
+                if result.returncode == 0:
+                    return True
+                print(f"Copia dei flussi non riuscita, si ricodifica: {result.stderr}")
             
             # Se stiamo estraendo solo l'audio
             if extract_audio:
+                cmd = ['ffmpeg', '-y'] + self._seek_args(trim) + ['-i', input_path]
                 cmd.extend(['-vn', '-acodec', 'copy' if output_format in ['m4a', 'aac'] else 'libmp3lame'])
                 if audio_bitrate:
                     cmd.extend(['-b:a', audio_bitrate])
                 cmd.append(output_path)
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                result = run_ffmpeg(cmd, duration, progress_callback,
+                                    threads=cpu_lease.threads if cpu_lease else None)
                 return result.returncode == 0
             
-            # Per conversioni GIF, utilizziamo filtri specifici di FFmpeg
-            if output_format == 'gif':
-                filter_complex = []
-                
-                # Scaliamo se richiesto
-                if resolution:
-                    filter_complex.append(f"scale={resolution.replace('x', ':')}")
-                else:
-                    filter_complex.append("scale=320:-1")  # Default scale per GIF
-                
-                # Impostiamo FPS per GIF (più basso è meglio per dimensioni file)
-                if fps:
-                    filter_complex.append(f"fps={fps}")
-                else:
-                    filter_complex.append("fps=10")  # Default FPS per GIF
-                
-                # Ottimizziamo palette per una migliore qualità
-                palette_path = output_path + ".palette.png"
-                palette_cmd = ['ffmpeg', '-y', '-i', input_path]
-                
-                # Aggiungiamo trim se richiesto
-                if trim and len(trim) == 2:
-                    palette_cmd.extend(['-ss', str(trim[0]), '-to', str(trim[1])])
-                
-                palette_filters = ','.join(filter_complex) + ",palettegen"
-                palette_cmd.extend(['-vf', palette_filters, palette_path])
-                
-                # Generiamo la palette
-                subprocess.run(palette_cmd, capture_output=True)
-                
-                # Ora creiamo il GIF con la palette
-                gif_cmd = ['ffmpeg', '-y', '-i', input_path]
-                
-                # Aggiungiamo trim se richiesto
-                if trim and len(trim) == 2:
-                    gif_cmd.extend(['-ss', str(trim[0]), '-to', str(trim[1])])
-                
-                gif_cmd.extend(['-i', palette_path, '-lavfi', 
-                               f"{','.join(filter_complex)}[x];[x][1:v]paletteuse", output_path])
-                
-                result = subprocess.run(gif_cmd, capture_output=True, text=True)
-                
-                # Puliamo la palette temporanea
-                if os.path.exists(palette_path):
-                    os.remove(palette_path)
-                
+            # GIF e WebP animati: un solo processo e una sola decodifica
+            if output_format in ANIMATED_FORMATS:
+                # Seek lato input: si decodifica solo l'intervallo richiesto
+                cmd = (['ffmpeg', '-y'] + self._seek_args(trim) + ['-i', input_path] +
+                       self._animation_args(output_format, kwargs,
+                                            self.get_video_info(input_path)) + [output_path])
+                result = run_ffmpeg(cmd, duration, progress_callback,
+                                    threads=cpu_lease.threads if cpu_lease else None)
+                if result.returncode != 0:
+                    print(f"FFmpeg error: {result.stderr}")
                 return result.returncode == 0
             
             # Per le altre conversioni usiamo FFmpeg standard
-            # Parametri di codifica video
-            if not no_audio and output_format not in ['mp3', 'ogg', 'wav', 'flac']:
-                # Aggiungi opzioni video
-                if resolution:
-                    cmd.extend(['-vf', f'scale={resolution.replace("x",":")}'])
-                
-                if rotate:
-                    # Converti gradi in impostazione di rotazione FFmpeg
-                    rotation_values = {
-                        90: 'transpose=1',
-                        180: 'transpose=1,transpose=1',
-                        270: 'transpose=2'
-                    }
-                    if rotate in rotation_values:
-                        vf_option = rotation_values[rotate]
-                        # Se abbiamo già impostato scale, aggiungiamo alla catena di filtri
-                        if resolution:
-                            cmd[-1] = cmd[-1] + ',' + vf_option
-                        else:
-                            cmd.extend(['-vf', vf_option])
-                
-                if fps:
-                    cmd.extend(['-r', str(fps)])
-                
-                if video_bitrate:
-                    cmd.extend(['-b:v', video_bitrate])
-                
-                if codec:
-                    cmd.extend(['-c:v', codec])
-                else:
-                    # Scegli codec di default basato sul formato
-                    if output_format == 'mp4':
-                        cmd.extend(['-c:v', 'libx264'])
-                    elif output_format == 'webm':
-                        cmd.extend(['-c:v', 'libvpx-vp9'])
-                
-                # Preset di qualità per h264, h265
-                if codec in ['libx264', 'libx265'] or output_format == 'mp4':
-                    cmd.extend(['-preset', preset])
-            elif output_format in ['mp3', 'ogg', 'wav', 'flac']:
-                # Solo estrazione audio
-                cmd.extend(['-vn'])
-            
-            # Parametri audio
-            if no_audio:
-                cmd.extend(['-an'])
-            else:
-                if audio_bitrate:
-                    cmd.extend(['-b:a', audio_bitrate])
-                
-                # Codec audio specifici per formato
-                if output_format == 'mp3':
-                    cmd.extend(['-c:a', 'libmp3lame'])
-                elif output_format == 'ogg':
-                    cmd.extend(['-c:a', 'libvorbis'])
+            video_args = self._video_args(output_format, kwargs)
+            audio_args = self._audio_args(output_format, kwargs)
+            
+            # Thread concessi dal budget CPU, letti al momento dell'avvio
+            threads = cpu_lease.threads if cpu_lease else None
             
-            # Trim video - applica il trim all'inizio della pipeline per efficienza
-            if trim and len(trim) == 2:
-                cmd = ['ffmpeg', '-y', '-ss', str(trim[0]), '-to', str(trim[1]), '-i', input_path] + cmd[2:]
+            # Input lunghi: segmenti codificati in parallelo su più core
+            if (kwargs.get('parallel_segments', True) and not trim
+                    and output_format in SEGMENTABLE_FORMATS):
+                info = self.get_video_info(input_path)
+                segments = segment_count(info.get('duration'), threads)
+                if segments > 1:
+                    if encode_segmented(input_path, output_path, video_args, audio_args,
+                                        segments, progress_callback, threads):
+                        return True
+                    print("Codifica a segmenti non riuscita, si usa un solo processo")
             
-            # Output file
-            cmd.append(output_path)
+            # Trim video: seek lato input, si decodifica solo l'intervallo richiesto
+            cmd = (['ffmpeg', '-y'] + self._seek_args(trim) + ['-i', input_path] +
+                   video_args + audio_args + [output_path])
             
             # Esegui FFmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            return result.returncode == 0
+            result = run_ffmpeg(cmd, duration, progress_callback, threads=threads)
+            if result.returncode != 0:
+                print(f"FFmpeg error: {result.stderr}")
+                return False
+            
+            return True
                 
         except Exception as e:
             print(f"Errore durante la conversione video: {e}")
             return False
     
-    def get_video_info(self, input_path):
+    def extract_frames(self, input_path, output_path, options):
+        """
+        Estrae fotogrammi dal video senza convertirlo
+        
+        Ogni istante viene raggiunto con un seek lato input e, se non serve il
+        fotogramma esatto, decodificando solo i keyframe; i seek indipendenti
+        girano in parallelo.
+        
+        Args:
+            input_path: percorso del file video
+            output_path: immagine (.jpg/.png) oppure frames.json di una cartella
+            options: opzioni di estrazione:
+                - frame_mode: 'thumbnail' (default) o 'sprite' per le immagini
+                - frame_time: istante della miniatura in secondi
+                - frame_times: istanti espliciti
+                - frame_count: numero di fotogrammi distribuiti sulla durata
+                - frame_interval: un fotogramma ogni N secondi
+                - frame_width: larghezza dei fotogrammi
+                - exact_frames: True per il fotogramma esatto invece del keyframe vicino
+                - sprite_columns: colonne dello sprite sheet
+                - trim: (inizio, fine) in secondi, limita l'intervallo
+                - cpu_lease: quota CPU, determina i seek contemporanei
+            
+        Returns:
+            bool: True se l'estrazione è riuscita
+        """
+        info = self.get_video_info(input_path)
+        duration = info.get('duration') or 0
+        
+        # Con il trim gli istanti sono relativi all'inizio dell'intervallo
+        offset = 0
+        trim = options.get('trim')
+        if trim and len(trim) == 2:
+            offset = trim[0]
+            duration = max(0, min(duration or trim[1], trim[1]) - trim[0])
+        
+        cpu_lease = options.get('cpu_lease')
+        workers = cpu_lease.threads if cpu_lease else None
+        exact = options.get('exact_frames', False)
+        width = options.get('frame_width')
+        progress_callback = options.get('progress_callback')
+        
+        def absolute(times):
+            return [round(offset + t, 3) for t in times]
+        
+        if frame_extractor.is_frames_output(output_path):
+            times = frame_extractor.frame_times(
+                duration, options.get('frame_count') or frame_extractor.SNAPSHOT_FRAMES,
+                options.get('frame_interval'), options.get('frame_times'))
+            done = frame_extractor.extract_snapshots(
+                input_path, output_path, absolute(times), width, exact,
+                options.get('frame_format', 'jpg'), workers)
+        elif options.get('frame_mode') == 'sprite':
+            # Import locale: converter_factory importa a sua volta questo modulo
+            from .converter_factory import ConverterFactory
+            image_converter = ConverterFactory.get_converter('image/png')
+            times = frame_extractor.frame_times(
+                duration, options.get('frame_count') or frame_extractor.SPRITE_FRAMES,
+                options.get('frame_interval'), options.get('frame_times'))
+            done = frame_extractor.extract_sprite(
+                input_path, output_path, absolute(times), image_converter,
+                width or frame_extractor.SPRITE_WIDTH, options.get('sprite_columns'),
+                exact, workers)
+        else:
+            # Miniatura: di default al 10% della durata, oltre le eventuali schermate nere iniziali
+            time = options.get('frame_time')
+            if time is None:
+                time = duration * 0.1
+            done = frame_extractor.extract_thumbnail(
+                input_path, output_path, round(offset + time, 3), width, exact)
+        
+        if done and progress_callback:
+            progress_callback(100.0, None)
+        return done
+    
+    def _video_args(self, output_format, options):
+        """Argomenti ffmpeg per la traccia video: filtri, fps, bitrate, codec e preset"""
+        if output_format in AUDIO_ONLY_FORMATS:
+            # Solo estrazione audio
+            return ['-vn']
+        
+        args = []
+        filters = []
+        
+        resolution = options.get('resolution', self.resolution)
+        if resolution:
+            filters.append(f'scale={resolution.replace("x", ":")}')
+        
+        # Converti gradi in impostazione di rotazione FFmpeg
+        rotation_values = {
+            90: 'transpose=1',
+            180: 'transpose=1,transpose=1',
+            270: 'transpose=2'
+        }
+        if options.get('rotate') in rotation_values:
+            filters.append(rotation_values[options['rotate']])
+        
+        if filters:
+            args.extend(['-vf', ','.join(filters)])
+        
+        if options.get('fps'):
+            args.extend(['-r', str(options['fps'])])
+        
+        video_bitrate = options.get('video_bitrate', self.video_bitrate)
+        if video_bitrate:
+            args.extend(['-b:v', video_bitrate])
+        
+        codec = options.get('codec')
+        if codec:
+            args.extend(['-c:v', codec])
+        else:
+            # Scegli codec di default basato sul formato
+            if output_format == 'mp4':
+                args.extend(['-c:v', 'libx264'])
+            elif output_format == 'webm':
+                args.extend(['-c:v', 'libvpx-vp9'])
+        
+        # Preset di qualità per h264, h265
+        if codec in ['libx264', 'libx265'] or output_format == 'mp4':
+            args.extend(['-preset', options.get('preset', "medium")])
+        
+        return args
+    
+    @staticmethod
+    def _seek_args(trim):
+        """Opzioni di seek lato input per il trim (start, end) in secondi"""
+        if trim and len(trim) == 2:
+            return ['-ss', str(trim[0]), '-to', str(trim[1])]
+        return []
+    
+    def _animation_args(self, output_format, options, info=None):
+        """
+        Argomenti ffmpeg per GIF e WebP animati
+        
+        Per il GIF il flusso decodificato viene diviso con split: un ramo
+        genera la palette, l'altro la applica, senza file intermedi né una
+        seconda decodifica dell'input.
+        """
+        info = info or {}
+        
+        # FPS prima della scala, così si ridimensionano solo i frame tenuti
+        # (meno FPS = file più piccolo); mai più della sorgente
+        fps = options.get('fps') or 10
+        if info.get('fps'):
+            fps = min(fps, info['fps'])
+        filters = [f"fps={fps}"]
+        resolution = options.get('resolution', self.resolution)
+        if resolution:
+            filters.append(f"scale={resolution.replace('x', ':')}:flags=lanczos")
+        elif not info.get('width') or info['width'] > 320:
+            # Default scale per animazioni, senza ingrandire sorgenti già piccole
+            filters.append("scale=320:-1:flags=lanczos")
+        
+        if output_format == 'gif':
+            graph = f"[0:v]{','.join(filters)},split[frames][source];" \
+                    "[source]palettegen[palette];[frames][palette]paletteuse"
+            return ['-filter_complex', graph, '-an']
+        
+        # WebP animato: in genere molto più leggero di un GIF a parità di clip
+        return ['-vf', ','.join(filters), '-c:v', 'libwebp_anim', '-lossless', '0',
+                '-q:v', '75', '-loop', '0', '-an']
+    
+    def _audio_args(self, output_format, options):
+        """Argomenti ffmpeg per la traccia audio"""
+        if options.get('no_audio'):
+            return ['-an']
+        
+        args = []
+        audio_bitrate = options.get('audio_bitrate', self.audio_bitrate)
+        if audio_bitrate:
+            args.extend(['-b:a', audio_bitrate])
+        
+        # Codec audio specifici per formato
+        if output_format == 'mp3':
+            args.extend(['-c:a', 'libmp3lame'])
+        elif output_format == 'ogg':
+            args.extend(['-c:a', 'libvorbis'])
+        
+        return args
+    
+    def _stream_copy_args(self, input_path, output_format, options):
+        """
+        Verifica se la conversione può essere un semplice remux
+        
+        Args:
+            input_path: percorso del file video
+            output_format: formato di destinazione
+            options: opzioni di conversione richieste
+            
+        Returns:
+            list: argomenti ffmpeg per la copia dei flussi, None se serve ricodificare
+        """
+        if options.get('force_reencode') or output_format in ANIMATED_FORMATS:
+            return None
+        if any(options.get(name) for name in REENCODE_OPTIONS):
+            return None
+        
+        info = self.get_video_info(input_path)
+        if not info:
+            return None
+        audio_codec = info.get('audio_codec')
+        
+        # Solo audio: si copia la traccia se il container di destinazione la accetta
+        if options.get('extract_audio') or output_format in AUDIO_ONLY_FORMATS:
+            if audio_codec and accepts_codec(output_format, 'audio', audio_codec):
+                return ['-vn', '-c:a', 'copy']
+            return None
+        
+        if not accepts_codec(output_format, 'video', info.get('video_codec')):
+            return None
+        
+        args = ['-c:v', 'copy']
+        if options.get('no_audio'):
+            args.append('-an')
+        elif audio_codec:
+            if not accepts_codec(output_format, 'audio', audio_codec):
+                return None
+            args.extend(['-c:a', 'copy'])
+        return args
+    
+    def _expected_duration(self, input_path, trim=None):
+        """Durata in secondi dell'output, tenendo conto dell'eventuale trim"""
+        if trim and len(trim) == 2:
+            return trim[1] - trim[0]
+        return self.get_video_info(input_path).get('duration') or None
+    
+    def estimate_cost(self, input_path, info=None):
+        """Stima il costo come durata x risoluzione, normalizzato su 1080p in tempo reale"""
+        if not info or not info.get('duration'):
+            info = self.get_video_info(input_path)
+        if not info.get('duration'):
+            return super().estimate_cost(input_path)
+        
+        pixels = (info.get('width') or 1920) * (info.get('height') or 1080)
+        return info['duration'] * pixels / (1920 * 1080)
+    
+    def get_video_info(self, input_path, content_hash=None):
         """
         Ottiene informazioni su un file video
         
         Args:
             input_path: percorso del file video
+            content_hash: SHA-256 del contenuto, se già noto (per la cache)
             
         Returns:
             dict: dizionario con le informazioni sul video
         """
-        try:
-            # Usa ffprobe per ottenere informazioni dettagliate
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', input_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                import json
-                data = json.loads(result.stdout)
-                
-                # Trova gli stream video e audio
-                video_stream = None
-                audio_stream = None
-                
-                for stream in data.get('streams', []):
-                    if stream['codec_type'] == 'video' and not video_stream:
-                        video_stream = stream
-                    elif stream['codec_type'] == 'audio' and not audio_stream:
-                        audio_stream = stream
-                
-                if not video_stream:
-                    raise ValueError("No video stream found")
-                
-                # Estrai informazioni rilevanti
-                info = {
-                    'format': data.get('format', {}).get('format_name', ''),
-                    'duration': float(data.get('format', {}).get('duration', 0)),
-                    'size': int(data.get('format', {}).get('size', 0)),
-                    'bitrate': int(data.get('format', {}).get('bit_rate', 0)),
-                    'width': int(video_stream.get('width', 0)),
-                    'height': int(video_stream.get('height', 0)),
-                    'fps': eval(video_stream.get('r_frame_rate', '0/1')),
-                    'video_codec': video_stream.get('codec_name', ''),
-                }
-                
-                # Aggiungi info audio se presente
-                if audio_stream:
-                    info.update({
-                        'audio_codec': audio_stream.get('codec_name', ''),
-                        'audio_channels': int(audio_stream.get('channels', 0)),
-                        'audio_sample_rate': int(audio_stream.get('sample_rate', 0)),
-                    })
-                
-                return info
-            else:
-                print(f"ffprobe error: {result.stderr}")
-                return {}
-            
-        except Exception as e:
-            print(f"Errore nel recupero delle informazioni video: {e}")
-            return {}
\ No newline at end of file
+        # Un solo ffprobe per file: i risultati sono in cache
+        media = media_probe.probe(input_path, content_hash)
+        if not media:
+            return {}
+        
+        video_stream = media['video']
+        if not video_stream:
+            print("Errore nel recupero delle informazioni video: No video stream found")
+            return {}
+        
+        # Estrai informazioni rilevanti
+        info = {
+            'format': media['format'],
+            'duration': media['duration'],
+            'size': media['size'],
+            'bitrate': media['bitrate'],
+            'width': video_stream['width'],
+            'height': video_stream['height'],
+            'fps': video_stream['fps'],
+            'video_codec': video_stream['codec'],
+            'pix_fmt': video_stream['pix_fmt'],
+        }
+        
+        # Aggiungi info audio se presente
+        if media['audio']:
+            info.update({
+                'audio_codec': media['audio']['codec'],
+                'audio_channels': media['audio']['channels'],
+                'audio_sample_rate': media['audio']['sample_rate'],
+            })
+        
+        return info
@@ -67,10 +67,12 @@ document.addEventListener('DOMContentLoaded', function () {
     const volumeSlider = document.getElementById('volume-slider');
     const volumeValue = document.getElementById('volume-value');
     const normalizeSwitch = document.getElementById('normalize-switch');
+    const audioForceReencodeSwitch = document.getElementById('audio-force-reencode-switch');
     const audioTrimSwitch = document.getElementById('audio-trim-switch');
     const audioTrimOptions = document.getElementById('audio-trim-options');
     const audioTrimStart = document.getElementById('audio-trim-start');
     const audioTrimEnd = document.getElementById('audio-trim-end');
+    const audioTrimMode = document.getElementById('audio-trim-mode');
 
     // Video option controls
     const videoBitrateSelect = document.getElementById('video-bitrate');
@@ -92,10 +94,12 @@ document.addEventListener('DOMContentLoaded', function () {
     const presetSelect = document.getElementById('preset-select');
     const noAudioSwitch = document.getElementById('no-audio-switch');
     const extractAudioSwitch = document.getElementById('extract-audio-switch');
+    const videoForceReencodeSwitch = document.getElementById('video-force-reencode-switch');
     const videoTrimSwitch = document.getElementById('video-trim-switch');
     const videoTrimOptions = document.getElementById('video-trim-options');
     const videoTrimStart = document.getElementById('video-trim-start');
     const videoTrimEnd = document.getElementById('video-trim-end');
+    const videoTrimMode = document.getElementById('video-trim-mode');
 
     // Document option controls
     const preserveMetadataSwitch = document.getElementById('preserve-metadata-switch');
@@ -357,10 +361,12 @@ document.addEventListener('DOMContentLoaded', function () {
                 value: parseFloat(volumeValue.value)
             },
             normalize: normalizeSwitch.checked,
+            force_reencode: audioForceReencodeSwitch.checked,
             trim: {
                 enabled: audioTrimSwitch.checked,
                 start: parseInt(audioTrimStart.value),
-                end: parseInt(audioTrimEnd.value)
+                end: parseInt(audioTrimEnd.value),
+                mode: audioTrimMode.value
             }
         };
     }
@@ -397,12 +403,23 @@ document.addEventListener('DOMContentLoaded', function () {
                 value: codecSelect.value
             },
             preset: presetSelect.value,
+            ladder: Array.from(document.querySelectorAll('input[name="ladder-height"]:checked')).map(el => parseInt(el.value)),
             no_audio: noAudioSwitch.checked,
             extract_audio: extractAudioSwitch.checked,
+            force_reencode: videoForceReencodeSwitch.checked,
             trim: {
                 enabled: videoTrimSwitch.checked,
                 start: parseFloat(videoTrimStart.value),
-                end: parseFloat(videoTrimEnd.value)
+                end: parseFloat(videoTrimEnd.value),
+                mode: videoTrimMode.value
+            },
+            frames: {
+                mode: document.getElementById('frame-mode-select').value,
+                time: document.getElementById('frame-time').value,
+                count: document.getElementById('frame-count').value,
+                interval: document.getElementById('frame-interval').value,
+                width: document.getElementById('frame-width').value,
+                exact: document.getElementById('frame-exact-switch').checked
             }
         };
     }
@@ -459,6 +476,10 @@ document.addEventListener('DOMContentLoaded', function () {
                 filter: {
                     enabled: filterSwitch.checked,
                     type: document.getElementById('filter-type').value
+                },
+                variants: {
+                    widths: document.getElementById('variant-widths').value,
+                    formats: Array.from(document.querySelectorAll('input[name="variant-format"]:checked')).map(el => el.value)
                 }
             };
         } else if (fileType === 'audio') {
@@ -565,6 +586,9 @@ document.addEventListener('DOMContentLoaded', function () {
             'wmv': 'fas fa-file-video',
             'mkv': 'fas fa-file-video',
             'webm': 'fas fa-file-video',
+            'm3u8': 'fas fa-stream',
+            'mpd': 'fas fa-stream',
+            'json': 'fas fa-images',
 
             // Documenti
             'pdf': 'fas fa-file-pdf',
@@ -620,11 +644,15 @@ document.addEventListener('DOMContentLoaded', function () {
         selectedFilesContainer.classList.add('d-none');
         progressContainer.classList.remove('d-none');
 
-        // Create FormData
+        // Elenco dei file con lo stato di avanzamento di ciascuno
+        const fileProgressList = document.querySelector('.file-progress-list');
+        if (fileProgressList && window.addFileToProgressList) {
+            fileProgressList.innerHTML = '';
+            selectedFiles.forEach(file => window.addFileToProgressList(file));
+        }
+
+        // Create FormData (i file viaggiano a blocchi, qui solo formato e opzioni)
         const formData = new FormData();
-        selectedFiles.forEach(file => {
-            formData.append('files[]', file);
-        });
 
         // Add target format
         formData.append('target_format', targetFormatSelect.value);
@@ -636,10 +664,13 @@ document.addEventListener('DOMContentLoaded', function () {
         }
 
         try {
-            progressBar.style.width = '50%';
-            progressText.textContent = 'Uploading and converting files...';
+            progressBar.style.width = '0%';
+            progressText.textContent = 'Uploading files...';
 
-            const response = await fetch('/upload', {
+            const uploadIds = await uploadFilesChunked(selectedFiles);
+            formData.append('upload_ids', JSON.stringify(uploadIds));
+
+            const response = await fetch('/upload/chunked/finalize', {
                 method: 'POST',
                 body: formData
             });
@@ -648,12 +679,17 @@ document.addEventListener('DOMContentLoaded', function () {
                 throw new Error('Server error');
             }
 
+            selectedFiles.forEach(file => localStorage.removeItem(resumeKey(file)));
+
+            const job = await response.json();
+            currentSessionId = job.session_id;
+
+            // La conversione prosegue in background: segui l'avanzamento del job
+            const data = await waitForJob(job);
+
             progressBar.style.width = '100%';
             progressText.textContent = 'Conversion complete!';
 
-            const data = await response.json();
-            currentSessionId = data.session_id;
-
             // After a short delay, show results
             setTimeout(() => {
                 displayResults(data);
@@ -666,6 +702,179 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    // Upload a blocchi: ogni file viene inviato in pezzi da UPLOAD_CHUNK_SIZE,
+    // più blocchi in parallelo, riprendendo da dove si era interrotto
+    const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+    const PARALLEL_CHUNKS = 4;
+    const CHUNK_RETRIES = 5;
+
+    function resumeKey(file) {
+        return `chunked_upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    // Riprende un upload interrotto dello stesso file, o ne inizia uno nuovo
+    async function openUpload(file) {
+        const savedId = localStorage.getItem(resumeKey(file));
+        if (savedId) {
+            const response = await fetch(`/upload/chunked/${savedId}`);
+            if (response.ok) {
+                return await response.json();
+            }
+            localStorage.removeItem(resumeKey(file));
+        }
+
+        const response = await fetch('/upload/chunked', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.error || 'Unable to start upload');
+        }
+
+        const upload = await response.json();
+        localStorage.setItem(resumeKey(file), upload.upload_id);
+        return { upload_id: upload.upload_id, received: [], received_bytes: 0 };
+    }
+
+    // Blocchi non ancora coperti dagli intervalli già ricevuti dal server
+    function missingChunks(file, received) {
+        const chunks = [];
+        for (let offset = 0; offset < file.size; offset += UPLOAD_CHUNK_SIZE) {
+            const end = Math.min(offset + UPLOAD_CHUNK_SIZE, file.size);
+            const covered = received.some(([start, stop]) => start <= offset && stop >= end);
+            if (!covered) {
+                chunks.push({ offset, end });
+            }
+        }
+        return chunks;
+    }
+
+    async function sendChunk(file, uploadId, chunk) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(`/upload/chunked/${uploadId}?offset=${chunk.offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(chunk.offset, chunk.end)
+                });
+                if (response.ok) {
+                    return;
+                }
+                if (response.status < 500) {
+                    throw new Error('Upload rejected');
+                }
+            } catch (error) {
+                if (attempt >= CHUNK_RETRIES || error.message === 'Upload rejected') {
+                    throw error;
+                }
+            }
+            // Backoff prima di ritentare lo stesso blocco
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+
+    async function uploadFilesChunked(files) {
+        const totalBytes = files.reduce((sum, file) => sum + file.size, 0) || 1;
+        let sentBytes = 0;
+        const queue = [];
+        const uploadIds = [];
+
+        for (const file of files) {
+            const upload = await openUpload(file);
+            uploadIds.push(upload.upload_id);
+            sentBytes += upload.received_bytes;
+            missingChunks(file, upload.received).forEach(chunk => {
+                queue.push({ file, uploadId: upload.upload_id, chunk });
+            });
+        }
+
+        const updateUploadProgress = () => {
+            const percent = Math.round((sentBytes / totalBytes) * 30);
+            progressBar.style.width = `${percent}%`;
+            progressText.textContent = `Uploading files... ${Math.round((sentBytes / totalBytes) * 100)}%`;
+        };
+        updateUploadProgress();
+
+        // PARALLEL_CHUNKS worker che si spartiscono la coda dei blocchi
+        const workers = Array.from({ length: PARALLEL_CHUNKS }, async () => {
+            while (queue.length > 0) {
+                const { file, uploadId, chunk } = queue.shift();
+                await sendChunk(file, uploadId, chunk);
+                sentBytes += chunk.end - chunk.offset;
+                updateUploadProgress();
+            }
+        });
+        await Promise.all(workers);
+
+        return uploadIds;
+    }
+
+    // Segue il job via Server-Sent Events, con polling come ripiego
+    function waitForJob(job) {
+        if (!window.EventSource) {
+            return pollJob(job.status_url);
+        }
+
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(job.events_url);
+
+            source.addEventListener('job', (event) => {
+                const data = JSON.parse(event.data);
+                updateJobProgress(data);
+
+                if (data.status === 'completed') {
+                    source.close();
+                    resolve(data);
+                }
+            });
+
+            source.onerror = () => {
+                source.close();
+                pollJob(job.status_url).then(resolve, reject);
+            };
+        });
+    }
+
+    // Interroga periodicamente lo stato di un job finché non è completato
+    async function pollJob(statusUrl) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            if (!response.ok) {
+                throw new Error('Unable to read job status');
+            }
+
+            const job = await response.json();
+            updateJobProgress(job);
+
+            if (job.status === 'completed') {
+                return job;
+            }
+
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
+    function updateJobProgress(job) {
+        const done = job.completed + job.failed;
+        const percent = Math.round(30 + job.progress * 0.7);
+
+        progressBar.style.width = `${percent}%`;
+        progressText.textContent = `Converting files... (${done}/${job.total})`;
+
+        if (window.updateFlowVisualization) {
+            window.updateFlowVisualization(job.progress);
+        }
+
+        if (window.updateFileProgressStatus) {
+            const statusMap = { queued: 'pending', processing: 'processing', completed: 'completed', failed: 'failed' };
+            job.files.forEach(file => {
+                window.updateFileProgressStatus(file.source_filename, statusMap[file.status], file.progress);
+            });
+        }
+    }
+
     // UPDATED: New Results Implementation
     function displayResults(data) {
         progressContainer.classList.add('d-none');
@@ -777,10 +986,16 @@ document.addEventListener('DOMContentLoaded', function () {
 
         window.location.href = `/download_all/${currentSessionId}`;
 
-        // Clear session data after download
-        setTimeout(() => {
-            fetch(`/clear/${currentSessionId}`);
-        }, 3000);
+        // Clear session data after download (lo zip è in streaming: riprova finché l'invio è in corso)
+        const sessionId = currentSessionId;
+        const clearWhenDone = (attempt) => {
+            fetch(`/clear/${sessionId}`).then(response => {
+                if (response.status === 409 && attempt < 100) {
+                    setTimeout(() => clearWhenDone(attempt + 1), 3000);
+                }
+            });
+        };
+        setTimeout(() => clearWhenDone(0), 3000);
     }
 
     function resetApp() {
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# I moduli dell'app si importano dalla radice del repository (converters/, utils/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
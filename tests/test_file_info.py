@@ -0,0 +1,35 @@
+import importlib
+import io
+
+import pytest
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # L'app crea uploads/ e converted/ nella cartella corrente
+    monkeypatch.chdir(tmp_path)
+    app_module = importlib.import_module('app')
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', MB)
+    monkeypatch.setitem(app_module.app.config, 'PROBE_MAX_CONTENT_LENGTH', 8 * MB)
+    return app_module.app.test_client()
+
+
+def post(client, url, size):
+    data = {'file': (io.BytesIO(b'\0' * size), 'large.bin')}
+    return client.post(url, data=data, content_type='multipart/form-data')
+
+
+def test_file_info_accepts_files_over_the_upload_limit(client):
+    response = post(client, '/api/file-info', 3 * MB)
+    assert response.status_code == 200
+    assert response.get_json()['mime_type']
+
+
+def test_probe_limit_still_applies(client):
+    assert post(client, '/api/file-info', 9 * MB).status_code == 413
+
+
+def test_other_routes_keep_the_upload_limit(client):
+    assert post(client, '/upload', 3 * MB).status_code == 413
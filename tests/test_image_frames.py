@@ -0,0 +1,82 @@
+import pytest
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from converters import image_frames
+from converters.image_converter import ImageConverter
+from converters.image_frames import save_frames
+
+
+def animation(path, count=4, size=(40, 30)):
+    frames = [Image.new('RGB', size, (index * 50, 100, 255 - index * 50)) for index in range(count)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=[80, 90, 100, 110][:count],
+                   loop=0)
+    return path
+
+
+def frame_count(path):
+    if path.endswith('.pdf'):
+        return len(PdfReader(path).pages)
+    with Image.open(path) as result:
+        return getattr(result, 'n_frames', 1)
+
+
+def lazy_frames(count, durations, size=(40, 30)):
+    """Fotogrammi generati su richiesta che riempiono durations man mano, come _convert_frames"""
+    for index in range(count):
+        durations.append(60 + index * 10)
+        yield Image.new('RGBA', size, (index * 50, 100, 255 - index * 50, 255))
+
+
+@pytest.mark.parametrize('source, target', [('gif', 'webp'), ('png', 'gif'), ('tif', 'pdf'),
+                                            ('webp', 'tif')])
+def test_static_sources_stay_on_the_normal_path(tmp_path, source, target):
+    path = str(tmp_path / f'still.{source}')
+    Image.new('RGB', (40, 30), 'red').save(path)
+    converter = ImageConverter()
+    assert converter.is_cpu_bound(source, target, path)
+    assert not converter.uses_thread_budget(target, path)
+
+
+@pytest.mark.parametrize('target', ['gif', 'webp', 'tif', 'pdf'])
+def test_animated_sources_use_the_thread_budget(tmp_path, target):
+    path = animation(str(tmp_path / 'anim.gif'))
+    converter = ImageConverter()
+    assert not converter.is_cpu_bound('gif', target, path)
+    assert converter.uses_thread_budget(target, path)
+
+
+def test_single_frame_formats_never_take_a_shared_lease(tmp_path):
+    path = str(tmp_path / 'photo.jpg')
+    Image.new('RGB', (40, 30), 'red').save(path)
+    for target in ['pdf', 'tiff', 'webp', 'gif']:
+        assert not ImageConverter().uses_thread_budget(target, path)
+
+
+@pytest.mark.parametrize('target', ['gif', 'webp', 'tif', 'pdf'])
+def test_save_frames_consumes_an_iterator(tmp_path, target):
+    output = str(tmp_path / f'out.{target}')
+    durations = []
+    assert save_frames(lazy_frames(5, durations), output, durations, loop=0)
+    assert frame_count(output) == 5
+    if target in ('gif', 'webp'):
+        with Image.open(output) as result:
+            result.seek(3)
+            result.load()
+            assert result.info['duration'] == 90
+
+
+def test_buffered_formats_refuse_oversized_animations(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_frames, 'MAX_BUFFERED_BYTES', 40 * 30 * 4 * 3)
+    with pytest.raises(ValueError):
+        save_frames(lazy_frames(5, []), str(tmp_path / 'out.webp'))
+    # Il TIFF si scrive una pagina alla volta: nessun limite
+    assert save_frames(lazy_frames(5, []), str(tmp_path / 'out.tif'))
+
+
+def test_convert_keeps_every_frame(tmp_path):
+    source = animation(str(tmp_path / 'anim.gif'))
+    for target in ['gif', 'webp', 'tif', 'pdf']:
+        output = str(tmp_path / f'out.{target}')
+        assert ImageConverter().convert(source, output, flip='horizontal')
+        assert frame_count(output) == 4
@@ -0,0 +1,141 @@
+import itertools
+import math
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps, ImageStat
+
+from converters.image_transforms import apply_transforms, plan_transforms
+
+FILTERS = {
+    'blur': ImageFilter.BLUR,
+    'sharpen': ImageFilter.SHARPEN,
+    'contour': ImageFilter.CONTOUR,
+    'detail': ImageFilter.DETAIL,
+    'edge_enhance': ImageFilter.EDGE_ENHANCE,
+    'emboss': ImageFilter.EMBOSS,
+}
+
+
+def sample_image(mode, size=(200, 150)):
+    """Immagine deterministica con sfumature e bordi netti"""
+    red = Image.linear_gradient('L').resize(size)
+    green = Image.radial_gradient('L').resize(size)
+    blue = Image.linear_gradient('L').rotate(90).resize(size)
+    img = Image.merge('RGB', (red, green, blue))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((20, 20, 80, 60), fill=(250, 30, 30))
+    draw.ellipse((110, 40, 180, 130), fill=(20, 200, 60))
+    draw.line((0, 149, 199, 0), fill=(255, 255, 255), width=3)
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').rotate(45).resize(size))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.ADAPTIVE)
+    elif mode != 'RGB':
+        img = img.convert(mode)
+    return img
+
+
+def sequential(img, target_size, rotate, flip, filter_name):
+    """La catena originale di ImageConverter: resize -> rotate(expand) -> flip -> filtro"""
+    if tuple(target_size) != img.size:
+        img = img.resize(target_size, Image.LANCZOS, reducing_gap=3.0)
+    if rotate is not None:
+        img = img.rotate(rotate, expand=True)
+    if flip == 'horizontal':
+        img = ImageOps.mirror(img)
+    elif flip == 'vertical':
+        img = ImageOps.flip(img)
+    if filter_name == 'grayscale':
+        img = ImageOps.grayscale(img)
+    elif filter_name:
+        img = img.filter(FILTERS[filter_name])
+    return img
+
+
+def planned(img, target_size, rotate, flip, filter_name):
+    steps = plan_transforms(img.size, target_size, rotate, flip, filter_name)
+    return apply_transforms(img, steps, reducing_gap=3.0)
+
+
+def assert_identical(result, expected):
+    assert result.mode == expected.mode
+    assert result.size == expected.size
+    if result.mode == 'P':
+        result, expected = result.convert('RGBA'), expected.convert('RGBA')
+    assert ImageChops.difference(result, expected).getbbox() is None
+
+
+def psnr(a, b):
+    mse = sum(value ** 2 for value in ImageStat.Stat(ImageChops.difference(a, b)).rms) / len(a.getbands())
+    return float('inf') if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'L', 'P'])
+@pytest.mark.parametrize('target_size', [(200, 150), (90, 70), (320, 240)])
+@pytest.mark.parametrize('rotate', [None, 0, 90, 180, 270, -90, 450])
+def test_quarter_turns_are_pixel_identical(mode, target_size, rotate):
+    img = sample_image(mode)
+    for flip, filter_name in itertools.product([None, 'horizontal', 'vertical'],
+                                               [None, 'grayscale', 'blur', 'emboss']):
+        if mode == 'P' and filter_name not in (None, 'grayscale'):
+            continue  # i filtri di convoluzione non accettano immagini a palette
+        assert_identical(planned(img, target_size, rotate, flip, filter_name),
+                         sequential(img, target_size, rotate, flip, filter_name))
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'L', 'P'])
+@pytest.mark.parametrize('rotate', [30, -45, 123.5])
+@pytest.mark.parametrize('flip', [None, 'horizontal', 'vertical'])
+@pytest.mark.parametrize('filter_name', [None, 'grayscale', 'sharpen'])
+def test_arbitrary_rotation_without_resize_is_pixel_identical(mode, rotate, flip, filter_name):
+    if mode == 'P' and filter_name == 'sharpen':
+        pytest.skip("i filtri di convoluzione non accettano immagini a palette")
+    img = sample_image(mode)
+    assert_identical(planned(img, img.size, rotate, flip, filter_name),
+                     sequential(img, img.size, rotate, flip, filter_name))
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+@pytest.mark.parametrize('target_size', [(90, 70), (40, 30), (320, 240)])
+@pytest.mark.parametrize('rotate', [30, -45])
+@pytest.mark.parametrize('flip', [None, 'horizontal', 'vertical'])
+def test_fused_resize_and_rotation(mode, target_size, rotate, flip):
+    """
+    Ridimensionamento e rotazione arbitraria in un solo ricampionamento
+    BICUBIC: non è identico alla catena originale (LANCZOS + rotazione
+    NEAREST), ma ha la stessa dimensione ed è più vicino di questa a
+    resize LANCZOS + rotazione BICUBIC
+    """
+    img = sample_image(mode)
+    result = planned(img, target_size, rotate, flip, None)
+    assert result.size == sequential(img, target_size, rotate, flip, None).size
+
+    reference = img.resize(target_size, Image.LANCZOS).rotate(rotate, Image.BICUBIC, expand=True)
+    if flip == 'horizontal':
+        reference = ImageOps.mirror(reference)
+    elif flip == 'vertical':
+        reference = ImageOps.flip(reference)
+    assert psnr(result, reference) > 36
+    assert psnr(result, reference) >= psnr(sequential(img, target_size, rotate, flip, None), reference)
+
+
+def test_plan_collapses_quarter_turns_and_flips():
+    steps = plan_transforms((200, 150), None, 90, 'horizontal', None)
+    assert steps == [('transpose', Image.Transpose.TRANSVERSE)]
+    assert plan_transforms((200, 150), None, 180, 'vertical', None) == \
+        [('transpose', Image.Transpose.FLIP_LEFT_RIGHT)]
+    assert plan_transforms((200, 150), None, 360, None, None) == []
+
+
+def test_plan_runs_resize_first_and_grayscale_before_transpose():
+    steps = plan_transforms((200, 150), (100, 75), 270, None, 'grayscale')
+    assert [step[0] for step in steps] == ['resize', 'filter', 'transpose']
+    steps = plan_transforms((200, 150), (100, 75), 90, None, 'blur')
+    assert [step[0] for step in steps] == ['resize', 'transpose', 'filter']
+
+
+def test_plan_fuses_arbitrary_rotation_only_with_resize():
+    assert plan_transforms((200, 150), (100, 75), 30, 'vertical', None) == \
+        [('affine', (100, 75), 30, 'vertical')]
+    assert plan_transforms((200, 150), None, 30, 'vertical', None) == \
+        [('rotate', 30), ('transpose', Image.Transpose.FLIP_TOP_BOTTOM)]
@@ -0,0 +1,30 @@
+import json
+
+from PIL import Image
+
+from converters.image_variants import write_variants
+
+
+def test_failing_encoder_skips_only_its_variants(tmp_path):
+    def save(img, path, quality):
+        if path.endswith('.webp'):
+            raise OSError("encoder non disponibile")
+        img.save(path, quality=quality)
+        return True
+
+    index = str(tmp_path / 'set' / 'manifest.json')
+    img = Image.linear_gradient('L').convert('RGB').resize((800, 600))
+    assert write_variants(img, index, [200, 400], ['jpg', 'webp'], save, workers=2)
+    with open(index, encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert [variant['file'] for variant in manifest['variants']] == ['image-200w.jpg', 'image-400w.jpg']
+    assert list(manifest['srcset']) == ['jpg']
+
+
+def test_no_variant_written_returns_false(tmp_path):
+    def save(img, path, quality):
+        raise OSError("disco pieno")
+
+    index = str(tmp_path / 'set' / 'manifest.json')
+    assert not write_variants(Image.new('RGB', (300, 200)), index, [100], ['jpg'], save)
+    assert not (tmp_path / 'set' / 'manifest.json').exists()
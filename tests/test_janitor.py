@@ -0,0 +1,70 @@
+import io
+import os
+import time
+
+from utils.chunked_upload import ChunkedUploadManager
+from utils.janitor import Janitor
+
+MB = 1024 * 1024
+
+
+def make_session(converted_dir, session_id, size, age=0):
+    path = os.path.join(converted_dir, session_id)
+    os.makedirs(path)
+    with open(os.path.join(path, 'output.bin'), 'wb') as f:
+        f.write(os.urandom(size))
+    past = time.time() - age
+    os.utime(os.path.join(path, 'output.bin'), (past, past))
+    os.utime(path, (past, past))
+    return path
+
+
+def setup(tmp_path, **options):
+    converted_dir = str(tmp_path / 'converted')
+    upload_dir = str(tmp_path / 'uploads')
+    os.makedirs(converted_dir)
+    uploads = ChunkedUploadManager(os.path.join(upload_dir, '_chunked'), 100 * MB)
+    janitor = Janitor(converted_dir, upload_dir, max_age=3600, max_bytes=MB, **options)
+    return converted_dir, uploads, janitor
+
+
+def test_live_chunked_upload_survives_quota_eviction(tmp_path):
+    converted_dir, uploads, janitor = setup(tmp_path)
+    old_session = make_session(converted_dir, 'old', MB // 2, age=60)
+    upload_id = uploads.create('video.mp4', 4 * MB)
+    uploads.write_chunk(upload_id, 0, io.BytesIO(os.urandom(2 * MB)), 2 * MB)
+
+    report = janitor.run_once()
+
+    # Oltre la quota per colpa dell'upload: si libera il resto, l'upload resta
+    assert old_session in report['removed_items']
+    assert uploads.status(upload_id)['received_bytes'] == 2 * MB
+    status = uploads.write_chunk(upload_id, 2 * MB, io.BytesIO(os.urandom(2 * MB)), 2 * MB)
+    assert status['complete']
+
+
+def test_idle_chunked_upload_is_evicted_after_the_grace_period(tmp_path):
+    converted_dir, uploads, janitor = setup(tmp_path, upload_grace=600)
+    upload_id = uploads.create('video.mp4', 4 * MB)
+    uploads.write_chunk(upload_id, 0, io.BytesIO(os.urandom(2 * MB)), 2 * MB)
+    upload_path = os.path.join(uploads.root_dir, upload_id)
+    past = time.time() - 900
+    for name in os.listdir(upload_path):
+        os.utime(os.path.join(upload_path, name), (past, past))
+    os.utime(upload_path, (past, past))
+
+    report = janitor.run_once()
+
+    assert upload_path in report['removed_items']
+    assert not os.path.exists(upload_path)
+
+
+def test_active_session_is_kept(tmp_path):
+    converted_dir, uploads, janitor = setup(tmp_path, is_active=lambda session_id: session_id == 'busy')
+    busy = make_session(converted_dir, 'busy', 2 * MB, age=7200)
+    idle = make_session(converted_dir, 'idle', 2 * MB, age=7200)
+
+    report = janitor.run_once()
+
+    assert report['removed_items'] == [idle]
+    assert os.path.isdir(busy)
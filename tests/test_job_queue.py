@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+from utils.job_queue import JobQueue
+
+
+def make_queue():
+    def worker(task, progress_callback):
+        return {'filename': task['filename'], 'success': True}
+
+    return JobQueue(worker, lambda task: ('image', 0.0), {'image': 2})
+
+
+def test_completed_job_already_has_its_metadata(tmp_path):
+    job_queue = make_queue()
+    metadata = str(tmp_path / 'session_info.json')
+    seen = {}
+
+    def on_complete(job):
+        # Durante la finalizzazione il job non risulta ancora concluso
+        seen['status'] = job.status
+        seen['active'] = job_queue.is_session_active(job.session_id)
+        time.sleep(0.2)
+        with open(metadata, 'w') as f:
+            f.write('{}')
+
+    job = job_queue.create('session', on_complete=on_complete)
+    observed = []
+
+    def observe():
+        # Come lo stream SSE: a ogni cambiamento controlla lo stato pubblicato
+        version = None
+        while True:
+            version = job.wait_for_change(version, timeout=5)
+            if job.to_dict()['status'] == 'completed':
+                observed.append(os.path.exists(metadata))
+                return
+
+    observer = threading.Thread(target=observe)
+    observer.start()
+    for index in range(3):
+        job_queue.add(job, {'filename': f'file{index}.png'})
+    job_queue.seal(job)
+
+    assert job.wait(5)
+    observer.join(5)
+    assert seen == {'status': 'finalizing', 'active': True}
+    assert observed == [True]
+    assert job.status == 'completed'
+    assert not job_queue.is_session_active('session')
+
+
+def test_rejected_only_job_is_finalized(tmp_path):
+    job_queue = make_queue()
+    calls = []
+    job = job_queue.create('session', on_complete=lambda job: calls.append(job.status))
+    job_queue.reject(job, {'filename': 'broken.png'}, 'write failed')
+    job_queue.seal(job)
+
+    assert job.wait(1)
+    assert calls == ['finalizing']
+    assert job.to_dict()['failed'] == 1
@@ -0,0 +1,217 @@
+import json
+import math
+import os
+import random
+import struct
+import zlib
+
+import pytest
+from PIL import Image, ImageChops, ImageOps, ImageStat
+from PyPDF2 import PdfReader
+
+from converters import image_converter, tiled_image
+from converters.image_converter import ImageConverter
+from converters.tiled_image import convert_tiled, open_band_reader
+
+# (color type, bit depth) dei PNG costruiti a mano
+PNG_TYPES = [(0, 1), (0, 2), (0, 4), (0, 8), (0, 16), (2, 8), (2, 16), (3, 1), (3, 4), (3, 8),
+             (4, 8), (4, 16), (6, 8), (6, 16)]
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# (ribaltamento orizzontale, verticale, scala di grigi)
+TRANSFORMS = [(False, False, False), (True, False, False), (False, True, False),
+              (True, True, False), (False, False, True), (True, True, True)]
+
+
+@pytest.fixture(autouse=True)
+def small_bands(monkeypatch):
+    """Bande e strisce di poche righe, così anche le immagini piccole ne hanno molte"""
+    monkeypatch.setattr(tiled_image, 'BAND_BYTES', 600)
+    monkeypatch.setattr(tiled_image, 'STRIP_BYTES', 300)
+
+
+def _chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def write_png(path, color_type, depth, size=(37, 29), seed=0):
+    """PNG con campioni casuali e i cinque filtri a rotazione, riga per riga"""
+    rng = random.Random(seed)
+    width, height = size
+    bits = CHANNELS[color_type] * depth
+    stride = math.ceil(width * bits / 8)
+    bpp = max(1, bits // 8)
+    if color_type == 3:
+        # Indici entro la palette
+        rows = [bytes(rng.randrange(256) & (0xff if depth == 8 else 0x77) for _ in range(stride))
+                for _ in range(height)]
+    else:
+        rows = [bytes(rng.randrange(256) for _ in range(stride)) for _ in range(height)]
+
+    data = bytearray()
+    previous = bytes(stride)
+    for index, row in enumerate(rows):
+        kind = index % 5
+        data.append(kind)
+        for i, value in enumerate(row):
+            a = row[i - bpp] if i >= bpp else 0
+            b = previous[i]
+            c = previous[i - bpp] if i >= bpp else 0
+            predictor = [0, a, b, (a + b) // 2, _paeth(a, b, c)][kind]
+            data.append((value - predictor) % 256)
+        previous = row
+
+    png = b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth,
+                                                             color_type, 0, 0, 0))
+    if color_type == 3:
+        png += _chunk(b'PLTE', bytes(rng.randrange(256) for _ in range(768)))
+        png += _chunk(b'tRNS', bytes(rng.randrange(256) for _ in range(16)))
+    png += _chunk(b'IDAT', zlib.compress(bytes(data))) + _chunk(b'IEND', b'')
+    with open(path, 'wb') as f:
+        f.write(png)
+    return path
+
+
+def expected_image(path, flip_horizontal, flip_vertical, grayscale):
+    """Risultato atteso dalla decodifica completa di Pillow"""
+    with Image.open(path) as img:
+        img.load()
+        img = img.copy()
+    if flip_horizontal:
+        img = ImageOps.mirror(img)
+    if flip_vertical:
+        img = ImageOps.flip(img)
+    if grayscale and img.mode not in ('L', 'I;16'):
+        img = ImageOps.grayscale(img)
+    return img
+
+
+def assert_same_pixels(result, expected):
+    assert result.size == expected.size
+    if expected.mode == 'I;16':
+        assert result.mode == 'I;16'
+        assert result.tobytes() == expected.tobytes()
+        return
+    assert ImageChops.difference(result.convert('RGBA'), expected.convert('RGBA')).getbbox() is None
+
+
+def test_png_reader_reads_every_depth(tmp_path):
+    for color_type, depth in PNG_TYPES:
+        path = write_png(str(tmp_path / f'{color_type}_{depth}.png'), color_type, depth)
+        reader = open_band_reader(path)
+        assert reader is not None, (color_type, depth)
+        with Image.open(path) as full:
+            full.load()
+            for y, band in reader.bands():
+                assert band.mode == full.mode
+                assert band.tobytes() == full.crop((0, y, full.width, y + band.height)).tobytes()
+        reader.close()
+
+
+@pytest.mark.parametrize('color_type, depth', PNG_TYPES)
+@pytest.mark.parametrize('target', ['png', 'tif'])
+@pytest.mark.parametrize('flip_horizontal, flip_vertical, grayscale', TRANSFORMS)
+def test_png_round_trip(tmp_path, color_type, depth, target, flip_horizontal, flip_vertical, grayscale):
+    source = write_png(str(tmp_path / 'source.png'), color_type, depth)
+    output = str(tmp_path / f'output.{target}')
+    assert convert_tiled(open_band_reader(source), output, flip_horizontal, flip_vertical, grayscale)
+    with Image.open(output) as result:
+        result.load()
+        assert_same_pixels(result, expected_image(source, flip_horizontal, flip_vertical, grayscale))
+
+
+@pytest.mark.parametrize('mode', ['L', 'P', 'RGB', 'RGBA', 'CMYK'])
+@pytest.mark.parametrize('compression', [None, 'tiff_deflate', 'tiff_lzw'])
+@pytest.mark.parametrize('target', ['png', 'tif'])
+def test_tiff_round_trip(tmp_path, mode, compression, target):
+    source = str(tmp_path / 'source.tif')
+    img = Image.effect_mandelbrot((53, 41), (-2, -1.2, 1, 1.2), 60).convert('RGB')
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').resize(img.size))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.ADAPTIVE)
+    else:
+        img = img.convert(mode)
+    img.save(source, compression=compression, strip_size=150)
+    output = str(tmp_path / f'output.{target}')
+    for flip_horizontal, flip_vertical, grayscale in TRANSFORMS:
+        assert convert_tiled(open_band_reader(source), output, flip_horizontal, flip_vertical, grayscale)
+        with Image.open(output) as result:
+            result.load()
+            expected = expected_image(source, flip_horizontal, flip_vertical, grayscale)
+            if target == 'png' and expected.mode == 'CMYK':
+                expected = expected.convert('RGB')
+            assert_same_pixels(result, expected)
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'I;16', 'P'])
+def test_tiles_match_full_decode(tmp_path, mode):
+    source = str(tmp_path / 'source.png')
+    img = Image.effect_mandelbrot((700, 530), (-2, -1.2, 1, 1.2), 60)
+    if mode == 'I;16':
+        img = img.convert('I').point(lambda value: value * 257).convert('I;16')
+    else:
+        img = Image.merge('RGB', (img, Image.linear_gradient('L').resize(img.size), img))
+        if mode == 'P':
+            img = img.convert('P', palette=Image.ADAPTIVE)
+    img.save(source)
+    index = str(tmp_path / 'tiles' / 'tiles.json')
+    assert convert_tiled(open_band_reader(source), index, flip_vertical=True, quality=100, workers=2)
+    with open(index, encoding='utf-8') as f:
+        layout = json.load(f)
+    assert (layout['width'], layout['height'], layout['columns'], layout['rows']) == (700, 530, 2, 2)
+
+    expected = expected_image(source, False, True, False)
+    if expected.mode == 'I;16':
+        expected = expected.point(lambda value: value / 256, 'L')
+    expected = expected.convert('RGB')
+    mosaic = Image.new('RGB', expected.size)
+    for row in range(layout['rows']):
+        for column in range(layout['columns']):
+            with Image.open(os.path.join(os.path.dirname(index), f'{row}_{column}.webp')) as tile:
+                mosaic.paste(tile.convert('RGB'), (column * layout['tile_size'], row * layout['tile_size']))
+    # WebP è lossy anche a qualità 100: basta che in media ogni canale resti vicino
+    assert max(ImageStat.Stat(ImageChops.difference(mosaic, expected)).mean) < 3
+
+
+@pytest.mark.parametrize('rotate, flip', [(180, None), (None, 'vertical'), (180, 'horizontal')])
+def test_converter_keeps_full_resolution_when_flipping_png(tmp_path, monkeypatch, rotate, flip):
+    """PNG -> PNG oltre MAX_PIXELS con ribaltamento verticale: niente riduzione"""
+    monkeypatch.setattr(image_converter, 'MAX_PIXELS', 500)
+    source = write_png(str(tmp_path / 'source.png'), 2, 8)
+    output = str(tmp_path / 'output.png')
+    assert ImageConverter().convert(source, output, rotate=rotate, flip=flip)
+    with Image.open(source) as img:
+        expected = img.rotate(rotate or 0)
+    if flip == 'vertical':
+        expected = ImageOps.flip(expected)
+    elif flip == 'horizontal':
+        expected = ImageOps.mirror(expected)
+    with Image.open(output) as result:
+        result.load()
+        assert_same_pixels(result, expected)
+
+
+@pytest.mark.parametrize('target', ['tif', 'pdf'])
+def test_converter_keeps_every_page_of_a_large_multipage_tiff(tmp_path, monkeypatch, target):
+    """TIFF multipagina oltre MAX_PIXELS: le bande leggerebbero solo la prima pagina"""
+    monkeypatch.setattr(image_converter, 'MAX_PIXELS', 500)
+    source = str(tmp_path / 'source.tif')
+    pages = [Image.new('RGB', (53, 41), (index * 80, 100, 200)) for index in range(3)]
+    pages[0].save(source, save_all=True, append_images=pages[1:])
+    output = str(tmp_path / f'output.{target}')
+    assert ImageConverter().convert(source, output, flip='vertical')
+    if target == 'pdf':
+        assert len(PdfReader(output).pages) == 3
+    else:
+        with Image.open(output) as result:
+            assert result.n_frames == 3
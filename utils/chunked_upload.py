@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+
+class UploadError(Exception):
+    """Errore nella gestione di un upload a blocchi"""
+    pass
+
+
+class UploadNotFound(UploadError):
+    """L'upload richiesto non esiste (mai creato, già finalizzato o rimosso)"""
+    pass
+
+
+class ChunkedUploadManager:
+    """
+    Upload a blocchi riprendibili.
+
+    Ogni upload ha una cartella con il file dati (creato sparso della
+    dimensione finale) e uno state.json con gli intervalli già ricevuti.
+    I blocchi vengono scritti direttamente alla loro posizione, quindi
+    possono arrivare in parallelo e in qualsiasi ordine, e dopo
+    un'interruzione il client chiede lo stato e invia solo quello che manca.
+    """
+
+    def __init__(self, root_dir, max_upload_size):
+        """
+        Args:
+            root_dir: cartella in cui tenere gli upload in corso
+            max_upload_size: dimensione massima di un singolo file in byte
+        """
+        self.root_dir = root_dir
+        self.max_upload_size = max_upload_size
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def create(self, filename, size):
+        """
+        Inizia un nuovo upload
+
+        Returns:
+            str: id dell'upload
+        """
+        filename = os.path.basename(filename or '')
+        if not filename:
+            raise UploadError("Missing filename")
+        if size < 0 or size > self.max_upload_size:
+            raise UploadError(f"File size must be between 0 and {self.max_upload_size} bytes")
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        os.makedirs(upload_dir)
+
+        # File sparso: lo spazio viene occupato man mano che arrivano i blocchi
+        with open(self._data_path(upload_id), 'wb') as f:
+            f.truncate(size)
+
+        self._save_state(upload_id, {
+            'filename': filename,
+            'size': size,
+            'received': [],
+            'created_at': time.time(),
+        })
+        return upload_id
+
+    def write_chunk(self, upload_id, offset, stream, length, block_size=1024 * 1024):
+        """
+        Scrive un blocco leggendolo dallo stream della richiesta
+
+        Args:
+            upload_id: id dell'upload
+            offset: posizione del blocco nel file
+            stream: stream da cui leggere i byte
+            length: numero di byte del blocco
+
+        Returns:
+            dict: stato aggiornato dell'upload
+        """
+        state = self._load_state(upload_id)
+        if offset < 0 or length < 0 or offset + length > state['size']:
+            raise UploadError("Chunk outside of file bounds")
+
+        written = 0
+        try:
+            with open(self._data_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    block = stream.read(min(block_size, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    written += len(block)
+        except FileNotFoundError:
+            # Finalizzato o annullato nel frattempo
+            raise UploadNotFound("Upload not found")
+
+        # Registra solo i byte effettivamente ricevuti: un blocco interrotto
+        # resta parziale e verrà completato alla ripresa
+        with self._lock_for(upload_id):
+            state = self._load_state(upload_id)
+            if written:
+                state['received'] = self._merge_ranges(state['received'] + [[offset, offset + written]])
+            self._save_state(upload_id, state)
+
+        return self._describe(upload_id, state)
+
+    def status(self, upload_id):
+        """Stato dell'upload, per riprendere dopo un'interruzione"""
+        return self._describe(upload_id, self._load_state(upload_id))
+
+    def finalize(self, upload_id, dest_path):
+        """
+        Sposta il file completato in dest_path e rimuove lo stato dell'upload
+
+        Returns:
+            str: nome originale del file
+        """
+        with self._lock_for(upload_id):
+            state = self._load_state(upload_id)
+            if not self._describe(upload_id, state)['complete']:
+                raise UploadError("Upload is not complete")
+
+            os.replace(self._data_path(upload_id), dest_path)
+            shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+        return state['filename']
+
+    def discard(self, upload_id):
+        """Annulla un upload e libera lo spazio"""
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+
+    def _describe(self, upload_id, state):
+        received_bytes = sum(end - start for start, end in state['received'])
+        return {
+            'upload_id': upload_id,
+            'filename': state['filename'],
+            'size': state['size'],
+            'received': state['received'],
+            'received_bytes': received_bytes,
+            'complete': received_bytes == state['size'],
+        }
+
+    @staticmethod
+    def _merge_ranges(ranges):
+        """Unisce intervalli [start, end) sovrapposti o adiacenti"""
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def _lock_for(self, upload_id):
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _upload_dir(self, upload_id):
+        # L'id arriva dall'URL: accetta solo esadecimali per non uscire dalla cartella
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadError("Invalid upload id")
+        return os.path.join(self.root_dir, upload_id)
+
+    def _data_path(self, upload_id):
+        return os.path.join(self._upload_dir(upload_id), 'data')
+
+    def _state_path(self, upload_id):
+        return os.path.join(self._upload_dir(upload_id), 'state.json')
+
+    def _load_state(self, upload_id):
+        try:
+            with open(self._state_path(upload_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found")
+
+    def _save_state(self, upload_id, state):
+        path = self._state_path(upload_id)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CpuLease:
+    """Quota di CPU assegnata a una singola conversione"""
+
+    def __init__(self, budget, shared):
+        self._budget = budget
+        self.shared = shared
+        self.created_at = time.time()
+
+    @property
+    def threads(self):
+        """
+        Thread da usare per il prossimo processo lanciato. Il valore viene
+        ricalcolato a ogni lettura, così i processi avviati più tardi (es. i
+        segmenti di un video) si adattano ai job iniziati o terminati nel frattempo.
+        """
+        if not self.shared:
+            return 1
+        return self._budget.share()
+
+
+class CpuBudget:
+    """
+    Budget centrale dei core tra le conversioni in corso.
+
+    Senza un limite esplicito ogni ffmpeg usa tanti thread quanti sono i core,
+    quindi quattro codifiche contemporanee su N core girano con 4×N thread.
+    Qui i job in Python puro (Pillow, PyPDF2, ...) riservano un core ciascuno
+    e i core rimanenti vengono divisi in parti uguali tra i job ffmpeg.
+    """
+
+    def __init__(self, cores=None):
+        """
+        Args:
+            cores: core da distribuire (di default tutti quelli della macchina)
+        """
+        self.cores = cores or os.cpu_count() or 1
+        self._reserved = 0
+        self._shared = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, shared=True):
+        """
+        Registra una conversione per tutta la sua durata
+
+        Args:
+            shared: True per i job che accettano un numero di thread (ffmpeg),
+                False per quelli a thread singolo, che riservano un core
+
+        Yields:
+            CpuLease: quota del job
+        """
+        with self._lock:
+            if shared:
+                self._shared += 1
+            else:
+                self._reserved += 1
+        try:
+            yield CpuLease(self, shared)
+        finally:
+            with self._lock:
+                if shared:
+                    self._shared -= 1
+                else:
+                    self._reserved -= 1
+
+    def share(self):
+        """Thread spettanti ora a ciascun job condiviso"""
+        with self._lock:
+            free = max(1, self.cores - self._reserved)
+            return max(1, free // max(1, self._shared))
+
+    def stats(self):
+        with self._lock:
+            free = max(1, self.cores - self._reserved)
+            return {
+                'cores': self.cores,
+                'reserved_jobs': self._reserved,
+                'shared_jobs': self._shared,
+                'threads_per_job': max(1, free // max(1, self._shared)),
+            }
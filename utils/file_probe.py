@@ -0,0 +1,277 @@
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Container ISO-BMFF: il box moov può trovarsi ovunque, anche in fondo al file
+ISO_BMFF_EXTENSIONS = {'mp4', 'm4v', 'm4a', 'mov', '3gp', 'heic', 'heif', 'avif'}
+
+# Box di primo livello il cui contenuto non serve per leggere i metadati
+_SKIPPED_BOXES = {b'mdat', b'free', b'skip', b'wide'}
+
+# Oltre 2**62 byte un box vale "fino alla fine del file"
+_TO_EOF = 1 << 62
+
+
+class _IsoBoxScanner:
+    """
+    Segue i box di primo livello di un file ISO-BMFF mentre passa lo stream
+    e indica quali byte conservare: tutto tranne il contenuto di mdat, così
+    moov viene trovato anche quando è in fondo a un file di diversi GB.
+    """
+
+    def __init__(self):
+        self.failed = False
+        self._box_end = 0
+        self._skip = False
+        self._header = b''
+
+    def feed(self, offset, data):
+        """
+        Args:
+            offset: posizione di data nel file
+            data: byte ricevuti
+
+        Returns:
+            list: segmenti (offset, byte) da conservare
+        """
+        keep = []
+        pos = 0
+        while pos < len(data) and not self.failed:
+            position = offset + pos
+            if position < self._box_end:
+                length = min(len(data) - pos, self._box_end - position)
+                if not self._skip:
+                    keep.append((position, data[pos:pos + length]))
+                pos += length
+                continue
+
+            # Intestazione del box successivo: 8 byte, 16 con la dimensione a 64 bit
+            wanted = 8
+            if len(self._header) >= 8 and struct.unpack('>I', self._header[:4])[0] == 1:
+                wanted = 16
+            take = data[pos:pos + wanted - len(self._header)]
+            self._header += take
+            pos += len(take)
+            if len(self._header) < wanted:
+                continue
+
+            size, box_type = struct.unpack('>I4s', self._header[:8])
+            if size == 1 and wanted == 8:
+                continue
+            if size == 1:
+                size = struct.unpack('>Q', self._header[8:16])[0]
+
+            start = offset + pos - len(self._header)
+            keep.append((start, bytes(self._header)))
+            if size == 0:
+                self._box_end = _TO_EOF
+            elif size < len(self._header):
+                # Non è un ISO-BMFF valido: restano solo inizio e fine del file
+                self.failed = True
+            else:
+                self._box_end = start + size
+            self._skip = box_type in _SKIPPED_BOXES
+            self._header = b''
+        return keep
+
+
+class ProbeSink:
+    """
+    Destinazione di sola scrittura per i file inviati a /api/file-info.
+
+    Mentre i byte passano calcola SHA-256 e dimensione, ma conserva solo
+    ciò che serve a leggere i metadati: il primo e l'ultimo blocco del file
+    e, per i container ISO-BMFF, tutti i box tranne i dati multimediali.
+    Il resto viene scartato senza mai toccare il disco.
+    """
+
+    def __init__(self, filename, head_size=1024 * 1024, tail_size=1024 * 1024,
+                 max_retained=64 * 1024 * 1024):
+        """
+        Args:
+            filename: nome del file caricato, per scegliere la strategia
+            head_size: byte iniziali da conservare
+            tail_size: byte finali da conservare
+            max_retained: limite ai byte conservati oltre inizio e fine
+        """
+        self.filename = filename or ''
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.max_retained = max_retained
+        self.size = 0
+        self.head = bytearray()
+        self._tail = deque()
+        self._tail_bytes = 0
+        self._segments = []
+        self._retained = 0
+        self._digest = hashlib.sha256()
+
+        ext = os.path.splitext(self.filename)[1][1:].lower()
+        self._scanner = _IsoBoxScanner() if ext in ISO_BMFF_EXTENSIONS else None
+
+    def write(self, data):
+        offset = self.size
+        self._digest.update(data)
+        self.size += len(data)
+
+        if self._scanner is not None:
+            self._keep(self._scanner.feed(offset, data))
+
+        # Inizio del file
+        room = self.head_size - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+            offset += room
+        if not data:
+            return
+
+        # Fine del file: finestra scorrevole sugli ultimi tail_size byte
+        self._tail.append((offset, bytes(data)))
+        self._tail_bytes += len(data)
+        while self._tail_bytes - len(self._tail[0][1]) >= self.tail_size:
+            self._tail_bytes -= len(self._tail.popleft()[1])
+
+    def _keep(self, segments):
+        for offset, data in segments:
+            self._retained += len(data)
+            if self._retained > self.max_retained:
+                # Troppi metadati: si ripiega su inizio e fine del file
+                self._scanner = None
+                self._segments = []
+                return
+            if self._segments and self._segments[-1][0] + len(self._segments[-1][1]) == offset:
+                self._segments[-1][1].extend(data)
+            else:
+                self._segments.append((offset, bytearray(data)))
+
+    # Metodi richiesti da werkzeug per il contenitore del file
+    def seek(self, offset, whence=0):
+        return 0
+
+    def read(self, size=-1):
+        return b''
+
+    def close(self):
+        pass
+
+    @property
+    def content_hash(self):
+        """SHA-256 del contenuto, uguale a ResultCache.hash_file"""
+        return self._digest.hexdigest()
+
+    @property
+    def tail(self):
+        """Ultimi byte del file (almeno tail_size, salvo file più corti)"""
+        return b''.join(chunk for _, chunk in self._tail)
+
+    @property
+    def complete(self):
+        """True se i byte conservati coprono l'intero file"""
+        return self.size <= len(self.head) + self._tail_bytes
+
+    def segments(self):
+        """Segmenti (offset, byte) conservati, compresi inizio e fine"""
+        tail = self.tail
+        return [(0, self.head), (self.size - len(tail), tail)] + self._segments
+
+    @contextmanager
+    def materialize(self, directory=None):
+        """
+        Ricostruisce il file come file sparso con i soli byte conservati:
+        gli strumenti che vogliono un percorso (ffprobe, PyPDF2) trovano
+        inizio, fine e metadati dove se li aspettano, mentre le parti
+        scartate non occupano spazio su disco.
+
+        Yields:
+            str: percorso del file temporaneo, rimosso all'uscita
+        """
+        suffix = os.path.splitext(self.filename)[1]
+        fd, path = tempfile.mkstemp(prefix='probe_', suffix=suffix, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.truncate(self.size)
+                for offset, data in self.segments():
+                    if data:
+                        f.seek(offset)
+                        f.write(data)
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def pdf_summary(head, tail):
+    """
+    Legge numero di pagine e cifratura di un PDF senza averlo tutto: il
+    trailer è in fondo al file e il nodo radice /Pages, che contiene il
+    conteggio totale, è quasi sempre all'inizio.
+
+    Returns:
+        dict: pagine (se trovate) e cifratura
+    """
+    info = {}
+    counts = []
+    for data in (bytes(head), bytes(tail)):
+        for match in re.finditer(rb'/Type\s*/Pages\b(.{0,200}?)>>', data, re.S):
+            count = re.search(rb'/Count\s+(\d+)', match.group(1))
+            if count:
+                counts.append(int(count.group(1)))
+        for match in re.finditer(rb'/Count\s+(\d+)(.{0,200}?)/Type\s*/Pages\b', data, re.S):
+            counts.append(int(match.group(1)))
+    if counts:
+        # La radice dell'albero delle pagine ha il conteggio più alto
+        info['pages'] = max(counts)
+
+    trailer_start = tail.rfind(b'trailer')
+    if trailer_start == -1:
+        # Con le xref stream il trailer è il dizionario dello stream /XRef
+        trailer_start = tail.rfind(b'/XRef')
+    info['encrypted'] = trailer_start != -1 and b'/Encrypt' in tail[trailer_start:]
+    return info
+
+
+class ProbeCache:
+    """Cache LRU dei metadati letti da /api/file-info, indicizzata per hash del contenuto"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash):
+        if not content_hash:
+            return None
+        with self._lock:
+            info = self._entries.get(content_hash)
+            if info is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(content_hash)
+            self.hits += 1
+            return dict(info)
+
+    def put(self, content_hash, info):
+        with self._lock:
+            self._entries[content_hash] = dict(info)
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
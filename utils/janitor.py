@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+
+class Janitor:
+    """
+    Pulizia periodica di converted/ e uploads/.
+
+    Rimuove le sessioni più vecchie di max_age e, se lo spazio occupato
+    supera max_bytes, elimina le più vecchie finché si rientra nella quota.
+    L'età di una sessione convertita viene letta da session_info.json;
+    per tutto il resto (upload rimasti dopo un crash, upload a blocchi
+    abbandonati, vecchi zip) si usa la data di ultima modifica. Un upload a
+    blocchi che ha ricevuto dati negli ultimi upload_grace secondi è in
+    corso e non viene mai rimosso, nemmeno per la quota.
+    """
+
+    def __init__(self, converted_dir, upload_dir, max_age, max_bytes, interval=600,
+                 is_active=None, upload_grace=3600):
+        """
+        Args:
+            converted_dir: cartella delle sessioni convertite
+            upload_dir: cartella dei file caricati
+            max_age: età massima in secondi
+            max_bytes: spazio massimo complessivo in byte
+            interval: secondi tra due passaggi
+            is_active: funzione che dato un session_id dice se è ancora in uso
+            upload_grace: secondi dall'ultimo blocco entro cui un upload a
+                blocchi è considerato in corso
+        """
+        self.converted_dir = converted_dir
+        self.upload_dir = upload_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.is_active = is_active or (lambda session_id: False)
+        self.upload_grace = upload_grace
+        self.runs = 0
+        self.total_removed = 0
+        self.total_reclaimed_bytes = 0
+        self.last_report = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def start(self):
+        """Avvia il thread di pulizia in background"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Errore durante la pulizia: {e}")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        """
+        Esegue un passaggio di pulizia
+
+        Returns:
+            dict: resoconto con elementi rimossi e byte recuperati
+        """
+        with self._run_lock:
+            now = time.time()
+            items = self._collect_items()
+            removed = []
+
+            # 1. Scadenza per età
+            remaining = []
+            for item in items:
+                if now - item['timestamp'] > self.max_age and self._remove(item):
+                    removed.append(item)
+                else:
+                    remaining.append(item)
+
+            # 2. Quota globale: si eliminano prima gli elementi più vecchi
+            used_bytes = sum(item['bytes'] for item in remaining)
+            for item in sorted(remaining, key=lambda i: i['timestamp']):
+                if used_bytes <= self.max_bytes:
+                    break
+                if self._remove(item):
+                    removed.append(item)
+                    used_bytes -= item['bytes']
+
+            reclaimed = sum(item['bytes'] for item in removed)
+            self.runs += 1
+            self.total_removed += len(removed)
+            self.total_reclaimed_bytes += reclaimed
+            self.last_report = {
+                'timestamp': now,
+                'removed': len(removed),
+                'reclaimed_bytes': reclaimed,
+                'used_bytes': used_bytes,
+                'removed_items': [item['path'] for item in removed],
+            }
+            return self.last_report
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'total_removed': self.total_removed,
+            'total_reclaimed_bytes': self.total_reclaimed_bytes,
+            'max_age': self.max_age,
+            'max_bytes': self.max_bytes,
+            'last_run': self.last_report,
+        }
+
+    def _collect_items(self):
+        """Elenca sessioni, upload e file sciolti con età e dimensione"""
+        items = []
+
+        for name in self._listdir(self.converted_dir):
+            path = os.path.join(self.converted_dir, name)
+            if os.path.isdir(path):
+                items.append(self._describe(path, session_id=name,
+                                            timestamp=self._session_timestamp(path)))
+            else:
+                # Es. archivi zip generati dalle versioni precedenti
+                items.append(self._describe(path))
+
+        for name in self._listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            if name == '_chunked':
+                # Upload a blocchi abbandonati: l'età è quella dell'ultimo blocco ricevuto
+                for upload_id in self._listdir(path):
+                    items.append(self._describe(os.path.join(path, upload_id), chunked=True))
+            elif os.path.isdir(path):
+                items.append(self._describe(path, session_id=name))
+            else:
+                items.append(self._describe(path))
+
+        return [item for item in items if item is not None]
+
+    def _describe(self, path, session_id=None, timestamp=None, chunked=False):
+        try:
+            if timestamp is None:
+                timestamp = self._last_modified(path)
+            return {
+                'path': path,
+                'session_id': session_id,
+                'chunked': chunked,
+                'timestamp': timestamp,
+                'bytes': self._disk_usage(path),
+            }
+        except OSError:
+            # Rimosso nel frattempo
+            return None
+
+    def _session_timestamp(self, path):
+        """Legge il timestamp salvato da save_session_metadata"""
+        try:
+            with open(os.path.join(path, 'session_info.json'), 'r') as f:
+                return float(json.load(f)['timestamp'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return self._last_modified(path)
+
+    def _remove(self, item):
+        if item['session_id'] and self.is_active(item['session_id']):
+            return False
+        if item['chunked'] and self._upload_in_progress(item['path']):
+            return False
+        try:
+            if os.path.isdir(item['path']):
+                shutil.rmtree(item['path'])
+            else:
+                os.remove(item['path'])
+            return True
+        except OSError as e:
+            print(f"Impossibile rimuovere {item['path']}: {e}")
+            return False
+
+    def _upload_in_progress(self, path):
+        """True se l'upload ha ricevuto un blocco di recente (riletto ora, non all'elenco)"""
+        try:
+            return time.time() - self._last_modified(path) < self.upload_grace
+        except OSError:
+            return False
+
+    @staticmethod
+    def _listdir(path):
+        try:
+            return os.listdir(path)
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _last_modified(path):
+        latest = os.path.getmtime(path)
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+                except OSError:
+                    pass
+        return latest
+
+    @staticmethod
+    def _disk_usage(path):
+        """Byte occupati su disco (i file sparsi contano solo i blocchi scritti)"""
+        def usage(file_path):
+            stat = os.stat(file_path)
+            blocks = getattr(stat, 'st_blocks', None)
+            return blocks * 512 if blocks is not None else stat.st_size
+
+        if not os.path.isdir(path):
+            return usage(path)
+
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += usage(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
@@ -0,0 +1,364 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ConversionJob:
+    """Rappresenta un batch di file da convertire e lo stato di ciascun file"""
+
+    def __init__(self, session_id, on_complete=None):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.on_complete = on_complete
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files = []
+        self._pending = 0
+        self._sealed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        self._done = threading.Event()
+
+    def add_file(self, task):
+        """
+        Aggiunge un file al job
+
+        Returns:
+            int: indice del file nel job
+        """
+        with self._lock:
+            if self._sealed:
+                raise RuntimeError("Cannot add files to a sealed job")
+            self.files.append({
+                'filename': task['filename'],
+                'source_filename': task.get('source_filename'),
+                'category': task.get('category'),
+                'estimated_cost': task.get('estimated_cost'),
+                'status': 'queued',
+                'success': False,
+                'progress': 0.0,
+                'speed': None,
+                'started_at': None,
+                'finished_at': None,
+                'duration': None,
+            })
+            self._pending += 1
+            self._notify()
+            return len(self.files) - 1
+
+    def seal(self):
+        """
+        Segnala che non arriveranno altri file
+
+        Returns:
+            bool: True se a questo punto tutti i file sono già terminati
+        """
+        with self._lock:
+            self._sealed = True
+            return self._complete_if_done()
+
+    def _complete_if_done(self):
+        # Da chiamare con il lock acquisito. Il job passa a 'finalizing': diventa
+        # 'completed' solo dopo on_complete (vedi mark_completed)
+        if not self._sealed or self._pending > 0 or self.status in ('finalizing', 'completed'):
+            return False
+        self.finished_at = time.time()
+        self.status = 'finalizing'
+        self._notify()
+        return True
+
+    def mark_completed(self):
+        """Pubblica il completamento, quando anche on_complete è terminata"""
+        with self._lock:
+            self.status = 'completed'
+            self._notify()
+
+    def _notify(self):
+        # Da chiamare con il lock acquisito: sveglia chi attende aggiornamenti (SSE)
+        self._version += 1
+        self._changed.notify_all()
+
+    def mark_started(self, index):
+        """Segna l'inizio della conversione di un file"""
+        with self._lock:
+            now = time.time()
+            if self.started_at is None:
+                self.started_at = now
+                self.status = 'running'
+            entry = self.files[index]
+            entry['status'] = 'processing'
+            entry['started_at'] = now
+            self._notify()
+
+    def set_progress(self, index, percent, speed=None):
+        """Aggiorna la percentuale di avanzamento di un file"""
+        with self._lock:
+            entry = self.files[index]
+            entry['progress'] = percent
+            entry['speed'] = speed
+            self._notify()
+
+    def mark_finished(self, index, result):
+        """
+        Registra il risultato di un file
+
+        Returns:
+            bool: True se tutti i file sono terminati e il job va finalizzato
+        """
+        with self._lock:
+            now = time.time()
+            entry = self.files[index]
+            entry.update(result)
+            entry['status'] = 'completed' if result.get('success') else 'failed'
+            entry['finished_at'] = now
+            entry['progress'] = 100.0
+            if entry['started_at'] is not None:
+                entry['duration'] = round(now - entry['started_at'], 3)
+
+            self._pending -= 1
+            if self._complete_if_done():
+                return True
+
+            self._notify()
+            return False
+
+    @property
+    def results(self):
+        """Risultati nel formato restituito da process_file"""
+        with self._lock:
+            return [dict(entry) for entry in self.files]
+
+    def wait_for_change(self, version, timeout=None):
+        """
+        Attende che lo stato del job cambi rispetto alla versione indicata
+
+        Returns:
+            int: la versione corrente (uguale a quella passata in caso di timeout)
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def wait(self, timeout=None):
+        """Attende il completamento del job"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        """Serializza lo stato del job per l'API"""
+        with self._lock:
+            files = [dict(entry) for entry in self.files]
+            duration = None
+            if self.started_at is not None:
+                duration = round((self.finished_at or time.time()) - self.started_at, 3)
+
+            progress = sum(f['progress'] for f in files) / len(files) if files else 100.0
+
+            return {
+                'job_id': self.id,
+                'session_id': self.session_id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'duration': duration,
+                'total': len(files),
+                'completed': sum(1 for f in files if f['status'] == 'completed'),
+                'failed': sum(1 for f in files if f['status'] == 'failed'),
+                'progress': round(progress, 1),
+                'files': files,
+            }
+
+
+class CategoryPool:
+    """Pool di worker dedicato a una categoria di file, con coda a priorità"""
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._active = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def submit(self, priority, fn, *args):
+        """Accoda una funzione: a parità di priorità vale l'ordine di arrivo"""
+        self._ensure_started()
+        self._queue.put((priority, next(self._counter), fn, args))
+
+    def _ensure_started(self):
+        # I thread partono al primo utilizzo, così importare il modulo
+        # (ad es. nei processi figli del process pool) non avvia worker
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker_loop,
+                                      name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queue.qsize(),
+            }
+
+    def _worker_loop(self):
+        while True:
+            _, _, fn, args = self._queue.get()
+            with self._lock:
+                self._active += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Errore nel worker {self.name}: {e}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._queue.task_done()
+
+
+class JobQueue:
+    """
+    Coda di job di conversione eseguiti in background.
+
+    Ogni file viene assegnato al pool della sua categoria (image, audio, video,
+    document), così le codifiche video lunghe non bloccano le immagini veloci.
+    Dentro ogni pool i file sono ordinati per "scadenza stimata", cioè istante
+    di arrivo più costo stimato in secondi: i lavori brevi passano avanti a
+    quelli costosi, ma un lavoro costoso non resta in attesa all'infinito.
+    """
+
+    def __init__(self, worker, admission, pool_sizes, default_pool='document',
+                 max_finished_jobs=500):
+        """
+        Args:
+            worker: funzione (task, progress_callback) che converte un singolo file e restituisce un dict risultato
+            admission: funzione che dato un task restituisce (categoria, costo stimato in secondi)
+            pool_sizes: dict categoria -> numero di worker
+            default_pool: pool usato per le categorie senza un pool dedicato
+            max_finished_jobs: numero di job completati mantenuti in memoria
+        """
+        self.worker = worker
+        self.admission = admission
+        self.default_pool = default_pool
+        self.max_finished_jobs = max_finished_jobs
+        self._pools = {name: CategoryPool(name, max(1, size))
+                       for name, size in pool_sizes.items()}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, session_id, on_complete=None):
+        """
+        Crea un job vuoto a cui aggiungere i file man mano che vengono salvati
+
+        Args:
+            session_id: sessione in cui vengono scritti i file convertiti
+            on_complete: callback chiamata con il job al termine dell'ultimo file
+        """
+        job = ConversionJob(session_id, on_complete)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+
+        return job
+
+    def add(self, job, task):
+        """
+        Accoda la conversione di un file: parte appena c'è un worker libero,
+        anche se gli altri file del batch non sono ancora stati salvati
+
+        Args:
+            job: job restituito da create()
+            task: dict con input_path, output_path, filename, target_format, options
+        """
+        # Admission: categoria e costo stimato del file
+        try:
+            category, cost = self.admission(task)
+        except Exception as e:
+            print(f"Impossibile stimare il costo di {task['filename']}: {e}")
+            category, cost = task.get('category'), 0.0
+        task['category'] = category
+        task['estimated_cost'] = round(cost, 3)
+
+        index = job.add_file(task)
+        pool = self._pools.get(category) or self._pools[self.default_pool]
+        priority = job.created_at + task['estimated_cost']
+        pool.submit(priority, self._run_task, job, index, task)
+
+    def reject(self, job, task, error):
+        """
+        Registra come fallito un file che non è stato possibile accodare
+        (es. errore di scrittura durante l'upload), senza convertirlo
+
+        Args:
+            job: job restituito da create()
+            task: dict con almeno filename
+            error: messaggio d'errore da riportare al client
+        """
+        index = job.add_file(task)
+        result = {'filename': task['filename'], 'success': False, 'error': error}
+        if job.mark_finished(index, result):
+            self._finish(job)
+
+    def seal(self, job):
+        """Chiude il job: nessun altro file verrà aggiunto"""
+        if job.seal():
+            self._finish(job)
+
+    def get(self, job_id):
+        """Restituisce il job con l'id indicato, o None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def is_session_active(self, session_id):
+        """Verifica se una sessione ha job ancora in esecuzione"""
+        with self._lock:
+            return any(job.session_id == session_id and job.status != 'completed'
+                       for job in self._jobs.values())
+
+    def stats(self):
+        """Stato dei pool per categoria"""
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    def _run_task(self, job, index, task):
+        job.mark_started(index)
+
+        def progress_callback(percent, speed=None):
+            job.set_progress(index, percent, speed)
+
+        try:
+            result = self.worker(task, progress_callback)
+        except Exception as e:
+            print(f"Errore durante la conversione di {task['filename']}: {e}")
+            result = {'filename': task['filename'], 'success': False, 'error': str(e)}
+
+        if job.mark_finished(index, result):
+            self._finish(job)
+
+    def _finish(self, job):
+        # Client, SSE e pulizia vedono il job completato solo a metadati scritti
+        if job.on_complete:
+            try:
+                job.on_complete(job)
+            except Exception as e:
+                print(f"Errore nel completamento del job {job.id}: {e}")
+        job.mark_completed()
+        job._done.set()
+
+    def _evict_finished(self):
+        """Rimuove i job completati più vecchi oltre il limite"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status == 'completed']
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
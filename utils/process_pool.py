@@ -0,0 +1,86 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Moduli importati una sola volta nel processo forkserver, così ogni worker
+# nasce con Pillow, PyPDF2, reportlab & co. già caricati
+PRELOAD_MODULES = [
+    'converters.converter_factory',
+    'converters.image_converter',
+    'converters.document_converter',
+]
+
+
+def _preload_converters():
+    """Initializer dei worker: importa i convertitori (utile con il metodo spawn)"""
+    import importlib
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+
+def run_conversion(mime_type, source_format, target_format, input_path, output_path, options):
+    """Esegue una conversione all'interno di un processo worker"""
+    from converters.converter_factory import ConverterFactory
+
+    converter = ConverterFactory.get_converter(mime_type, source_format, target_format)
+    if not converter:
+        return False
+    return converter.convert(input_path, output_path, **options)
+
+
+class ConversionProcessPool:
+    """
+    Pool di processi per i convertitori che lavorano in Python puro (Pillow,
+    PyPDF2, reportlab, parsing XML/JSON) e quindi trattengono il GIL.
+    I convertitori basati su ffmpeg/pandoc restano sui thread, dato che il
+    lavoro vero avviene già in un sottoprocesso.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Il pool viene creato al primo utilizzo
+        with self._lock:
+            if self._executor is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(PRELOAD_MODULES)
+                else:
+                    # Windows non supporta forkserver
+                    context = multiprocessing.get_context('spawn')
+
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=context,
+                                                     initializer=_preload_converters)
+            return self._executor
+
+    def convert(self, mime_type, source_format, target_format, input_path, output_path, options):
+        """
+        Esegue la conversione in un processo worker e ne attende il risultato
+
+        Returns:
+            bool: True se la conversione è avvenuta con successo
+        """
+        executor = self._get_executor()
+        try:
+            future = executor.submit(run_conversion, mime_type, source_format, target_format,
+                                     input_path, output_path, options)
+            return future.result()
+        except BrokenProcessPool as e:
+            # Un worker è morto (es. memoria esaurita): ricrea il pool per i file successivi
+            print(f"Process pool interrotto durante la conversione di {input_path}: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return False
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Cache dei risultati di conversione indirizzata per contenuto.
+
+    La chiave è l'hash dei byte in input più formato di destinazione e opzioni
+    normalizzate; i risultati vengono salvati nella cartella di cache e copiati
+    (con hardlink quando possibile) nelle cartelle di sessione. Quando la
+    dimensione totale supera il budget vengono rimossi i risultati usati meno
+    di recente.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir: cartella in cui salvare i risultati
+            max_bytes: spazio massimo occupato dalla cache in byte
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # chiave -> (percorso, dimensione)
+        self._size = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_existing()
+
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        """Calcola lo SHA-256 del contenuto di un file"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, target_format, options):
+        """
+        Costruisce la chiave di cache
+
+        Args:
+            content_hash: hash del file in input
+            target_format: formato di destinazione
+            options: dict delle opzioni di conversione
+        """
+        # json normalizza le tuple in liste e sort_keys rende la chiave stabile
+        normalized = json.dumps(options, sort_keys=True, default=str)
+        material = f"{content_hash}\0{target_format.lower()}\0{normalized}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def lookup(self, key, dest_path):
+        """
+        Copia il risultato in cache in dest_path, se presente
+
+        Returns:
+            bool: True in caso di hit
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.exists(entry[0]):
+                # Il file è stato rimosso dall'esterno
+                self._drop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cached_path = entry[0]
+
+        try:
+            self._link_or_copy(cached_path, dest_path)
+            os.utime(cached_path)
+            return True
+        except OSError as e:
+            print(f"Errore nel recupero dalla cache: {e}")
+            return False
+
+    def store(self, key, src_path):
+        """Salva in cache il risultato di una conversione"""
+        ext = os.path.splitext(src_path)[1]
+        cached_path = os.path.join(self.cache_dir, key[:2], key + ext)
+
+        try:
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            # Scrivi su un file temporaneo e rinomina, così un hit non vede mai un file parziale
+            temp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+            self._link_or_copy(src_path, temp_path)
+            os.replace(temp_path, cached_path)
+            size = os.path.getsize(cached_path)
+        except OSError as e:
+            print(f"Errore nel salvataggio in cache: {e}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries[key][1]
+            self._entries[key] = (cached_path, size)
+            self._entries.move_to_end(key)
+            self._size += size
+            self._evict()
+
+    def stats(self):
+        """Contatori della cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _evict(self):
+        """Rimuove i risultati usati meno di recente finché si rientra nel budget"""
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        path, size = self._entries.pop(key)
+        self._size -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _load_existing(self):
+        """Ricostruisce l'indice dai file già presenti, ordinati per ultimo utilizzo"""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self._size += size
+        self._evict()
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        """Crea un hardlink, o una copia se il filesystem non lo consente"""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
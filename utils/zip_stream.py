@@ -0,0 +1,77 @@
+import os
+import zipfile
+
+# Formati già compressi: ricomprimerli costa CPU senza ridurre la dimensione
+STORED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'heic', 'heif',
+    'mp3', 'aac', 'm4a', 'ogg', 'opus', 'flac',
+    'mp4', 'm4v', 'm4s', 'mkv', 'webm', 'mov', 'avi', 'ts',
+    'zip', 'gz', 'bz2', '7z', 'rar',
+    'pdf', 'docx', 'xlsx', 'pptx', 'odt', 'ods', 'odp', 'epub',
+}
+
+
+class _ChunkBuffer:
+    """Stream di sola scrittura, non seekable, che accumula i byte da inviare al client"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Restituisce e svuota i byte scritti finora"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def compression_for(filename):
+    """Sceglie STORED per i formati già compressi e DEFLATE per quelli testuali"""
+    ext = os.path.splitext(filename)[1][1:].lower()
+    if ext in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries, chunk_size=1024 * 1024):
+    """
+    Genera un archivio ZIP a pezzi, senza scriverlo su disco
+
+    Args:
+        entries: iterabile di tuple (percorso del file, nome nell'archivio)
+        chunk_size: dimensione dei blocchi letti dai file
+
+    Yields:
+        bytes: porzioni dell'archivio nell'ordine in cui vanno inviate
+    """
+    buffer = _ChunkBuffer()
+
+    # Con un output non seekable zipfile usa i data descriptor, quindi ogni
+    # voce può essere inviata mentre viene scritta: la memoria resta costante
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compression_for(arcname)
+
+            with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+                for chunk in iter(lambda: src.read(chunk_size), b''):
+                    dst.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # Directory centrale
+    data = buffer.drain()
+    if data:
+        yield data